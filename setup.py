@@ -40,4 +40,10 @@ setuptools.setup(
     python_requires='>=3.7.17',
     # pip requirements read in above
     install_requires=requirements,
+    # Optional extras:
+    extras_require={
+        "jit": ["numba"],
+        "toml": ["tomli; python_version < '3.11'"],
+        "pandas": ["pandas"],
+    },
 )
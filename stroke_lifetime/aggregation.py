@@ -0,0 +1,316 @@
+"""
+Population-level summaries that are built up one chunk at a time.
+
+The CohortAggregator class takes chunks of results from the batch
+calculations and keeps only running totals, so the memory needed
+stays the same however many patients are in the cohort. The
+summaries are split by mRS score and sex:
++ count, total, mean and variance of each chosen outcome.
+  The means and variances are combined across chunks using
+  Welford's method so that they match the values from one big array.
++ histograms with fixed bins for each chosen outcome.
++ mean survival in each year for each mRS score.
+"""
+# Imports:
+import numpy as np
+
+from .batch_calculations import iter_batch_chunks
+
+
+# Outcomes to summarise by default:
+default_keys = [
+    'survival_median_years',
+    'qalys_total',
+    'ae_discounted_cost',
+    'nel_discounted_cost',
+    'el_discounted_cost',
+    'care_years_discounted_cost',
+    'total_discounted_cost',
+    'net_benefit',
+]
+
+# Histogram bins to use by default:
+default_histogram_bins = {
+    'net_benefit': np.linspace(-1e6, 1e6, 201),
+}
+
+
+class CohortAggregator:
+    """
+    Keep running summaries of batch results split by mRS and sex.
+
+    Groups are stored in arrays with one row per mRS score from 0 to
+    5 and one column per sex, 0 for female and 1 for male. Patients
+    with any other mRS or sex value are skipped.
+
+    Example:
+    --------
+    aggregator = CohortAggregator()
+    for results in iter_batch_chunks(age, sex, mrs, fixed_params):
+        aggregator.update(results)
+    report = aggregator.report()
+    """
+    def __init__(
+            self,
+            keys: list = None,
+            histogram_bins: dict = None
+            ):
+        """
+        Set up empty running totals.
+
+        Inputs:
+        -------
+        keys           - list. Names of the outcomes in the batch
+                         results to summarise. Defaults to
+                         default_keys.
+        histogram_bins - dict. Bin edges for each outcome that needs
+                         a histogram. Defaults to
+                         default_histogram_bins.
+        """
+        self.keys = list(default_keys if keys is None else keys)
+        if histogram_bins is None:
+            histogram_bins = default_histogram_bins
+        self.histogram_bins = dict(
+            (key, np.asarray(edges, dtype=float))
+            for key, edges in histogram_bins.items()
+        )
+        self.group_shape = (6, 2)
+        n_groups = np.prod(self.group_shape)
+
+        self.count = np.zeros(n_groups)
+        self.total = dict((key, np.zeros(n_groups)) for key in self.keys)
+        self.mean = dict((key, np.zeros(n_groups)) for key in self.keys)
+        self.m2 = dict((key, np.zeros(n_groups)) for key in self.keys)
+        # Histogram counts including one bin for values below the
+        # first edge and one bin for values above the last edge:
+        self.histogram_counts = dict(
+            (key, np.zeros((n_groups, len(edges) + 1)))
+            for key, edges in self.histogram_bins.items()
+        )
+        # Survival sums with one row per mRS and one column per year:
+        self.survival_count = np.zeros(6)
+        self.survival_sum = np.zeros((6, 0))
+
+    def update(
+            self,
+            results: dict,
+            mrs: np.array = None,
+            sex: np.array = None
+            ):
+        """
+        Add one chunk of batch results to the running totals.
+
+        Inputs:
+        -------
+        results - dict. Output of main_calculations_batch() or
+                  calculate_outcomes_batch(). Must contain every key
+                  being summarised.
+        mrs     - np.array or None. Patients' mRS scores. If None,
+                  use results["mrs"] from main_calculations_batch().
+                  calculate_outcomes_batch() doesn't return the
+                  scores, so pass them here for its results.
+        sex     - np.array or None. Patients' sexes. If None, use
+                  results["sex"] as for mrs.
+        """
+        if mrs is None:
+            mrs = results['mrs']
+        if sex is None:
+            sex = results['sex']
+        mrs = np.asarray(mrs).astype(int)
+        sex = np.asarray(sex).astype(int)
+        keep = (mrs >= 0) & (mrs <= 5) & (sex >= 0) & (sex <= 1)
+        mrs = mrs[keep]
+        sex = sex[keep]
+        group = np.ravel_multi_index((mrs, sex), self.group_shape)
+        n_groups = self.count.shape[0]
+
+        # ----- Welford mean and variance -----
+        count_chunk = np.bincount(group, minlength=n_groups)
+        count_new = self.count + count_chunk
+        for key in self.keys:
+            values = np.asarray(results[key], dtype=float)[keep]
+            total_chunk = np.bincount(group, weights=values,
+                                      minlength=n_groups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean_chunk = np.where(
+                    count_chunk > 0, total_chunk / count_chunk, 0.0)
+                m2_chunk = np.bincount(
+                    group, weights=(values - mean_chunk[group])**2,
+                    minlength=n_groups)
+                # Combine with the existing totals:
+                delta = mean_chunk - self.mean[key]
+                self.mean[key] = np.where(
+                    count_new > 0,
+                    self.mean[key] + delta * count_chunk / count_new,
+                    0.0
+                    )
+                self.m2[key] = np.where(
+                    count_new > 0,
+                    self.m2[key] + m2_chunk +
+                    delta**2 * self.count * count_chunk / count_new,
+                    0.0
+                    )
+            self.total[key] += total_chunk
+        self.count = count_new
+
+        # ----- Histograms -----
+        for key, edges in self.histogram_bins.items():
+            values = np.asarray(results[key], dtype=float)[keep]
+            # Index 0 is below the first edge and the last index is
+            # above the last edge:
+            bins = np.searchsorted(edges, values, side='right')
+            # Keep the last edge inside the last bin like np.histogram:
+            bins[values == edges[-1]] = len(edges) - 1
+            n_bins = len(edges) + 1
+            self.histogram_counts[key] += np.bincount(
+                group * n_bins + bins, minlength=n_groups * n_bins
+                ).reshape(n_groups, n_bins)
+
+        # ----- Survival curves -----
+        if 'survival_by_year' in results:
+            survival = np.asarray(results['survival_by_year'])[keep]
+            # Survival is zero after the last tabulated year, so pad
+            # whichever array is shorter with zeros:
+            n_years = max(survival.shape[-1], self.survival_sum.shape[-1])
+            survival = _pad_years(survival, n_years)
+            self.survival_sum = _pad_years(self.survival_sum, n_years)
+            # Sum the curves for each mRS:
+            one_hot = (mrs == np.arange(6)[:, np.newaxis]).astype(float)
+            self.survival_sum += one_hot @ survival
+            self.survival_count += one_hot.sum(axis=1)
+
+    def report(self):
+        """
+        Summarise the running totals.
+
+        Returns:
+        --------
+        report - dict. Keys:
+            count                     - np.array. Number of patients
+                                        in each (mRS, sex) group.
+            total                     - dict. Sum of each outcome in
+                                        each group.
+            mean                      - dict. Mean of each outcome in
+                                        each group.
+            variance                  - dict. Sample variance of each
+                                        outcome in each group.
+            overall                   - dict. Count, total, mean and
+                                        variance of each outcome over
+                                        all groups.
+            histograms                - dict. For each outcome with
+                                        bins, a dict of bin_edges,
+                                        counts per group and bin,
+                                        and the underflow and overflow
+                                        counts per group.
+            survival_by_year_by_mrs   - np.array. Mean survival in
+                                        each year, one row per mRS.
+        Arrays for each group have one row per mRS score and one
+        column per sex.
+        """
+        def by_group(values):
+            return values.reshape(self.group_shape + values.shape[1:])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = dict(
+                (key, by_group(np.where(
+                    self.count > 1, self.m2[key] / (self.count - 1), np.nan)))
+                for key in self.keys
+            )
+            mean = dict(
+                (key, by_group(np.where(
+                    self.count > 0, self.mean[key], np.nan)))
+                for key in self.keys
+            )
+
+            # Combine all of the groups:
+            count_all = np.sum(self.count)
+            overall = dict()
+            for key in self.keys:
+                mean_all = np.sum(self.total[key]) / count_all
+                m2_all = np.sum(
+                    self.m2[key] + self.count * (self.mean[key] - mean_all)**2)
+                overall[key] = dict(
+                    count=count_all,
+                    total=np.sum(self.total[key]),
+                    mean=mean_all,
+                    variance=(m2_all / (count_all - 1)
+                              if count_all > 1 else np.nan),
+                )
+
+            survival_by_year_by_mrs = (
+                self.survival_sum /
+                self.survival_count[:, np.newaxis]
+            )
+
+        histograms = dict()
+        for key, edges in self.histogram_bins.items():
+            counts = by_group(self.histogram_counts[key])
+            histograms[key] = dict(
+                bin_edges=edges,
+                counts=counts[..., 1:-1],
+                underflow=counts[..., 0],
+                overflow=counts[..., -1],
+            )
+
+        report = dict(
+            count=by_group(self.count),
+            total=dict((key, by_group(self.total[key])) for key in self.keys),
+            mean=mean,
+            variance=variance,
+            overall=overall,
+            histograms=histograms,
+            survival_by_year_by_mrs=survival_by_year_by_mrs,
+        )
+        return report
+
+
+def aggregate_cohort(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        chunk_size: int = 100000,
+        horizon_mode: str = 'fixed',
+        keys: list = None,
+        histogram_bins: dict = None
+        ):
+    """
+    Summarise a cohort without keeping every patient's results.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages in years.
+    sex            - np.array. Patients' sexes.
+    mrs            - np.array. Patients' mRS scores.
+    fixed_params   - dict. Contains fixed parameters independent
+                     of the model results.
+    chunk_size     - int. Number of patients to calculate at once.
+    horizon_mode   - str. "fixed" or "survival". See
+                     main_calculations_batch().
+    keys           - list. Outcomes to summarise.
+    histogram_bins - dict. Bin edges for each outcome that needs a
+                     histogram.
+
+    Returns:
+    --------
+    report - dict. Output of CohortAggregator.report().
+    """
+    aggregator = CohortAggregator(keys=keys, histogram_bins=histogram_bins)
+    for results in iter_batch_chunks(
+            age, sex, mrs, fixed_params,
+            chunk_size=chunk_size,
+            horizon_mode=horizon_mode
+            ):
+        aggregator.update(results)
+    return aggregator.report()
+
+
+def _pad_years(values, n_years):
+    """
+    Pad the year axis (the last axis) with zeros up to n_years.
+    """
+    n_extra = n_years - values.shape[-1]
+    if n_extra <= 0:
+        return values
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, n_extra)]
+    return np.pad(values, padding)
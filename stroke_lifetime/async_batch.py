@@ -0,0 +1,322 @@
+"""
+Run the batch calculations from asyncio code without blocking.
+
+Web servers and other asyncio programs can't call the batch
+calculations directly for large cohorts because the event loop
+would be blocked until they finish. Here the patients are split into
+chunks and each chunk runs in a thread or process executor while the
+event loop carries on:
+
+    results = await compute_batch(age, sex, mrs, parameter_set='mRS')
+
++ Small requests are calculated straight away in the event loop
+  thread with the NumPy backend, which is quicker than handing them
+  to an executor. They never wait for a compiled kernel or for it
+  to be compiled.
++ At most max_pending_chunks chunks are waiting or running at once
+  across every request that shares an AsyncBatchCalculator. Further
+  requests wait for a free place before submitting their chunks.
++ If the awaiting task is cancelled, its chunks that haven't started
+  yet are cancelled too.
++ Parameter sets given by name are looked up once and then reused.
++ Chunks in a thread pool run at the same time, except with Numba's
+  workqueue threading layer, which only runs one compiled kernel at
+  a time in each process.
+
+Only the headline outcomes from calculate_outcomes_batch() are
+returned, not the year-by-year results.
+"""
+# Imports:
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import sys
+import threading
+
+import numpy as np
+
+from . import jit_kernels
+from .batch_calculations import calculate_outcomes_batch
+from .parameter_sets import get_parameter_set
+
+
+# Numba's workqueue threading layer can't run parallel kernels from
+# several threads at once, so with that layer only one compiled
+# kernel runs at a time in each process. Other layers don't need it.
+_kernel_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=32)
+def find_cached_parameter_set(name: str):
+    """
+    Look up a parameter set by name once per process.
+
+    Inputs:
+    -------
+    name - str. "mRS", "Dichotomous", or a name given to
+           parameter_sets.register_parameter_set().
+
+    Returns:
+    --------
+    fixed_params - dict. Shared between calls, so don't change it.
+    """
+    return get_parameter_set(name)
+
+
+def calculate_chunk(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        parameter_set: str or dict,
+        backend: str = 'auto'
+        ):
+    """
+    Calculate the headline outcomes for one chunk of patients.
+
+    Chunks of large requests run in the executor, so this only takes
+    arguments that can be sent to another process. Small requests
+    call it directly in the event loop thread.
+
+    Inputs:
+    -------
+    age           - np.array. Patients' ages in years.
+    sex           - np.array. Patients' sexes.
+    mrs           - np.array. Patients' mRS scores.
+    parameter_set - str or dict. Name of a parameter set, or the
+                    fixed parameters themselves.
+    backend       - str. See calculate_outcomes_batch().
+
+    Returns:
+    --------
+    results - dict. Output of calculate_outcomes_batch().
+    """
+    if isinstance(parameter_set, str):
+        fixed_params = find_cached_parameter_set(parameter_set)
+    else:
+        fixed_params = parameter_set
+    if backend == 'auto':
+        backend = 'numba' if jit_kernels.NUMBA_AVAILABLE else 'numpy'
+    if backend == 'numba' and not jit_kernels.kernels_thread_safe():
+        with _kernel_lock:
+            return calculate_outcomes_batch(
+                age, sex, mrs, fixed_params, backend=backend)
+    return calculate_outcomes_batch(
+        age, sex, mrs, fixed_params, backend=backend)
+
+
+class AsyncBatchCalculator:
+    """
+    Share an executor and a limit on pending chunks between requests.
+
+    Example:
+    --------
+    async with AsyncBatchCalculator(max_workers=4) as calculator:
+        results = await calculator.compute_batch(
+            age, sex, mrs, parameter_set='mRS')
+    """
+    def __init__(
+            self,
+            executor: concurrent.futures.Executor = None,
+            max_workers: int = None,
+            use_processes: bool = False,
+            chunk_size: int = 50000,
+            max_pending_chunks: int = 8,
+            inline_max_patients: int = 2000,
+            backend: str = 'auto'
+            ):
+        """
+        Set up the calculator. The executor is made on first use.
+
+        Inputs:
+        -------
+        executor            - Executor or None. Executor to run the
+                              chunks in. It is not shut down by
+                              close(). If None, a thread or process
+                              pool is made.
+        max_workers         - int or None. Workers in the pool that
+                              is made when no executor is given.
+        use_processes       - bool. Whether the pool that is made is
+                              a process pool instead of a thread pool.
+        chunk_size          - int. Most patients in each chunk.
+        max_pending_chunks  - int. Most chunks waiting or running at
+                              once across all requests.
+        inline_max_patients - int. Requests with at most this many
+                              patients are calculated straight away
+                              in the event loop thread with the
+                              NumPy backend.
+        backend             - str. "numba", "numpy" or "auto" for
+                              the chunks run in the executor. See
+                              calculate_outcomes_batch().
+        """
+        if chunk_size < 1:
+            raise ValueError(
+                f'chunk_size must be at least 1, not {chunk_size}.')
+        if max_pending_chunks < 1:
+            raise ValueError(
+                'max_pending_chunks must be at least 1, '
+                f'not {max_pending_chunks}.')
+        self.executor = executor
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks
+        self.inline_max_patients = inline_max_patients
+        self.backend = backend
+        self._own_executor = executor is None
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Shut down the executor if it was made here."""
+        if self._own_executor and self.executor is not None:
+            if sys.version_info >= (3, 9):
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                # cancel_futures is new in Python 3.9. Chunks still
+                # waiting here are cancelled by their own requests.
+                self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def _get_executor(self):
+        """Return the executor, making a pool if needed."""
+        if self.executor is None:
+            if self.use_processes:
+                # Start fresh workers rather than forking this process,
+                # which may have compiled-kernel threads running:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+        return self.executor
+
+    def _get_semaphore(self):
+        """Return the limit on pending chunks for the running loop."""
+        # A semaphore can only be used in one event loop, so make a
+        # new one if e.g. asyncio.run() has been called again.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_pending_chunks)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def compute_batch(
+            self,
+            age: np.array,
+            sex: np.array,
+            mrs: np.array,
+            parameter_set: str or dict = 'mRS'
+            ):
+        """
+        Calculate the headline outcomes without blocking the loop.
+
+        Inputs:
+        -------
+        age           - np.array. Patients' ages in years.
+        sex           - np.array. Patients' sexes, 0 for female and
+                        1 for male.
+        mrs           - np.array. Patients' mRS scores from 0 to 5.
+        parameter_set - str or dict. Name of a built-in or registered
+                        parameter set, or the fixed parameters
+                        themselves. Names are cheaper to send to a
+                        process pool, but sets registered with
+                        register_parameter_set() are not known in
+                        worker processes, so pass those as dicts.
+
+        Returns:
+        --------
+        results - dict. One np.array per key in
+                  jit_kernels.outcome_keys, in the order of the
+                  patients.
+        """
+        age, sex, mrs = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(age, dtype=float)),
+            np.atleast_1d(np.asarray(sex)),
+            np.atleast_1d(np.asarray(mrs, dtype=int))
+            )
+        age, sex, mrs = age.ravel(), sex.ravel(), mrs.ravel()
+        n_patients = age.size
+
+        if n_patients <= self.inline_max_patients:
+            # NumPy never waits for _kernel_lock, so the loop isn't
+            # blocked by chunks running in the executor:
+            return calculate_chunk(
+                age, sex, mrs, parameter_set, backend='numpy')
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        semaphore = self._get_semaphore()
+        futures = []
+        try:
+            for start in range(0, n_patients, self.chunk_size):
+                chunk = slice(start, start + self.chunk_size)
+                # Wait here while too many chunks are pending:
+                await semaphore.acquire()
+                try:
+                    future = loop.run_in_executor(
+                        executor, calculate_chunk,
+                        age[chunk], sex[chunk], mrs[chunk],
+                        parameter_set, self.backend
+                        )
+                except BaseException:
+                    semaphore.release()
+                    raise
+                future.add_done_callback(lambda _: semaphore.release())
+                futures.append(future)
+            chunk_results = await asyncio.gather(*futures)
+        except BaseException:
+            # Cancel any chunks that haven't started yet:
+            for future in futures:
+                future.cancel()
+            raise
+
+        # Parameter set axes come before the patient axis:
+        results = dict(
+            (key, np.concatenate(
+                [chunk[key] for chunk in chunk_results], axis=-1))
+            for key in chunk_results[0]
+        )
+        return results
+
+
+# Calculator used by compute_batch(), made on first use:
+_default_calculator = None
+
+
+def get_default_calculator():
+    """
+    Return the calculator shared by calls to compute_batch().
+
+    Returns:
+    --------
+    calculator - AsyncBatchCalculator. Uses a thread pool with the
+                 default settings.
+    """
+    global _default_calculator
+    if _default_calculator is None:
+        _default_calculator = AsyncBatchCalculator()
+    return _default_calculator
+
+
+async def compute_batch(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        parameter_set: str or dict = 'mRS'
+        ):
+    """
+    Calculate the headline outcomes with the shared calculator.
+
+    Inputs and returns are the same as
+    AsyncBatchCalculator.compute_batch().
+    """
+    return await get_default_calculator().compute_batch(
+        age, sex, mrs, parameter_set=parameter_set)
@@ -0,0 +1,1188 @@
+"""
+Set up the batch calculations in this script.
+
+The function main_calculations_batch() runs through the same
+calculations as main_calculations() but for many patients at once.
+Every result is stored as a np.array with one row per patient.
+Results that main_calculations() stores as one list per patient,
+e.g. the values for each year, become 2D arrays with one column
+per year. Rows for patients with shorter lists are padded.
+"""
+# Imports:
+import itertools
+
+import numpy as np
+
+# Import functions for calculating various quantities:
+from . import models as model
+from . import jit_kernels
+from . import recosting
+from . import discounting
+from .fixed_params import get_fixed_params
+
+
+# #####################################################################
+# ######################## Overall function ###########################
+# #####################################################################
+
+def main_calculations_batch(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        horizon_mode: str = 'fixed',
+        patient_params: dict = None,
+        horizons: list = None
+        ):
+    """
+    Calculates everything useful for lifetime outcomes for a batch.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages in years. A missing
+                     age gives a row of Not A Number values.
+    sex            - np.array. Patients' sexes, 0 for female and
+                     1 for male.
+    mrs            - np.array. Patients' mRS scores from 0 to 5.
+                     Any other value, e.g. 6 (dead), gives a row of
+                     placeholder Not A Number values.
+    fixed_params   - dict. Contains fixed parameters independent
+                     of the model results. This can also be several
+                     parameter sets from stack_fixed_params(). Then
+                     every result except "years" has an extra first
+                     axis with one entry per parameter set.
+    horizon_mode   - str. Either "fixed" or "survival". "fixed"
+                     tabulates every year up to
+                     time_max_post_discharge_year for every patient,
+                     exactly like main_calculations(). "survival" stops
+                     calculating each patient's mortality at the
+                     first whole year when their survival reaches zero
+                     and fills in the remaining years without doing
+                     the maths. The year columns then only extend as
+                     far as the longest-surviving patient needs.
+    patient_params - dict or None. Parameters already gathered by
+                     gather_patient_params(), e.g. with some values
+                     changed for individual patients. If None, they
+                     are gathered from fixed_params.
+    horizons       - list or None. Numbers of whole years after
+                     discharge to stop counting at, e.g.
+                     [1, 5, 10, np.inf] where np.inf is lifetime.
+                     If given, the cumulative results at each horizon
+                     are also returned.
+
+    Returns:
+    --------
+    results - dict. All of the useful results. The keys match those
+              from main_calculations() except that there are no
+              string labels for sex and model type. Scalar results
+              are np.arrays with one value per patient. Keys that
+              contain one value per year are 2D np.arrays:
+        years                          - np.array. Shared years.
+        hazard_by_year                 - one column per year in
+                                         "years".
+        survival_by_year               - one column per year in
+                                         "years".
+        fhazard_by_year                - one column per year in
+                                         "years".
+        death_in_year_n_probs          - one column per year in
+                                         "years" excluding year 0.
+        qalys_by_year                  - one column per year from
+        raw_qalys_by_year                discharge up to the longest
+        ae_counts_by_year                median survival (rounded
+        nel_counts_by_year               up). Years after a
+        el_counts_by_year                patient's median survival
+        care_years_by_year               contain zero, or Not A
+        ae_discounted_by_year            Number for the raw QALYs.
+        nel_discounted_by_year
+        el_discounted_by_year
+        care_years_discounted_by_year
+              There are also extra keys:
+        active_horizon_years           - np.array. Last year
+                                         calculated for each patient.
+        discounted_resource_quantities - np.array. One column per
+                                         resource in
+                                         recosting.resource_labels.
+        qalys_undiscounted_by_year     - np.array. The QALYs in each
+                                         year before discounting, with
+                                         the same columns as
+                                         qalys_by_year.
+              If horizons are given, there are also the keys from
+              find_horizon_results().
+    """
+    if horizon_mode not in ['fixed', 'survival']:
+        raise ValueError(
+            f'horizon_mode must be "fixed" or "survival", '
+            f'not "{horizon_mode}".')
+
+    # Make sure all of the patient details are arrays of one shape:
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    # Patients with mRS 6 (dead) or other invalid values are
+    # calculated with mRS 0 as a placeholder and then blanked out.
+    # So are patients with a missing age.
+    valid = (mrs >= 0) & (mrs <= 5) & np.isfinite(age)
+    mrs_index = np.where(valid, mrs, 0)
+
+    # Look up each patient's coefficients:
+    if patient_params is None:
+        patient_params = gather_patient_params(
+            fixed_params, age, mrs_index)
+
+    # ##### Mortality #####
+    results = find_mortality_batch(
+        age,
+        sex,
+        patient_params,
+        fixed_params['time_max_post_discharge_year'],
+        horizon_mode=horizon_mode
+        )
+    # Blank out the median for invalid patients so that they don't
+    # affect the number of year columns for QALYs and resources.
+    survival_median_years = np.where(
+        valid, results['survival_median_years'], np.nan)
+
+    # ##### QALYs #####
+    results.update(calculate_qaly_batch(
+        survival_median_years, age, sex, patient_params))
+
+    # ##### Resource use #####
+    results.update(find_resource_use_batch(
+        survival_median_years, age, sex, patient_params))
+
+    # ##### COST EFFECTIVENESS #####
+    results['net_benefit'] = (
+        patient_params['wtp_qaly_gpb'] * results['qalys_total'] -
+        results['total_discounted_cost']
+        )
+    if horizons is not None:
+        results.update(find_horizon_results(
+            results, patient_params, horizons))
+
+    # ##### General #####
+    # Replace results for invalid patients with Not A Number.
+    # Results have any parameter set axes first, then the patient
+    # axes, then e.g. one axis for years.
+    n_set_axes = np.ndim(fixed_params['lg_coeffs']) - 1
+    for key, values in results.items():
+        if key in ['years', 'horizons']:
+            continue
+        values = np.asarray(values, dtype=float)
+        n_extra_axes = max(values.ndim - n_set_axes - valid.ndim, 0)
+        results[key] = np.where(
+            valid.reshape(valid.shape + (1,) * n_extra_axes),
+            values,
+            np.nan
+            )
+    results['active_horizon_years'] = np.where(
+        valid, results['active_horizon_years'], 0).astype(int)
+
+    results['age'] = age
+    results['sex'] = sex
+    results['mrs'] = mrs
+    results['outcome_type'] = np.where(
+        valid, np.where(mrs > 2, 'Dependent', 'Independent'), 'n/a')
+    return results
+
+
+def main_calculations_batch_both_models(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        horizon_mode: str = 'fixed'
+        ):
+    """
+    Calculate the batch results for the mRS and Dichotomous models.
+
+    Both parameter sets are stacked and run together, so the work
+    that only depends on the patients (the year grid, discounting,
+    the age terms for QALYs and the age split for care homes) is
+    only set up once.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    mrs          - np.array. Patients' mRS scores from 0 to 5.
+    horizon_mode - str. "fixed" or "survival". See
+                   main_calculations_batch().
+
+    Returns:
+    --------
+    paired - dict. Keys "mRS" and "Dichotomous". Each value is a dict
+             of results like from main_calculations_batch() with an
+             extra "model_type" key. "years", "age", "sex", "mrs" and
+             "outcome_type" don't depend on the model so both dicts
+             hold the same arrays. Every other result is that
+             model's row of the stacked results. The year columns
+             are shared, so they extend as far as the longer of the
+             two models needs.
+    """
+    model_types = ['mRS', 'Dichotomous']
+    fixed_params = stack_fixed_params(
+        [get_fixed_params(model_type) for model_type in model_types])
+    results = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+
+    # These results don't depend on the model type:
+    shared_keys = ['years', 'age', 'sex', 'mrs', 'outcome_type']
+    paired = dict()
+    for i, model_type in enumerate(model_types):
+        paired[model_type] = dict(
+            (key, values if key in shared_keys else values[i])
+            for key, values in results.items()
+        )
+        paired[model_type]['model_type'] = model_type
+    return paired
+
+
+def calculate_outcomes_batch(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        backend: str = 'auto',
+        patient_params: dict = None
+        ):
+    """
+    Calculate only the headline outcomes for a batch of patients.
+
+    The headline outcomes are the values in jit_kernels.outcome_keys,
+    e.g. median survival, QALYs, discounted costs and net benefit.
+    None of the year-by-year results are kept.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages in years.
+    sex            - np.array. Patients' sexes, 0 for female and
+                     1 for male.
+    mrs            - np.array. Patients' mRS scores from 0 to 5.
+    fixed_params   - dict. Contains fixed parameters independent
+                     of the model results, or several parameter sets
+                     from stack_fixed_params().
+    backend        - str. "numba", "numpy" or "auto". "numba" runs
+                     compiled kernels in parallel and needs Numba to be
+                     installed. "numpy" picks the results out of
+                     main_calculations_batch(). "auto" uses "numba"
+                     when it is available and "numpy" otherwise.
+    patient_params - dict or None. Parameters already gathered by
+                     gather_patient_params(). If None, they are
+                     gathered from fixed_params.
+
+    Returns:
+    --------
+    results - dict. One np.array per outcome with one value per
+              patient, and one row per parameter set if the
+              parameters are stacked.
+    """
+    if backend == 'auto':
+        backend = 'numba' if jit_kernels.NUMBA_AVAILABLE else 'numpy'
+    if backend not in ['numba', 'numpy']:
+        raise ValueError(
+            f'backend must be "numba", "numpy" or "auto", not "{backend}".')
+
+    if backend == 'numpy':
+        results = main_calculations_batch(
+            age, sex, mrs, fixed_params, patient_params=patient_params)
+        return dict((key, results[key]) for key in jit_kernels.outcome_keys)
+
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    valid = (mrs >= 0) & (mrs <= 5)
+    if patient_params is None:
+        patient_params = gather_patient_params(
+            fixed_params, age, np.where(valid, mrs, 0))
+    results = jit_kernels.calculate_outcomes(age, sex, patient_params)
+    # Replace results for invalid patients with Not A Number:
+    for key, values in results.items():
+        results[key] = np.where(valid, values, np.nan)
+    return results
+
+
+def iter_batch_chunks(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        chunk_size: int = 100000,
+        horizon_mode: str = 'fixed'
+        ):
+    """
+    Run main_calculations_batch() on consecutive chunks of patients.
+
+    Only one chunk of results exists at a time so the memory needed
+    depends on the chunk size and not on the number of patients.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes.
+    mrs          - np.array. Patients' mRS scores.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    chunk_size   - int. Maximum number of patients in each chunk.
+    horizon_mode - str. "fixed" or "survival". See
+                   main_calculations_batch().
+
+    Yields:
+    -------
+    results - dict. Output of main_calculations_batch() for the
+              next chunk of patients.
+    """
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    for start in range(0, age.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        yield main_calculations_batch(
+            age[chunk], sex[chunk], mrs[chunk], fixed_params,
+            horizon_mode=horizon_mode
+            )
+
+
+def iter_main_calculations(
+        patients,
+        fixed_params: dict,
+        chunk_size: int = 10000,
+        yield_chunks: bool = False,
+        horizon_mode: str = 'fixed'
+        ):
+    """
+    Lazily calculate the results for a stream of patients.
+
+    The patients are read from the iterable one chunk at a time and
+    each chunk is run through main_calculations_batch(). Only one
+    chunk of patients and results is held at once, so the memory
+    needed stays the same however many patients there are. The
+    iterable can be e.g. a generator or an open file reader.
+
+    Inputs:
+    -------
+    patients     - iterable. Each patient is either a dict with keys
+                   "age", "sex" and "mrs" or a sequence of
+                   (age, sex, mrs).
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results, or several parameter sets
+                   from stack_fixed_params().
+    chunk_size   - int. Maximum number of patients in each chunk.
+    yield_chunks - bool. If True, yield the results for each chunk
+                   as one dict of arrays. If False, yield one dict
+                   per patient.
+    horizon_mode - str. "fixed" or "survival". See
+                   main_calculations_batch().
+
+    Yields:
+    -------
+    results - dict. If yield_chunks is True, the output of
+              main_calculations_batch() for the next chunk. Otherwise
+              the same keys for the next patient, where each value is
+              that patient's row. The "years" are shared by every
+              patient in a chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be at least 1, not {chunk_size}.')
+    # Results with no parameter set axis:
+    patient_keys = ['age', 'sex', 'mrs', 'outcome_type']
+    n_set_axes = np.ndim(fixed_params['lg_coeffs']) - 1
+    patients = iter(patients)
+    while True:
+        records = list(itertools.islice(patients, chunk_size))
+        if len(records) == 0:
+            return
+        age, sex, mrs = _unpack_patient_records(records)
+        results = main_calculations_batch(
+            age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+        if yield_chunks:
+            yield results
+            continue
+        # Split every result into its rows up front, which is much
+        # quicker than indexing each array once per patient:
+        keys = [key for key in results if key != 'years']
+        rows = [
+            list(results[key] if key in patient_keys else
+                 np.moveaxis(results[key], n_set_axes, 0))
+            for key in keys
+        ]
+        for patient_rows in zip(*rows):
+            patient_results = dict(zip(keys, patient_rows))
+            patient_results['years'] = results['years']
+            yield patient_results
+
+
+def _unpack_patient_records(records: list):
+    """Split patient records into arrays of age, sex and mRS."""
+    if isinstance(records[0], dict):
+        columns = [[record[key] for record in records]
+                   for key in ['age', 'sex', 'mrs']]
+    else:
+        columns = zip(*records)
+    age, sex, mrs = [np.asarray(column) for column in columns]
+    return age.astype(float), sex, mrs.astype(int)
+
+
+def stack_fixed_params(fixed_params_list: list):
+    """
+    Stack several sets of fixed parameters for one batch run.
+
+    Every numerical value gets a new first axis with one entry per
+    parameter set. gather_patient_params() keeps this axis, so all
+    of the batch calculations run for every parameter set and every
+    patient at once and the linear predictors, survival grids and
+    discounting are all worked out in one pass. The year-by-year
+    arrays then have one value per set, patient and year, so large
+    cohorts are best run in chunks with iter_batch_chunks().
+
+    Inputs:
+    -------
+    fixed_params_list - list of dicts. Each dict contains fixed
+                        parameters, e.g. from get_fixed_params() or
+                        parameter_sets.get_parameter_set(). They must
+                        all have the same time_max_post_discharge_year
+                        because the sets share one year grid, and
+                        each parameter must have the same shape in
+                        every set.
+
+    Returns:
+    --------
+    stacked - dict. The same keys as the input dicts. Each value is
+              an np.array with one row per parameter set, except for
+              the shared time_max_post_discharge_year.
+    """
+    if len(fixed_params_list) == 0:
+        raise ValueError('At least one parameter set is needed.')
+    time_max_post_discharge_years = set(
+        fixed_params['time_max_post_discharge_year']
+        for fixed_params in fixed_params_list
+    )
+    if len(time_max_post_discharge_years) > 1:
+        raise ValueError(
+            'All parameter sets must have the same '
+            'time_max_post_discharge_year, not '
+            f'{sorted(time_max_post_discharge_years)}.')
+
+    stacked = dict(
+        time_max_post_discharge_year=time_max_post_discharge_years.pop())
+    for key in fixed_params_list[0].keys():
+        if key in stacked or any(
+                key not in fixed_params for fixed_params in fixed_params_list):
+            continue
+        values = [fixed_params[key] for fixed_params in fixed_params_list]
+        if isinstance(values[0], str):
+            # Labels such as the model type:
+            stacked[key] = np.array(values)
+        else:
+            values = [np.asarray(value, dtype=float) for value in values]
+            shapes = set(value.shape for value in values)
+            if len(shapes) > 1:
+                raise ValueError(
+                    f'All parameter sets must have the same shape of '
+                    f'{key}, not {sorted(shapes)}.')
+            stacked[key] = np.stack(values)
+    return stacked
+
+
+def gather_patient_params(
+        fixed_params: dict,
+        age: np.array,
+        mrs: np.array
+        ):
+    """
+    Look up the parameters that apply to each patient.
+
+    Parameters that depend on mRS (e.g. utility) or on age (e.g. the
+    care home rates) are picked out for each patient. Coefficients
+    that are shared by everyone are given a trailing axis so that
+    they broadcast against the patient arrays. Leading axes in the
+    fixed parameter values are kept.
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    age          - np.array. Patients' ages in years.
+    mrs          - np.array. Patients' mRS scores from 0 to 5.
+
+    Returns:
+    --------
+    patient_params - dict. Parameter values that broadcast against
+                     the patient arrays.
+    """
+    def pick(key, index):
+        # Select from the last axis of the parameter table:
+        return np.asarray(fixed_params[key], dtype=float)[..., index]
+
+    def shared(key):
+        # Add a patient axis to a single value:
+        return np.asarray(fixed_params[key], dtype=float)[..., np.newaxis]
+
+    # Choose which care home percentage rate to use based on age.
+    # Define the "Average care (Years)" from Resource_Use sheet
+    # as in model.find_average_care_year_per_mRS().
+    average_care_year = 0.95 * np.where(
+        age > 70,
+        pick('perc_care_home_over70', mrs),
+        pick('perc_care_home_not_over70', mrs)
+        )
+
+    patient_params = dict(
+        # ----- Mortality -----
+        lg_mean_age=pick('lg_mean_ages', mrs),
+        lg_constant=pick('lg_coeffs', [0]),
+        lg_age=pick('lg_coeffs', [1]),
+        lg_male=pick('lg_coeffs', [2]),
+        lg_mrs=pick('lg_coeffs', 3 + mrs),
+        gz_mean_age=shared('gz_mean_age'),
+        gz_constant=pick('gz_coeffs', [0]),
+        gz_age=pick('gz_coeffs', [1]),
+        gz_age2=pick('gz_coeffs', [2]),
+        gz_male=pick('gz_coeffs', [3]),
+        gz_mrs_age=pick('gz_coeffs', 4 + mrs),
+        gz_mrs=pick('gz_coeffs', 10 + mrs),
+        gz_gamma=shared('gz_gamma'),
+        # ----- QALYs -----
+        utility=pick('utility_list', mrs),
+        qaly_age_coeff=shared('qaly_age_coeff'),
+        qaly_age2_coeff=shared('qaly_age2_coeff'),
+        qaly_sex_coeff=shared('qaly_sex_coeff'),
+        discount_factor_QALYs_perc=shared('discount_factor_QALYs_perc'),
+        discount_factor_costs_perc=shared('discount_factor_costs_perc'),
+        # ----- Resource use -----
+        ae_constant=pick('ae_coeffs', [0]),
+        ae_age=pick('ae_coeffs', [1]),
+        ae_sex=pick('ae_coeffs', [2]),
+        ae_gamma=pick('ae_coeffs', [3]),
+        ae_mrs=pick('ae_mRS', mrs),
+        nel_constant=pick('nel_coeffs', [0]),
+        nel_age=pick('nel_coeffs', [1]),
+        nel_sex=pick('nel_coeffs', [2]),
+        nel_gamma=pick('nel_coeffs', [3]),
+        nel_mrs=pick('nel_mRS', mrs),
+        el_constant=pick('el_coeffs', [0]),
+        el_age=pick('el_coeffs', [1]),
+        el_sex=pick('el_coeffs', [2]),
+        el_gamma=pick('el_coeffs', [3]),
+        el_mrs=pick('el_mRS', mrs),
+        average_care_year=average_care_year,
+        # ----- Costs -----
+        cost_ae_gbp=shared('cost_ae_gbp'),
+        cost_non_elective_bed_day_gbp=shared('cost_non_elective_bed_day_gbp'),
+        cost_elective_bed_day_gbp=shared('cost_elective_bed_day_gbp'),
+        cost_residential_day_gbp=shared('cost_residential_day_gbp'),
+        wtp_qaly_gpb=shared('wtp_qaly_gpb'),
+    )
+    return patient_params
+
+
+# #####################################################################
+# ############################ Mortality ##############################
+# #####################################################################
+
+def find_mortality_batch(
+        age: np.array,
+        sex: np.array,
+        patient_params: dict,
+        time_max_post_discharge_year: int,
+        horizon_mode: str = 'fixed'
+        ):
+    """
+    Calculate the mortality results for a batch of patients.
+
+    Inputs:
+    -------
+    age                          - np.array. Patients' ages.
+    sex                          - np.array. Patients' sexes.
+    patient_params               - dict. Output from
+                                   gather_patient_params().
+    time_max_post_discharge_year - int. Last year to tabulate.
+    horizon_mode                 - str. "fixed" or "survival". See
+                                   main_calculations_batch().
+
+    Returns:
+    --------
+    results - dict. Mortality results with the same keys as in
+              main_calculations() plus "active_horizon_years".
+    """
+    p = patient_params
+
+    # Linear predictors:
+    death_in_year_1_lp, death_in_year_n_lp = find_lpDeath_batch(
+        age, sex, patient_params)
+    gz_gamma = np.broadcast_to(p['gz_gamma'], death_in_year_n_lp.shape)
+
+    # Probability of death in year 1:
+    death_in_year_1_prob = model.find_pDeath_year1(death_in_year_1_lp)
+
+    # Years from discharge to when survival probability is zero.
+    year_when_zero_survival = find_time_for_zero_survival_batch(
+        gz_gamma, death_in_year_1_prob, death_in_year_n_lp)
+
+    # Last year to calculate for each patient:
+    if horizon_mode == 'survival':
+        # Patients with a missing age or invalid mRS have no time of
+        # zero survival. Mark them with -1 so that they don't set
+        # the number of years and their rows are Not A Number:
+        known = np.isfinite(year_when_zero_survival)
+        active_horizon_years = np.where(
+            known,
+            np.minimum(
+                np.ceil(np.where(known, year_when_zero_survival, 0.0)),
+                time_max_post_discharge_year
+                ),
+            -1
+            ).astype(int)
+        year_max = np.max(active_horizon_years, initial=1)
+    else:
+        active_horizon_years = np.full(
+            death_in_year_1_prob.shape, time_max_post_discharge_year)
+        year_max = time_max_post_discharge_year
+    years = np.arange(0, year_max + 1, 1)
+
+    # Hazard and survival:
+    hazard_by_year, survival_by_year, fhazard_by_year, fdeath_by_year = (
+        find_cumhazard_with_time_batch(
+            years,
+            gz_gamma,
+            death_in_year_1_prob,
+            death_in_year_n_lp,
+            active_horizon_years
+            ))
+
+    # First index where the calculated probability of death is
+    # invalid, plus one as in main_calculations().
+    invalid = hazard_by_year >= 1.0
+    death_in_year_n_probs_first_invalid_index = np.where(
+        np.any(invalid, axis=-1),
+        np.argmax(invalid, axis=-1) + 1.0,
+        np.nan
+        )
+
+    # Probability of death during each year from year 1.
+    # Same as model.find_iDeath() but using every year at once.
+    death_in_year_n_probs = np.concatenate((
+        death_in_year_1_prob[..., np.newaxis],
+        1.0 - np.exp(fdeath_by_year[..., 1:-1] - fdeath_by_year[..., 2:])
+        ), axis=-1)
+
+    # Survival times: median, lower quartile and upper quartile.
+    survival_times, _, _, _ = model.find_survival_time_quantiles(
+        [0.5, 0.25, 0.75],
+        death_in_year_1_prob.ravel(),
+        death_in_year_n_lp.ravel(),
+        gz_gamma.ravel()
+        )
+    survival_times = survival_times.reshape(
+        death_in_year_1_prob.shape + (3,))
+    survival_median_years = survival_times[..., 0]
+    survival_mean_years = model.find_mean_survival_time(
+        death_in_year_1_prob.ravel(),
+        death_in_year_n_lp.ravel(),
+        gz_gamma.ravel()
+        ).reshape(death_in_year_1_prob.shape)
+
+    results = dict(
+        death_in_year_1_lp=death_in_year_1_lp,
+        death_in_year_1_prob=death_in_year_1_prob,
+        death_in_year_n_lp=death_in_year_n_lp,
+        years=years,
+        active_horizon_years=active_horizon_years,
+        hazard_by_year=hazard_by_year,
+        survival_by_year=survival_by_year,
+        fhazard_by_year=fhazard_by_year,
+        death_in_year_n_probs=death_in_year_n_probs,
+        death_in_year_n_probs_first_invalid_index=(
+            death_in_year_n_probs_first_invalid_index),
+        survival_median_years=survival_median_years,
+        survival_lower_quartile_years=survival_times[..., 1],
+        survival_upper_quartile_years=survival_times[..., 2],
+        survival_mean_years=survival_mean_years,
+        life_expectancy=survival_median_years + age,
+        year_when_zero_survival=year_when_zero_survival,
+        )
+    return results
+
+
+def find_lpDeath_batch(
+        age: np.array,
+        sex: np.array,
+        patient_params: dict
+        ):
+    """
+    Calculate the linear predictors for death for a batch.
+
+    Same sums as in model.find_lpDeath_year1() and
+    model.find_lpDeath_yearn() but for a column of patients.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages.
+    sex            - np.array. Patients' sexes.
+    patient_params - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    death_in_year_1_lp - np.array. Linear predictor for death during
+                         year 1 (logistic model).
+    death_in_year_n_lp - np.array. Linear predictor for death after
+                         year 1 (Gompertz model).
+    """
+    p = patient_params
+    age_norm_lg = age - p['lg_mean_age']
+    death_in_year_1_lp = (
+        p['lg_constant'] +
+        p['lg_age'] * age_norm_lg +
+        p['lg_male'] * sex +
+        p['lg_mrs']
+    )
+    age_norm_gz = age - p['gz_mean_age']
+    death_in_year_n_lp = (
+        p['gz_constant'] +
+        p['gz_age'] * age_norm_gz +
+        p['gz_age2'] * ((age**2.0) - p['gz_mean_age']**2.0) +
+        p['gz_male'] * sex +
+        p['gz_mrs_age'] * age_norm_gz +
+        p['gz_mrs']
+    )
+    return death_in_year_1_lp, death_in_year_n_lp
+
+
+def find_time_for_zero_survival_batch(
+        gz_gamma: np.array,
+        p_death_year1: np.array,
+        lp_yearn: np.array
+        ):
+    """
+    Find the time when survival reaches zero for a batch of patients.
+
+    This is model.find_time_for_this_hazard() with hazard_prob=1.0.
+
+    Inputs:
+    -------
+    gz_gamma      - np.array. Gompertz gamma coefficient.
+    p_death_year1 - np.array. Probability of death in year 1.
+    lp_yearn      - np.array. Linear predictor for probability of
+                    death after year 1.
+
+    Returns:
+    --------
+    years_to_hazard - np.array. Years from discharge until survival
+                      is zero.
+    """
+    hazard_prob = 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Invert the pDeath_yearn formula to get time:
+        x = (gz_gamma * hazard_prob * np.exp(-lp_yearn)) + 1.0
+        years_gompertz = (np.log(x) / gz_gamma) / 365 + 1
+        # Placeholder case for when year one is already certain death:
+        years_year1 = (
+            np.log(hazard_prob) /
+            (np.log(1.0 - p_death_year1)/365.0)
+            / 365.0
+        )
+    years_to_hazard = np.where(
+        p_death_year1 < hazard_prob, years_gompertz, years_year1)
+    return years_to_hazard
+
+
+def find_cumhazard_with_time_batch(
+        years: np.array,
+        gz_gamma: np.array,
+        death_in_year_1_prob: np.array,
+        death_in_year_n_lp: np.array,
+        active_horizon_years: np.array
+        ):
+    """
+    Find cumulative probability of death and survival for a batch.
+
+    This is find_cumhazard_with_time() from main_calculations.py
+    for many patients at once. Only the years up to and including
+    each patient's active horizon are calculated. Later years are
+    filled in with zero survival for the cumulative probabilities
+    and Not A Number for the other arrays. Patients with a negative
+    active horizon get Not A Number in every year.
+
+    Inputs:
+    -------
+    years                - np.array. Integer years from 0.
+    gz_gamma             - np.array. Gompertz gamma coefficient.
+    death_in_year_1_prob - np.array. Probability of death in year 1.
+    death_in_year_n_lp   - np.array. Linear predictor for
+                           probability of death after year 1.
+    active_horizon_years - np.array. Last year to calculate for
+                           each patient.
+
+    Returns:
+    --------
+    death_in_year_n_probs - np.array. Cumulative probability of death
+                            in each year, capped at 1.0.
+    survival_by_year      - np.array. Survival for each year.
+    hazard_by_year        - np.array. Gompertz hazard for each year.
+    fdeath_by_year        - np.array. Cumulative probability of
+                            death in each year without the cap.
+    """
+    batch_shape = death_in_year_1_prob.shape
+    grid_shape = batch_shape + years.shape
+
+    # Pick out only the (patient, year) cells that need calculating.
+    # Flat indices are used because indexing with one array is much
+    # quicker than with one array per axis.
+    active = years <= active_horizon_years[..., np.newaxis]
+    cells = np.flatnonzero(active)
+    cell_patients, cell_year_index = np.divmod(cells, years.size)
+    cell_years = years[cell_year_index]
+
+    def at_cells(values):
+        # Value for the patient in each active cell:
+        return np.broadcast_to(values, batch_shape).ravel()[cell_patients]
+
+    p1_cells = at_cells(death_in_year_1_prob)
+    hazard_cells, fdeath_cells = model.find_FDeath_yearn(
+        cell_years,
+        at_cells(gz_gamma),
+        p1_cells,
+        at_cells(death_in_year_n_lp)
+        )
+    # Year 0 has no deaths and year 1 uses the logistic model:
+    fdeath_cells = np.where(cell_years == 1, p1_cells, fdeath_cells)
+    fdeath_cells = np.where(cell_years == 0, 0.0, fdeath_cells)
+    hazard_cells = np.where(cell_years < 2, 0.0, hazard_cells)
+
+    # Store the cells in the full grids:
+    fdeath_by_year = np.full(grid_shape, np.nan)
+    fdeath_by_year.reshape(-1)[cells] = fdeath_cells
+    hazard_by_year = np.full(grid_shape, np.nan)
+    hazard_by_year.reshape(-1)[cells] = hazard_cells
+    # Manual override if the value is too big, and every year
+    # after the active horizon has certain death:
+    death_in_year_n_probs = np.ones(grid_shape)
+    death_in_year_n_probs.reshape(-1)[cells] = np.minimum(fdeath_cells, 1.0)
+    death_in_year_n_probs[active_horizon_years < 0] = np.nan
+
+    # Convert to survival:
+    survival_by_year = 1.0 - death_in_year_n_probs
+    return (death_in_year_n_probs, survival_by_year, hazard_by_year,
+            fdeath_by_year)
+
+
+# #####################################################################
+# ############################## QALYs ################################
+# #####################################################################
+
+def calculate_qaly_batch(
+        med_survival_years: np.array,
+        age: np.array,
+        sex: np.array,
+        patient_params: dict
+        ):
+    """
+    Calculate the number of QALYs up until the median survival time.
+
+    This is model.calculate_qaly() for many patients at once.
+
+    Inputs:
+    -------
+    med_survival_years - np.array. Median survival time in years.
+    age                - np.array. Patients' ages in years.
+    sex                - np.array. Patients' sexes.
+    patient_params     - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    results - dict. Contains qalys_total, qalys_by_year,
+              qalys_undiscounted_by_year and raw_qalys_by_year.
+    """
+    p = patient_params
+    # One column per year from 0 to the longest median survival:
+    year_max = np.nanmax(np.ceil(med_survival_years), initial=0)
+    year = np.arange(0, year_max)
+
+    # Add a year axis to everything:
+    med = med_survival_years[..., np.newaxis]
+    age_ = age[..., np.newaxis]
+    average_age = p['lg_mean_age'][..., np.newaxis]
+
+    # Calculate raw QALY:
+    raw_qaly = (
+        p['utility'][..., np.newaxis] -
+        ((age_+year) - average_age) * p['qaly_age_coeff'][..., np.newaxis] -
+        ((age_+year)**2.0 - average_age**2.0) *
+        p['qaly_age2_coeff'][..., np.newaxis] +
+        sex[..., np.newaxis] * p['qaly_sex_coeff'][..., np.newaxis]
+    )
+    raw_qaly = np.minimum(raw_qaly, 1.0)
+
+    # Calculate discounted QALY:
+    discount = discounting.find_discount_factors(
+        p['discount_factor_QALYs_perc'], year.size)
+    qaly = raw_qaly * discount
+
+    # Scale factors as in model.calculate_qaly().
+    alive = year < med
+    not_final_year = (year + age_ + 1) < (med + age_)
+    final_year = alive & ~not_final_year & (
+        (year + age_ + 1) < (med + age_ + 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Digits after the decimal place of the median survival
+        # in years, or the median itself when it is under one year:
+        scale_final = np.where(
+            year == 0, med, np.mod(med, np.floor(med)))
+    scale_factor = np.where(
+        alive & not_final_year, 1.0,
+        np.where(final_year, scale_final, 0.0)
+        )
+    qalys_by_year = qaly * scale_factor
+
+    results = dict(
+        qalys_total=np.sum(qalys_by_year, axis=-1),
+        qalys_by_year=qalys_by_year,
+        qalys_undiscounted_by_year=raw_qaly * scale_factor,
+        raw_qalys_by_year=np.where(alive, raw_qaly, np.nan),
+    )
+    return results
+
+
+# #####################################################################
+# ############################ Resources ##############################
+# #####################################################################
+
+def find_resource_use_batch(
+        med_survival_years: np.array,
+        age: np.array,
+        sex: np.array,
+        patient_params: dict
+        ):
+    """
+    Calculate resource use and discounted costs for a batch.
+
+    Inputs:
+    -------
+    med_survival_years - np.array. Median survival time in years.
+    age                - np.array. Patients' ages in years.
+    sex                - np.array. Patients' sexes.
+    patient_params     - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    results - dict. Contains the linear predictors, counts, counts
+              by year, discounted counts by year and discounted
+              costs for each resource, the discounted quantities of
+              all resources, and the total discounted cost.
+    """
+    p = patient_params
+    # Calculate the resource use over all of the years alive:
+    death_year = np.ceil(med_survival_years)
+    years = np.arange(1, np.nanmax(death_year, initial=0) + 1)
+    # Time alive by the end of each year:
+    years_alive = np.minimum(years, med_survival_years[..., np.newaxis])
+
+    # Discount for each year as in
+    # find_discounted_resource_use_for_all_years().
+    discount = discounting.find_discount_factors(
+        p['discount_factor_costs_perc'], years.size)
+
+    results = dict()
+    for resource, count_function in [
+            ('ae', model.find_ae_count),
+            ('nel', model.find_nel_count),
+            ('el', model.find_el_count),
+            ]:
+        lp, coeffs = find_lp_resource_batch(
+            resource, age, sex, patient_params)
+        coeffs = [c[..., np.newaxis] for c in coeffs]
+        # Resource use across the median survival time in years:
+        count = count_function(
+            lp[..., np.newaxis], coeffs, med_survival_years[..., np.newaxis])
+        # Resource use up to the end of each year:
+        cumulative = count_function(lp[..., np.newaxis], coeffs, years_alive)
+        results[f'{resource}_lp'] = lp
+        results[f'{resource}_count'] = count[..., 0]
+        results[f'{resource}_counts_by_year'] = _difference_by_year(
+            cumulative)
+
+    # Care home:
+    average_care_year = p['average_care_year'][..., np.newaxis]
+    results['care_years'] = model.find_residential_care_average_time(
+        p['average_care_year'], med_survival_years)
+    results['care_years_by_year'] = _difference_by_year(
+        model.find_residential_care_average_time(
+            average_care_year, years_alive))
+
+    # Find discounted lists:
+    for resource in recosting.resource_labels:
+        counts_key = (
+            'care_years_by_year' if resource == 'care_years'
+            else f'{resource}_counts_by_year')
+        results[f'{resource}_discounted_by_year'] = (
+            results[counts_key] * discount)
+
+    # Find discounted costs from the discounted quantities of each
+    # resource and the matching unit prices:
+    quantities = recosting.find_discounted_resource_quantities(results)
+    costs = quantities * find_tariffs_batch(p)
+    results['discounted_resource_quantities'] = quantities
+    for i, resource in enumerate(recosting.resource_labels):
+        results[f'{resource}_discounted_cost'] = costs[..., i]
+
+    # Sum for total costs:
+    results['total_discounted_cost'] = np.sum(costs, axis=-1)
+    return results
+
+
+def find_tariffs_batch(patient_params: dict):
+    """
+    Gather the unit prices of the resources.
+
+    Inputs:
+    -------
+    patient_params - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    tariffs - np.array. One column per resource in
+              recosting.resource_labels after any parameter set and
+              patient axes.
+    """
+    return np.stack(np.broadcast_arrays(
+        *[patient_params[key] for key in recosting.tariff_keys]), axis=-1)
+
+
+# #####################################################################
+# ############################# Horizons ##############################
+# #####################################################################
+
+def find_horizon_results(
+        results: dict,
+        patient_params: dict,
+        horizons: list
+        ):
+    """
+    Find the cumulative discounted outcomes at several horizons.
+
+    The yearly QALYs and discounted resource use are added up with
+    one cumulative sum along the years, and the value at each
+    horizon is picked out. A horizon of h years includes the years
+    starting at discharge up to h years after discharge. Horizons
+    beyond a patient's median survival give their lifetime values.
+
+    Inputs:
+    -------
+    results        - dict. Contains the "_by_year" results from
+                     calculate_qaly_batch() and
+                     find_resource_use_batch().
+    patient_params - dict. Output from gather_patient_params().
+    horizons       - list. Whole numbers of years after discharge, or
+                     np.inf for lifetime.
+
+    Returns:
+    --------
+    horizon_results - dict. The last axis of each array has one
+                      column per horizon, except where noted. Keys:
+        horizons                         - np.array. The horizons.
+        qalys_total_by_horizon           - np.array. Discounted QALYs.
+        resource_quantities_by_horizon   - np.array. Discounted
+                                           quantities with one more
+                                           axis for the resources in
+                                           recosting.resource_labels.
+                                           Residential care is in
+                                           days.
+        total_discounted_cost_by_horizon - np.array.
+        net_benefit_by_horizon           - np.array.
+    """
+    horizons = np.atleast_1d(np.asarray(horizons, dtype=float))
+    finite = np.isfinite(horizons)
+    if (np.any(horizons < 0.0) or
+            np.any(horizons[finite] != np.floor(horizons[finite]))):
+        raise ValueError(
+            'Horizons must be whole numbers of years or np.inf, '
+            f'not {horizons.tolist()}.')
+    # Number of year columns inside each horizon:
+    n_columns = results['qalys_by_year'].shape[-1]
+    columns = np.minimum(horizons, n_columns).astype(int)
+
+    def find_cumulative_at_horizons(by_year):
+        # Start with zero so that a horizon of zero years works:
+        cumulative = np.cumsum(by_year, axis=-1)
+        cumulative = np.concatenate(
+            (np.zeros(cumulative.shape[:-1] + (1,)), cumulative), axis=-1)
+        return cumulative[..., columns]
+
+    qalys = find_cumulative_at_horizons(results['qalys_by_year'])
+    quantities = np.stack([
+        find_cumulative_at_horizons(results['ae_discounted_by_year']),
+        find_cumulative_at_horizons(results['nel_discounted_by_year']),
+        find_cumulative_at_horizons(results['el_discounted_by_year']),
+        365 * find_cumulative_at_horizons(
+            results['care_years_discounted_by_year']),
+        ], axis=-1)
+    tariffs = find_tariffs_batch(patient_params)[..., np.newaxis, :]
+    total_discounted_cost = np.sum(quantities * tariffs, axis=-1)
+    net_benefit = (
+        patient_params['wtp_qaly_gpb'][..., np.newaxis] * qalys -
+        total_discounted_cost
+    )
+    horizon_results = dict(
+        horizons=horizons,
+        qalys_total_by_horizon=qalys,
+        resource_quantities_by_horizon=quantities,
+        total_discounted_cost_by_horizon=total_discounted_cost,
+        net_benefit_by_horizon=net_benefit,
+    )
+    return horizon_results
+
+
+def find_lp_resource_batch(
+        resource: str,
+        age: np.array,
+        sex: np.array,
+        patient_params: dict
+        ):
+    """
+    Calculate the linear predictor for a resource for a batch.
+
+    Same sum as in model.find_lp_ae_count() and similar.
+
+    Inputs:
+    -------
+    resource       - str. "ae", "nel" or "el".
+    age            - np.array. Patients' ages.
+    sex            - np.array. Patients' sexes.
+    patient_params - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    lp     - np.array. The value of the linear predictor.
+    coeffs - list. Each patient's coefficients for this resource in
+             the same order as in the fixed parameters, i.e.
+             [constant, age, sex, gamma], for passing to the
+             count functions in models.py.
+    """
+    p = patient_params
+    lp = (
+        p[f'{resource}_constant'] +
+        (p[f'{resource}_age'] * (age - p['lg_mean_age'])) +
+        (p[f'{resource}_sex'] * sex) +
+        p[f'{resource}_mrs']
+    )
+    coeffs = [p[f'{resource}_{c}'] for c in
+              ['constant', 'age', 'sex', 'gamma']]
+    return lp, coeffs
+
+
+def _difference_by_year(cumulative):
+    """
+    Convert cumulative counts by year into counts within each year.
+
+    Years after a patient's death have no extra counts.
+    """
+    previous = np.concatenate(
+        (np.zeros(cumulative.shape[:-1] + (1,)), cumulative[..., :-1]),
+        axis=-1)
+    counts = np.nan_to_num(cumulative - previous)
+    return counts
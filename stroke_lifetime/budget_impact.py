@@ -0,0 +1,179 @@
+"""
+Budget impact by calendar year.
+
+The batch calculations give the resource use in each year after
+discharge for each patient. For a budget, these yearly amounts are
+moved to the calendar year that they happen in and are costed
+without discounting:
++ A&E admissions              x cost_ae_gbp
++ non-elective bed days       x cost_non_elective_bed_day_gbp
++ elective bed days           x cost_elective_bed_day_gbp
++ days in residential care    x cost_residential_day_gbp
+
+As in the rest of the model, resource use is counted up to each
+patient's median survival time.
+
+For a new cohort of patients every year, the spend in each calendar
+year is the sum over all earlier cohorts of their spend in that
+year since discharge. That is a convolution of the number of
+patients discharged each year with the spend per patient in each
+year since discharge.
+"""
+# Imports:
+import numpy as np
+
+from . import recosting
+
+
+# Undiscounted yearly resource use from the batch results, in the
+# order of recosting.resource_labels:
+resource_by_year_keys = [
+    'ae_counts_by_year',
+    'nel_counts_by_year',
+    'el_counts_by_year',
+    'care_years_by_year',
+]
+
+
+def find_resource_use_by_year(results: dict):
+    """
+    Gather the undiscounted resource use in each year after discharge.
+
+    Inputs:
+    -------
+    results - dict. Output of main_calculations_batch().
+
+    Returns:
+    --------
+    resource_use - np.array. Shape (patients, years, 4). The first
+                   year column is the year starting at discharge.
+                   Residential care is in days to match its unit
+                   price. Not A Number (invalid patients) becomes 0.
+    """
+    resource_use = np.stack(
+        [np.asarray(results[key], dtype=float)
+         for key in resource_by_year_keys], axis=-1)
+    # Convert years in care to days:
+    resource_use[..., 3] *= 365
+    return np.nan_to_num(resource_use, nan=0.0)
+
+
+def project_budget(
+        results: dict,
+        discharge_year: np.array,
+        fixed_params: dict,
+        first_year: int = None,
+        n_years: int = None
+        ):
+    """
+    Add up the spend on all patients in each calendar year.
+
+    Inputs:
+    -------
+    results        - dict. Output of main_calculations_batch().
+    discharge_year - np.array. Calendar year that each patient was
+                     discharged.
+    fixed_params   - dict. Contains the unit prices.
+    first_year     - int or None. First calendar year to report.
+                     Defaults to the earliest discharge year.
+    n_years        - int or None. Number of calendar years to
+                     report. Defaults to up to the last year with
+                     any resource use.
+
+    Returns:
+    --------
+    budget - dict. Keys:
+        calendar_years   - np.array. One value per calendar year.
+        resource_use     - np.array. Shape (calendar years, 4).
+                           Quantities of each resource in
+                           recosting.resource_labels.
+        cost_by_resource - np.array. Shape (calendar years, 4).
+        total_cost       - np.array. Spend in each calendar year.
+    """
+    resource_use = find_resource_use_by_year(results)
+    n_patients, n_columns = resource_use.shape[:2]
+    discharge_year = np.broadcast_to(
+        np.asarray(discharge_year, dtype=int), (n_patients,))
+
+    if first_year is None:
+        first_year = np.min(discharge_year) if n_patients > 0 else 0
+    if n_years is None:
+        n_years = (
+            np.max(discharge_year) + n_columns - first_year
+            if n_patients > 0 else 0)
+
+    # Calendar year index of every (patient, year) cell:
+    calendar_index = (
+        (discharge_year - first_year)[:, np.newaxis] + np.arange(n_columns))
+    inside = (calendar_index >= 0) & (calendar_index < n_years)
+    calendar_index = calendar_index[inside]
+
+    budget_resource_use = np.stack([
+        np.bincount(calendar_index,
+                    weights=resource_use[..., i][inside],
+                    minlength=n_years)
+        for i in range(resource_use.shape[-1])
+        ], axis=-1)
+    budget_resource_use = budget_resource_use.reshape(n_years, -1)
+
+    tariffs = recosting.make_tariff_matrix(fixed_params)[0]
+    cost_by_resource = budget_resource_use * tariffs
+    budget = dict(
+        calendar_years=first_year + np.arange(n_years),
+        resource_use=budget_resource_use,
+        cost_by_resource=cost_by_resource,
+        total_cost=np.sum(cost_by_resource, axis=-1),
+    )
+    return budget
+
+
+def project_repeated_cohorts(
+        results: dict,
+        fixed_params: dict,
+        cohort_sizes: np.array,
+        first_year: int = 0
+        ):
+    """
+    Project the spend for a new cohort of patients every year.
+
+    The patients in results are the case mix for each new cohort.
+    Their average resource use in each year since discharge is
+    scaled by the number of patients discharged in each calendar
+    year and the cohorts are added up by convolution.
+
+    Inputs:
+    -------
+    results      - dict. Output of main_calculations_batch() for
+                   one representative cohort.
+    fixed_params - dict. Contains the unit prices.
+    cohort_sizes - np.array. Number of patients discharged in each
+                   calendar year, starting from first_year.
+    first_year   - int. Calendar year of the first cohort.
+
+    Returns:
+    --------
+    budget - dict. The same keys as from project_budget(), with one
+             row for each calendar year in cohort_sizes.
+    """
+    cohort_sizes = np.atleast_1d(np.asarray(cohort_sizes, dtype=float))
+    n_years = cohort_sizes.size
+    # Average resource use per patient in each year since discharge:
+    resource_use = find_resource_use_by_year(results)
+    per_patient = np.mean(resource_use, axis=0)
+
+    # Spend in calendar year t is the sum over the cohorts from
+    # years s <= t of cohort_sizes[s] * per_patient[t - s].
+    budget_resource_use = np.stack([
+        np.convolve(cohort_sizes, per_patient[:, i])[:n_years]
+        for i in range(per_patient.shape[-1])
+        ], axis=-1)
+
+    tariffs = recosting.make_tariff_matrix(fixed_params)[0]
+    cost_by_resource = budget_resource_use * tariffs
+    budget = dict(
+        calendar_years=first_year + np.arange(n_years),
+        resource_use=budget_resource_use,
+        cost_by_resource=cost_by_resource,
+        total_cost=np.sum(cost_by_resource, axis=-1),
+    )
+    return budget
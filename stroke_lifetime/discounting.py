@@ -0,0 +1,190 @@
+"""
+Discount factors for QALYs and costs.
+
+The value in the year t years after discharge (t = 0, 1, 2, ...) is
+multiplied by the discount factor
+
+    1 / (1 + rate/100)**t
+
+QALYs use discount_factor_QALYs_perc and resource use and costs use
+discount_factor_costs_perc.
+
+The factors for a single rate only depend on the number of years,
+so they are calculated once per (rate, number of years) and reused.
+Because discounting is a weighted sum over the years, the discounted
+totals for many rates at once are one matrix product between the
+undiscounted values in each year and a matrix of discount factors
+with one column per rate. Trying different discount rates then
+doesn't need the model to be run again.
+"""
+# Imports:
+import functools
+
+import numpy as np
+
+from . import recosting
+
+
+# #####################################################################
+# ######################### Discount factors ##########################
+# #####################################################################
+
+@functools.lru_cache(maxsize=256)
+def _find_discount_factors_for_rate(discount_factor_perc, n_years):
+    """Cached discount factors for one rate. Read-only."""
+    c = 1.0 + discount_factor_perc / 100.0
+    discount_factors = c ** (-np.arange(n_years, dtype=float))
+    discount_factors.flags.writeable = False
+    return discount_factors
+
+
+def find_discount_factors(
+        discount_factor_perc: float or np.array,
+        n_years: int
+        ):
+    """
+    Find the discount factor for each year after discharge.
+
+    Inputs:
+    -------
+    discount_factor_perc - float or np.array. Discount rate(s) in
+                           percent, e.g. 3.5.
+    n_years              - int. Number of years, starting from the
+                           year of discharge.
+
+    Returns:
+    --------
+    discount_factors - np.array. The shape of the rates plus one last
+                       axis with one factor per year. A single rate
+                       gives a cached read-only array.
+    """
+    discount_factor_perc = np.asarray(discount_factor_perc, dtype=float)
+    n_years = int(n_years)
+    if discount_factor_perc.size == 1:
+        discount_factors = _find_discount_factors_for_rate(
+            float(discount_factor_perc.item()), n_years)
+        return discount_factors.reshape(discount_factor_perc.shape + (-1,))
+    # Different rates, e.g. one per patient:
+    c = 1.0 + discount_factor_perc[..., np.newaxis] / 100.0
+    return c ** (-np.arange(n_years, dtype=float))
+
+
+def find_discount_matrix(
+        discount_factors_perc: np.array,
+        n_years: int
+        ):
+    """
+    Make a matrix of discount factors with one column per rate.
+
+    Inputs:
+    -------
+    discount_factors_perc - np.array. Discount rates in percent.
+    n_years               - int. Number of years, starting from the
+                            year of discharge.
+
+    Returns:
+    --------
+    discount_matrix - np.array. Shape (years, rates).
+    """
+    return np.stack([
+        find_discount_factors(rate, n_years)
+        for rate in np.atleast_1d(discount_factors_perc)
+        ], axis=-1)
+
+
+def discount_streams(
+        streams: np.array,
+        discount_factors_perc: np.array
+        ):
+    """
+    Discount yearly values at many discount rates at once.
+
+    Inputs:
+    -------
+    streams               - np.array. Undiscounted values with one
+                            column per year from the year of
+                            discharge. Years after death must be zero.
+    discount_factors_perc - np.array. Discount rates in percent.
+
+    Returns:
+    --------
+    totals - np.array. The same shape as streams but with the last
+             axis replaced by one discounted total per rate.
+    """
+    streams = np.asarray(streams, dtype=float)
+    discount_matrix = find_discount_matrix(
+        discount_factors_perc, streams.shape[-1])
+    return streams @ discount_matrix
+
+
+# #####################################################################
+# ######################### Rate sensitivity ##########################
+# #####################################################################
+
+def sweep_discount_rates(
+        results: dict,
+        fixed_params: dict,
+        qaly_rates_perc: np.array = None,
+        cost_rates_perc: np.array = None
+        ):
+    """
+    Recalculate discounted outcomes for many discount rates.
+
+    Inputs:
+    -------
+    results         - dict. Output of main_calculations_batch().
+    fixed_params    - dict. Contains the unit prices and willingness
+                      to pay used for costs and net benefit.
+    qaly_rates_perc - np.array or None. Discount rates for QALYs in
+                      percent. If None, use the rate in fixed_params.
+    cost_rates_perc - np.array or None. Discount rates for costs in
+                      percent. If None, use the rate in fixed_params.
+
+    Returns:
+    --------
+    sweep - dict. Keys:
+        qaly_rates_perc       - np.array. The QALY discount rates.
+        cost_rates_perc       - np.array. The cost discount rates.
+        qalys_total           - np.array. One column per QALY rate.
+        discounted_resource_quantities - np.array. One column per
+                                cost rate and then one column per
+                                resource in recosting.resource_labels.
+        total_discounted_cost - np.array. One column per cost rate.
+        net_benefit           - np.array. One column per QALY rate
+                                and then one column per cost rate.
+    """
+    if qaly_rates_perc is None:
+        qaly_rates_perc = fixed_params['discount_factor_QALYs_perc']
+    if cost_rates_perc is None:
+        cost_rates_perc = fixed_params['discount_factor_costs_perc']
+    qaly_rates_perc = np.atleast_1d(np.asarray(qaly_rates_perc, dtype=float))
+    cost_rates_perc = np.atleast_1d(np.asarray(cost_rates_perc, dtype=float))
+
+    qalys_total = discount_streams(
+        results['qalys_undiscounted_by_year'], qaly_rates_perc)
+
+    # Resource use starts in the year of discharge, so the first
+    # column is not discounted:
+    quantities = np.stack([
+        discount_streams(results['ae_counts_by_year'], cost_rates_perc),
+        discount_streams(results['nel_counts_by_year'], cost_rates_perc),
+        discount_streams(results['el_counts_by_year'], cost_rates_perc),
+        365 * discount_streams(
+            results['care_years_by_year'], cost_rates_perc),
+        ], axis=-1)
+    tariffs = recosting.make_tariff_matrix(fixed_params)[0]
+    total_discounted_cost = quantities @ tariffs
+
+    net_benefit = (
+        fixed_params['wtp_qaly_gpb'] * qalys_total[..., np.newaxis] -
+        total_discounted_cost[..., np.newaxis, :]
+    )
+    sweep = dict(
+        qaly_rates_perc=qaly_rates_perc,
+        cost_rates_perc=cost_rates_perc,
+        qalys_total=qalys_total,
+        discounted_resource_quantities=quantities,
+        total_discounted_cost=total_discounted_cost,
+        net_benefit=net_benefit,
+    )
+    return sweep
@@ -0,0 +1,155 @@
+"""
+Expected outcomes for patients with a distribution of mRS scores.
+
+Outcome models often give each patient a probability of each mRS
+score from 0 to 6 instead of one mRS score. The functions here
+calculate the lifetime outcomes for each mRS score once per patient
+and then weight them by the probabilities. Patients with mRS 6 are
+dead, so mRS 6 contributes zero QALYs, zero costs, zero survival and
+zero net benefit.
+"""
+# Imports:
+import numpy as np
+
+from .batch_calculations import main_calculations_batch
+
+
+# Outcomes with one value per patient that are weighted by the
+# mRS probabilities:
+expected_keys = [
+    'qalys_total',
+    'ae_discounted_cost',
+    'nel_discounted_cost',
+    'el_discounted_cost',
+    'care_years_discounted_cost',
+    'total_discounted_cost',
+    'net_benefit',
+]
+
+
+def calculate_expected_outcomes(
+        mrs_probs: np.array,
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict
+        ):
+    """
+    Calculate probability-weighted outcomes for each patient.
+
+    Inputs:
+    -------
+    mrs_probs    - np.array. Shape (patients, 7). Probability of each
+                   mRS score from 0 to 6 for each patient.
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+
+    Returns:
+    --------
+    expected - dict. Output of find_expected_outcomes().
+    """
+    mrs_probs = check_mrs_probs(mrs_probs)
+    per_mrs = calculate_per_mrs_outcomes(age, sex, fixed_params)
+    return find_expected_outcomes(per_mrs, mrs_probs)
+
+
+def calculate_per_mrs_outcomes(
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict
+        ):
+    """
+    Calculate the outcomes for every mRS score for every patient.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+
+    Returns:
+    --------
+    per_mrs - dict. For each key in expected_keys, an array of shape
+              (patients, 6) with one column per mRS from 0 to 5.
+              Also "survival_by_year" with shape (patients, 6, years)
+              and the shared "years".
+    """
+    age, sex = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex))
+        )
+    n_patients = age.shape[0]
+    # One row for each combination of patient and mRS 0 to 5:
+    results = main_calculations_batch(
+        np.repeat(age, 6),
+        np.repeat(sex, 6),
+        np.tile(np.arange(6), n_patients),
+        fixed_params
+        )
+    per_mrs = dict(
+        (key, results[key].reshape(n_patients, 6))
+        for key in expected_keys
+    )
+    per_mrs['survival_by_year'] = results['survival_by_year'].reshape(
+        n_patients, 6, -1)
+    per_mrs['years'] = results['years']
+    return per_mrs
+
+
+def find_expected_outcomes(
+        per_mrs: dict,
+        mrs_probs: np.array
+        ):
+    """
+    Weight the per-mRS outcomes by each patient's mRS probabilities.
+
+    Inputs:
+    -------
+    per_mrs   - dict. Output of calculate_per_mrs_outcomes().
+    mrs_probs - np.array. Shape (patients, 7). Probability of each
+                mRS score from 0 to 6 for each patient.
+
+    Returns:
+    --------
+    expected - dict. For each key in expected_keys, one expected
+               value per patient. If per_mrs contains survival, also
+               "survival_by_year" with one row per patient and one
+               column per year in "years".
+    """
+    # Drop mRS 6 because it contributes zero to everything:
+    weights = np.asarray(mrs_probs, dtype=float)[:, :6]
+    expected = dict(
+        (key, np.einsum('nm,nm->n', weights, per_mrs[key]))
+        for key in expected_keys
+    )
+    if 'survival_by_year' in per_mrs:
+        expected['survival_by_year'] = np.einsum(
+            'nm,nmy->ny', weights, per_mrs['survival_by_year'])
+        expected['years'] = per_mrs['years']
+    return expected
+
+
+def check_mrs_probs(mrs_probs: np.array):
+    """
+    Check that the mRS probabilities have the expected shape and sum.
+
+    Inputs:
+    -------
+    mrs_probs - np.array. Shape (patients, 7).
+
+    Returns:
+    --------
+    mrs_probs - np.array. The same values as floats.
+    """
+    mrs_probs = np.atleast_2d(np.asarray(mrs_probs, dtype=float))
+    if mrs_probs.ndim != 2 or mrs_probs.shape[1] != 7:
+        raise ValueError(
+            'mrs_probs must have one row per patient and one column '
+            f'per mRS from 0 to 6, not shape {mrs_probs.shape}.')
+    if np.any(mrs_probs < 0.0) or not np.allclose(mrs_probs.sum(axis=1), 1.0):
+        raise ValueError(
+            'Each row of mrs_probs must be non-negative and sum to 1.')
+    return mrs_probs
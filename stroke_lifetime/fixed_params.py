@@ -226,24 +226,10 @@ def make_fixed_params_mrs_model(fixed_params):
         el_mRS                        - np.array.
     """
     # ----- Discharge destinations -----
-
-    # Combine these counts into percentage rates:
-    perc_care_home_all_ages = (
-        fixed_params['n_patients_care_home'] /
-        (fixed_params['n_patients_care_home'] +
-         fixed_params['n_patients_not_care_home'])
-        )
-
-    perc_care_home_over70 = np.append(
-        perc_care_home_all_ages[:3],
-        fixed_params['n_patients_care_home_over70'] /
-        fixed_params['n_patients_not_care_home_over70']
-        )
-    perc_care_home_not_over70 = np.append(
-        perc_care_home_all_ages[:3],
-        fixed_params['n_patients_care_home_not_over70'] /
-        fixed_params['n_patients_not_care_home_not_over70']
-        )
+    perc_care_home = find_perc_care_home_mrs_model(fixed_params)
+    perc_care_home_all_ages = perc_care_home['perc_care_home_all_ages']
+    perc_care_home_over70 = perc_care_home['perc_care_home_over70']
+    perc_care_home_not_over70 = perc_care_home['perc_care_home_not_over70']
 
     # From Excel "Coefficients" sheet, "QALYs" table
     # File: Excel NHCT v7.4
@@ -415,43 +401,10 @@ def make_fixed_params_dicho_model(fixed_params):
         el_mRS                    - np.array.
     """
     # ----- Discharge destinations -----
-
-    # Combine these counts into percentage rates:
-    perc_care_home_all_ages_independent = (
-        np.sum(fixed_params['n_patients_care_home'][:3]) /
-        np.sum(fixed_params['n_patients_care_home'][:3] +
-               fixed_params['n_patients_not_care_home'][:3])
-        )
-    perc_care_home_all_ages_dependent = (
-        np.sum(fixed_params['n_patients_care_home'][3:]) /
-        np.sum(fixed_params['n_patients_care_home'][3:] +
-               fixed_params['n_patients_not_care_home'][3:])
-        )
-    perc_care_home_all_ages = np.array(
-        [perc_care_home_all_ages_independent] * 3 +
-        [perc_care_home_all_ages_dependent] * 3
-    )
-
-    perc_care_home_over70_dependent = (
-        np.sum(fixed_params['n_patients_care_home_over70']) /
-        (np.sum(fixed_params['n_patients_care_home_over70']) +
-         np.sum(fixed_params['n_patients_not_care_home_over70']))
-        )
-
-    perc_care_home_not_over70_dependent = (
-        np.sum(fixed_params['n_patients_care_home_not_over70']) /
-        (np.sum(fixed_params['n_patients_care_home_not_over70']) +
-         np.sum(fixed_params['n_patients_not_care_home_not_over70']))
-        )
-
-    perc_care_home_over70 = np.append(
-        perc_care_home_all_ages[:3],
-        [perc_care_home_over70_dependent] * 3
-        )
-    perc_care_home_not_over70 = np.append(
-        perc_care_home_all_ages[:3],
-        [perc_care_home_not_over70_dependent] * 3
-        )
+    perc_care_home = find_perc_care_home_dicho_model(fixed_params)
+    perc_care_home_all_ages = perc_care_home['perc_care_home_all_ages']
+    perc_care_home_over70 = perc_care_home['perc_care_home_over70']
+    perc_care_home_not_over70 = perc_care_home['perc_care_home_not_over70']
 
     # From Excel "Coefficients" sheet, "QALYs" table
     # File: Excel NHCT v7.4
@@ -589,3 +542,104 @@ def make_fixed_params_dicho_model(fixed_params):
         el_coeffs=el_coeffs,
         el_mRS=el_mRS
     )
+
+
+def find_perc_care_home_mrs_model(fixed_params):
+    """
+    Calculate care home percentage rates for the separate-mRS model.
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains the discharge destination numbers
+                   from make_fixed_params_shared().
+
+    Returns:
+    --------
+    dict. The dictionary of percentage rates. Keys:
+        perc_care_home_all_ages   - np.array.
+        perc_care_home_over70     - np.array.
+        perc_care_home_not_over70 - np.array.
+    """
+    # Combine these counts into percentage rates:
+    perc_care_home_all_ages = (
+        fixed_params['n_patients_care_home'] /
+        (fixed_params['n_patients_care_home'] +
+         fixed_params['n_patients_not_care_home'])
+        )
+
+    perc_care_home_over70 = np.append(
+        perc_care_home_all_ages[:3],
+        fixed_params['n_patients_care_home_over70'] /
+        fixed_params['n_patients_not_care_home_over70']
+        )
+    perc_care_home_not_over70 = np.append(
+        perc_care_home_all_ages[:3],
+        fixed_params['n_patients_care_home_not_over70'] /
+        fixed_params['n_patients_not_care_home_not_over70']
+        )
+
+    return dict(
+        perc_care_home_all_ages=perc_care_home_all_ages,
+        perc_care_home_over70=perc_care_home_over70,
+        perc_care_home_not_over70=perc_care_home_not_over70
+    )
+
+
+def find_perc_care_home_dicho_model(fixed_params):
+    """
+    Calculate care home percentage rates for the dichotomous model.
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains the discharge destination numbers
+                   from make_fixed_params_shared().
+
+    Returns:
+    --------
+    dict. The dictionary of percentage rates. Keys:
+        perc_care_home_all_ages   - np.array.
+        perc_care_home_over70     - np.array.
+        perc_care_home_not_over70 - np.array.
+    """
+    # Combine these counts into percentage rates:
+    perc_care_home_all_ages_independent = (
+        np.sum(fixed_params['n_patients_care_home'][:3]) /
+        np.sum(fixed_params['n_patients_care_home'][:3] +
+               fixed_params['n_patients_not_care_home'][:3])
+        )
+    perc_care_home_all_ages_dependent = (
+        np.sum(fixed_params['n_patients_care_home'][3:]) /
+        np.sum(fixed_params['n_patients_care_home'][3:] +
+               fixed_params['n_patients_not_care_home'][3:])
+        )
+    perc_care_home_all_ages = np.array(
+        [perc_care_home_all_ages_independent] * 3 +
+        [perc_care_home_all_ages_dependent] * 3
+    )
+
+    perc_care_home_over70_dependent = (
+        np.sum(fixed_params['n_patients_care_home_over70']) /
+        (np.sum(fixed_params['n_patients_care_home_over70']) +
+         np.sum(fixed_params['n_patients_not_care_home_over70']))
+        )
+
+    perc_care_home_not_over70_dependent = (
+        np.sum(fixed_params['n_patients_care_home_not_over70']) /
+        (np.sum(fixed_params['n_patients_care_home_not_over70']) +
+         np.sum(fixed_params['n_patients_not_care_home_not_over70']))
+        )
+
+    perc_care_home_over70 = np.append(
+        perc_care_home_all_ages[:3],
+        [perc_care_home_over70_dependent] * 3
+        )
+    perc_care_home_not_over70 = np.append(
+        perc_care_home_all_ages[:3],
+        [perc_care_home_not_over70_dependent] * 3
+        )
+
+    return dict(
+        perc_care_home_all_ages=perc_care_home_all_ages,
+        perc_care_home_over70=perc_care_home_over70,
+        perc_care_home_not_over70=perc_care_home_not_over70
+    )
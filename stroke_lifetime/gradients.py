@@ -0,0 +1,523 @@
+"""
+Derivatives of the lifetime outcomes with respect to the model
+coefficients.
+
+The derivatives are found analytically by following each coefficient
+through the same steps as the batch calculations (forward mode):
++ the linear predictors, which are linear in the coefficients.
++ the median survival time from the logistic year-one model and
+  the inverted Gompertz model.
++ the QALYs in each year up to the median survival, which depend on
+  the utility and on the median survival through the final part-year.
++ the cumulative resource use counts, which depend on their linear
+  predictors, their gamma coefficients and the median survival.
++ the discounted costs and net benefit, which are linear in the
+  discounted resource use and QALYs.
+
+The result for each outcome is a Jacobian matrix with one row per
+patient and one column per coefficient in parameter_labels. The
+median survival and the QALYs have kinks where the median survival
+crosses a whole number of years or where a raw QALY reaches its cap
+of 1. The derivatives there are the ones from the right.
+"""
+# Imports:
+import numpy as np
+
+from . import models as model
+from . import discounting
+from . import recosting
+from .batch_calculations import (
+    main_calculations_batch, gather_patient_params, find_lpDeath_batch,
+    find_lp_resource_batch, _difference_by_year)
+
+
+# The coefficients to differentiate with respect to, and how many
+# values each one has. The Jacobian columns are in this order.
+gradient_parameters = [
+    ('lg_coeffs', 9),
+    ('gz_coeffs', 16),
+    ('gz_gamma', 1),
+    ('ae_coeffs', 4),
+    ('ae_mRS', 6),
+    ('nel_coeffs', 4),
+    ('nel_mRS', 6),
+    ('el_coeffs', 4),
+    ('el_mRS', 6),
+    ('utility_list', 6),
+]
+
+# Outcomes that Jacobians are calculated for:
+gradient_keys = [
+    'survival_median_years',
+    'qalys_total',
+    'ae_count',
+    'nel_count',
+    'el_count',
+    'care_years',
+    'ae_discounted_cost',
+    'nel_discounted_cost',
+    'el_discounted_cost',
+    'care_years_discounted_cost',
+    'total_discounted_cost',
+    'net_benefit',
+]
+
+
+def _find_parameter_columns():
+    """Find which Jacobian columns belong to each coefficient."""
+    columns = dict()
+    labels = []
+    start = 0
+    for key, size in gradient_parameters:
+        columns[key] = slice(start, start + size)
+        if size == 1:
+            labels.append(key)
+        else:
+            labels += [f'{key}[{i}]' for i in range(size)]
+        start += size
+    return columns, labels
+
+
+parameter_columns, parameter_labels = _find_parameter_columns()
+
+
+# #####################################################################
+# ######################## Overall function ###########################
+# #####################################################################
+
+def calculate_gradients(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict
+        ):
+    """
+    Calculate the outcomes and their Jacobians for a batch.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    mrs          - np.array. Patients' mRS scores from 0 to 5. Any
+                   other value gives rows of Not A Number.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+
+    Returns:
+    --------
+    gradients - dict. Keys:
+        values           - dict. One value per patient for each key
+                           in gradient_keys, from
+                           main_calculations_batch().
+        jacobians        - dict. For each key in gradient_keys, an
+                           np.array with one row per patient and one
+                           column per coefficient.
+        parameter_labels - list. Name of each Jacobian column.
+    """
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex, dtype=float)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    age, sex, mrs = age.ravel(), sex.ravel(), mrs.ravel()
+    valid = (mrs >= 0) & (mrs <= 5)
+    mrs_index = np.where(valid, mrs, 0)
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    p = gather_patient_params(fixed_params, age, mrs_index)
+    # One column per mRS score for the coefficients indexed by mRS:
+    mrs_onehot = np.eye(6)[mrs_index]
+
+    jacobians = dict()
+
+    # ##### Mortality #####
+    death_in_year_1_lp, death_in_year_n_lp = find_lpDeath_batch(age, sex, p)
+    d_lp1, d_lpn, d_gamma = find_mortality_lp_jacobians(
+        age, sex, mrs_onehot, p)
+    survival_median_years, d_median = find_median_survival_jacobian(
+        model.find_pDeath_year1(death_in_year_1_lp),
+        death_in_year_n_lp,
+        np.broadcast_to(p['gz_gamma'], age.shape),
+        d_lp1,
+        d_lpn,
+        d_gamma
+        )
+    survival_median_years = np.where(valid, survival_median_years, np.nan)
+    jacobians['survival_median_years'] = d_median
+
+    # ##### QALYs #####
+    jacobians['qalys_total'] = find_qaly_jacobian(
+        survival_median_years, age, sex, mrs_onehot, p, d_median)
+
+    # ##### Resource use #####
+    jacobians.update(find_resource_use_jacobians(
+        survival_median_years, age, sex, mrs_onehot, p, d_median))
+
+    # ##### COST EFFECTIVENESS #####
+    jacobians['net_benefit'] = (
+        p['wtp_qaly_gpb'][..., np.newaxis] * jacobians['qalys_total'] -
+        jacobians['total_discounted_cost']
+    )
+
+    # Replace results for invalid patients with Not A Number:
+    for key in gradient_keys:
+        jacobians[key] = np.where(
+            valid[:, np.newaxis], jacobians[key], np.nan)
+
+    gradients = dict(
+        values=dict((key, results[key]) for key in gradient_keys),
+        jacobians=jacobians,
+        parameter_labels=list(parameter_labels),
+    )
+    return gradients
+
+
+# #####################################################################
+# ############################ Mortality ##############################
+# #####################################################################
+
+def find_mortality_lp_jacobians(
+        age: np.array,
+        sex: np.array,
+        mrs_onehot: np.array,
+        patient_params: dict
+        ):
+    """
+    Differentiate the mortality linear predictors.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages.
+    sex            - np.array. Patients' sexes.
+    mrs_onehot     - np.array. Shape (patients, 6). 1 in the column
+                     of each patient's mRS score.
+    patient_params - dict. Output from gather_patient_params().
+
+    Returns:
+    --------
+    d_lp1   - np.array. Jacobian of the year-one linear predictor.
+    d_lpn   - np.array. Jacobian of the Gompertz linear predictor.
+    d_gamma - np.array. Jacobian of the Gompertz gamma.
+    """
+    p = patient_params
+    n_patients = age.size
+    n_parameters = len(parameter_labels)
+    ones = np.ones(n_patients)
+
+    d_lp1 = np.zeros((n_patients, n_parameters))
+    d_lp1[:, parameter_columns['lg_coeffs']] = np.column_stack((
+        ones, age - p['lg_mean_age'], sex, mrs_onehot))
+
+    age_norm_gz = age - p['gz_mean_age']
+    d_lpn = np.zeros((n_patients, n_parameters))
+    d_lpn[:, parameter_columns['gz_coeffs']] = np.column_stack((
+        ones,
+        np.broadcast_to(age_norm_gz, age.shape),
+        (age**2.0) - p['gz_mean_age']**2.0,
+        sex,
+        mrs_onehot * age_norm_gz[..., np.newaxis],
+        mrs_onehot
+        ))
+
+    d_gamma = np.zeros((n_patients, n_parameters))
+    d_gamma[:, parameter_columns['gz_gamma']] = 1.0
+    return d_lp1, d_lpn, d_gamma
+
+
+def find_median_survival_jacobian(
+        death_in_year_1_prob: np.array,
+        death_in_year_n_lp: np.array,
+        gz_gamma: np.array,
+        d_lp1: np.array,
+        d_lpn: np.array,
+        d_gamma: np.array
+        ):
+    """
+    Differentiate the median survival time.
+
+    The median is found as in model.find_survival_time_quantiles():
+    + case 1, death after year one:
+        x = P` * gamma * exp(-lp_n)
+        median = log(1 + x) / (365 * gamma) + 1
+      with P` = 1.5 / (1 + pDeath_year1) - 1.
+    + case 2, death during year one:
+        median = log(0.5) / log(1 - pDeath_year1)
+
+    Inputs:
+    -------
+    death_in_year_1_prob - np.array. Probability of death in year 1.
+    death_in_year_n_lp   - np.array. Linear predictor for death after
+                           year 1.
+    gz_gamma             - np.array. Gompertz gamma coefficient.
+    d_lp1                - np.array. Jacobian of the year-one linear
+                           predictor.
+    d_lpn                - np.array. Jacobian of the Gompertz linear
+                           predictor.
+    d_gamma              - np.array. Jacobian of the Gompertz gamma.
+
+    Returns:
+    --------
+    survival_median_years - np.array. Median survival in years.
+    d_median              - np.array. Jacobian of the median.
+    """
+    p1 = death_in_year_1_prob
+    survival_times, survival_years, time_log, eqperc = (
+        model.find_survival_time_quantiles(
+            [0.5], p1, death_in_year_n_lp, gz_gamma))
+    survival_median_years = survival_times[:, 0]
+    case1 = survival_years[:, 0] > 1.0
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Case 1, inverted Gompertz:
+        x = eqperc[:, 0] * gz_gamma * np.exp(-death_in_year_n_lp)
+        dmed_dx = 1.0 / ((1.0 + x) * 365.0 * gz_gamma)
+        dmed_dp1_case1 = dmed_dx * (
+            gz_gamma * np.exp(-death_in_year_n_lp) * -1.5 / (1.0 + p1)**2.0)
+        dmed_dlpn = dmed_dx * -x
+        dmed_dgamma = (
+            (x / (1.0 + x) - np.log1p(x)) / (365.0 * gz_gamma**2.0))
+        # Case 2, year-one logistic model:
+        log_survival = np.log(1.0 - p1)
+        dmed_dp1_case2 = np.log(0.5) / (log_survival**2.0 * (1.0 - p1))
+
+    dmed_dp1 = np.where(case1, dmed_dp1_case1, dmed_dp1_case2)
+    dmed_dlpn = np.where(case1, dmed_dlpn, 0.0)
+    dmed_dgamma = np.where(case1, dmed_dgamma, 0.0)
+    # Logistic model, d(p1)/d(lp1) = p1 * (1 - p1):
+    dmed_dlp1 = dmed_dp1 * p1 * (1.0 - p1)
+
+    d_median = (
+        dmed_dlp1[:, np.newaxis] * d_lp1 +
+        dmed_dlpn[:, np.newaxis] * d_lpn +
+        dmed_dgamma[:, np.newaxis] * d_gamma
+    )
+    return survival_median_years, d_median
+
+
+# #####################################################################
+# ############################## QALYs ################################
+# #####################################################################
+
+def find_qaly_jacobian(
+        med_survival_years: np.array,
+        age: np.array,
+        sex: np.array,
+        mrs_onehot: np.array,
+        patient_params: dict,
+        d_median: np.array
+        ):
+    """
+    Differentiate the total QALYs.
+
+    The QALYs are sum(raw QALY * discount * scale) over the years as
+    in batch_calculations.calculate_qaly_batch(). The utility moves
+    every raw QALY below the cap of 1, and the median survival moves
+    the scale of the final part-year.
+
+    Inputs:
+    -------
+    med_survival_years - np.array. Median survival time in years.
+    age                - np.array. Patients' ages in years.
+    sex                - np.array. Patients' sexes.
+    mrs_onehot         - np.array. Shape (patients, 6).
+    patient_params     - dict. Output from gather_patient_params().
+    d_median           - np.array. Jacobian of the median survival.
+
+    Returns:
+    --------
+    d_qalys - np.array. Jacobian of the total QALYs.
+    """
+    p = patient_params
+    year_max = np.nanmax(np.ceil(med_survival_years), initial=0)
+    year = np.arange(0, year_max)
+    med = med_survival_years[..., np.newaxis]
+    age_ = age[..., np.newaxis]
+    average_age = p['lg_mean_age'][..., np.newaxis]
+
+    raw_qaly = (
+        p['utility'][..., np.newaxis] -
+        ((age_+year) - average_age) * p['qaly_age_coeff'][..., np.newaxis] -
+        ((age_+year)**2.0 - average_age**2.0) *
+        p['qaly_age2_coeff'][..., np.newaxis] +
+        sex[..., np.newaxis] * p['qaly_sex_coeff'][..., np.newaxis]
+    )
+    discount = discounting.find_discount_factors(
+        p['discount_factor_QALYs_perc'], year.size)
+
+    # Scale factors as in calculate_qaly_batch():
+    alive = year < med
+    not_final_year = (year + age_ + 1) < (med + age_)
+    final_year = alive & ~not_final_year & (
+        (year + age_ + 1) < (med + age_ + 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale_final = np.where(
+            year == 0, med, np.mod(med, np.floor(med)))
+    scale_factor = np.where(
+        alive & not_final_year, 1.0,
+        np.where(final_year, scale_final, 0.0)
+        )
+
+    # The final scale factor goes up one-for-one with the median:
+    dqalys_dmed = np.sum(
+        np.where(final_year, np.minimum(raw_qaly, 1.0) * discount, 0.0),
+        axis=-1)
+    # The utility only counts in years below the cap:
+    dqalys_dutility = np.sum(
+        np.where(raw_qaly < 1.0, discount * scale_factor, 0.0), axis=-1)
+
+    d_qalys = dqalys_dmed[:, np.newaxis] * d_median
+    d_qalys[:, parameter_columns['utility_list']] += (
+        mrs_onehot * dqalys_dutility[:, np.newaxis])
+    return d_qalys
+
+
+# #####################################################################
+# ########################### Resource use ############################
+# #####################################################################
+
+def find_resource_use_jacobians(
+        med_survival_years: np.array,
+        age: np.array,
+        sex: np.array,
+        mrs_onehot: np.array,
+        patient_params: dict,
+        d_median: np.array
+        ):
+    """
+    Differentiate the resource use counts and discounted costs.
+
+    The discounted use of each resource is
+        sum over years k of discount[k-1] * (C(y_k) - C(y_{k-1}))
+    where C is the cumulative count and y_k is the time alive by the
+    end of year k. Only the final y_k depends on the median survival.
+
+    Inputs:
+    -------
+    med_survival_years - np.array. Median survival time in years.
+    age                - np.array. Patients' ages in years.
+    sex                - np.array. Patients' sexes.
+    mrs_onehot         - np.array. Shape (patients, 6).
+    patient_params     - dict. Output from gather_patient_params().
+    d_median           - np.array. Jacobian of the median survival.
+
+    Returns:
+    --------
+    jacobians - dict. Jacobians of the counts, care years, discounted
+                costs of each resource and the total discounted cost.
+    """
+    p = patient_params
+    n_patients, n_parameters = d_median.shape
+    death_year = np.ceil(med_survival_years)
+    years = np.arange(1, np.nanmax(death_year, initial=0) + 1)
+    years_alive = np.minimum(years, med_survival_years[..., np.newaxis])
+    discount = discounting.find_discount_factors(
+        p['discount_factor_costs_perc'], years.size)
+    # Discount in the year that contains the median survival:
+    final_discount = np.sum(
+        np.where(years == death_year[..., np.newaxis], discount, 0.0),
+        axis=-1)
+    ones = np.ones(n_patients)
+
+    jacobians = dict()
+    d_discounted = dict()
+    for resource in ['ae', 'nel', 'el']:
+        lp, coeffs = find_lp_resource_batch(resource, age, sex, p)
+        gamma = np.broadcast_to(coeffs[3], age.shape)
+        columns = parameter_columns[f'{resource}_coeffs']
+
+        d_lp = np.zeros((n_patients, n_parameters))
+        d_lp[:, columns] = np.column_stack((
+            ones, age - p['lg_mean_age'], sex, np.zeros(n_patients)))
+        d_lp[:, parameter_columns[f'{resource}_mRS']] = mrs_onehot
+        d_gamma = np.zeros((n_patients, n_parameters))
+        d_gamma[:, columns.start + 3] = 1.0
+
+        # Count across the median survival time:
+        dc_dlp, dc_dgamma, dc_dyears = find_count_derivatives(
+            resource, lp, gamma, med_survival_years)
+        jacobians[f'{resource}_count'] = (
+            dc_dlp[:, np.newaxis] * d_lp +
+            dc_dgamma[:, np.newaxis] * d_gamma +
+            dc_dyears[:, np.newaxis] * d_median
+        )
+
+        # Discounted count, summed over the years:
+        grid_dlp, grid_dgamma, grid_dyears = find_count_derivatives(
+            resource, lp[..., np.newaxis], gamma[..., np.newaxis],
+            years_alive)
+        ddiscounted_dlp = np.sum(
+            _difference_by_year(grid_dlp) * discount, axis=-1)
+        ddiscounted_dgamma = np.sum(
+            _difference_by_year(grid_dgamma) * discount, axis=-1)
+        ddiscounted_dmed = final_discount * dc_dyears
+        d_discounted[resource] = (
+            ddiscounted_dlp[:, np.newaxis] * d_lp +
+            ddiscounted_dgamma[:, np.newaxis] * d_gamma +
+            ddiscounted_dmed[:, np.newaxis] * d_median
+        )
+
+    # Care home, average_care_year * time:
+    average_care_year = np.broadcast_to(p['average_care_year'], age.shape)
+    jacobians['care_years'] = average_care_year[:, np.newaxis] * d_median
+    d_discounted['care_years'] = (
+        (365 * final_discount * average_care_year)[:, np.newaxis] *
+        d_median
+    )
+
+    # Costs are the unit prices times the discounted quantities:
+    jacobians['total_discounted_cost'] = np.zeros(
+        (n_patients, n_parameters))
+    for resource, tariff_key in zip(
+            recosting.resource_labels, recosting.tariff_keys):
+        d_cost = p[tariff_key][..., np.newaxis] * d_discounted[resource]
+        jacobians[f'{resource}_discounted_cost'] = d_cost
+        jacobians['total_discounted_cost'] += d_cost
+    return jacobians
+
+
+def find_count_derivatives(
+        resource: str,
+        lp: np.array,
+        gamma: np.array,
+        years: np.array
+        ):
+    """
+    Differentiate a cumulative resource count.
+
+    The counts are from model.find_ae_count() and similar:
+    + A&E:      C = exp(-gamma * lp) * years**gamma
+    + NEL, EL:  C = log(1 + z) with z = (years * exp(-lp))**(1/gamma)
+
+    Inputs:
+    -------
+    resource - str. "ae", "nel" or "el".
+    lp       - np.array. Linear predictor.
+    gamma    - np.array. Gamma coefficient.
+    years    - np.array. Time since discharge in years.
+
+    Returns:
+    --------
+    dc_dlp    - np.array. Derivative with respect to lp.
+    dc_dgamma - np.array. Derivative with respect to gamma.
+    dc_dyears - np.array. Derivative with respect to time.
+    """
+    positive = years > 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_years = np.log(years)
+        if resource == 'ae':
+            count = np.exp(-gamma * lp) * years**gamma
+            dc_dlp = -gamma * count
+            dc_dgamma = count * (log_years - lp)
+            dc_dyears = gamma * count / years
+        else:
+            z = (years * np.exp(-lp))**(1.0 / gamma)
+            dc_dz = 1.0 / (1.0 + z)
+            dc_dlp = dc_dz * -z / gamma
+            dc_dgamma = dc_dz * -z * (log_years - lp) / gamma**2.0
+            dc_dyears = dc_dz * z / (gamma * years)
+    # Nothing is used at time zero:
+    dc_dlp = np.where(positive, dc_dlp, 0.0)
+    dc_dgamma = np.where(positive, dc_dgamma, 0.0)
+    dc_dyears = np.where(positive, dc_dyears, 0.0)
+    return dc_dlp, dc_dgamma, dc_dyears
+
@@ -0,0 +1,318 @@
+"""
+Optional compiled kernels for the batch calculations.
+
+When Numba is installed, the mortality, QALY, resource use and cost
+calculations for each patient are fused into one compiled loop that
+runs across all cores. Only the headline values are kept for each
+patient so that none of the year-by-year arrays are built.
+
+When Numba is not installed, NUMBA_AVAILABLE is False and
+batch_calculations.calculate_outcomes_batch() uses the NumPy
+calculations instead.
+"""
+# Imports:
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+if NUMBA_AVAILABLE:
+    prange = numba.prange
+else:
+    prange = range
+
+
+# Names of the outputs of the kernel, in the order of the rows
+# of its output array:
+outcome_keys = [
+    'death_in_year_1_prob',
+    'death_in_year_n_lp',
+    'survival_median_years',
+    'survival_lower_quartile_years',
+    'survival_upper_quartile_years',
+    'qalys_total',
+    'ae_count',
+    'nel_count',
+    'el_count',
+    'care_years',
+    'ae_discounted_cost',
+    'nel_discounted_cost',
+    'el_discounted_cost',
+    'care_years_discounted_cost',
+    'total_discounted_cost',
+    'net_benefit',
+]
+
+# Names of the per-patient parameters that the kernel needs, in the
+# order of the rows of its parameter array. These are keys from
+# batch_calculations.gather_patient_params().
+kernel_param_keys = [
+    'lg_mean_age', 'lg_constant', 'lg_age', 'lg_male', 'lg_mrs',
+    'gz_mean_age', 'gz_constant', 'gz_age', 'gz_age2', 'gz_male',
+    'gz_mrs_age', 'gz_mrs', 'gz_gamma',
+    'utility', 'qaly_age_coeff', 'qaly_age2_coeff', 'qaly_sex_coeff',
+    'discount_factor_QALYs_perc',
+    'ae_constant', 'ae_age', 'ae_sex', 'ae_gamma', 'ae_mrs',
+    'nel_constant', 'nel_age', 'nel_sex', 'nel_gamma', 'nel_mrs',
+    'el_constant', 'el_age', 'el_sex', 'el_gamma', 'el_mrs',
+    'average_care_year',
+    'cost_ae_gbp', 'cost_non_elective_bed_day_gbp',
+    'cost_elective_bed_day_gbp', 'cost_residential_day_gbp',
+    'wtp_qaly_gpb', 'discount_factor_costs_perc',
+]
+
+
+def calculate_outcomes(
+        age: np.array,
+        sex: np.array,
+        patient_params: dict
+        ):
+    """
+    Run the compiled kernel for a batch of patients.
+
+    Inputs:
+    -------
+    age            - np.array. Patients' ages in years.
+    sex            - np.array. Patients' sexes.
+    patient_params - dict. Output from
+                     batch_calculations.gather_patient_params().
+
+    Returns:
+    --------
+    results - dict. One np.array per key in outcome_keys.
+    """
+    if not NUMBA_AVAILABLE:
+        raise ImportError(
+            'The "numba" backend needs Numba to be installed.')
+    # The batch shape includes any parameter set axes:
+    batch_shape = np.broadcast_shapes(
+        np.shape(age),
+        *(np.shape(patient_params[key]) for key in kernel_param_keys)
+        )
+    age = np.broadcast_to(np.asarray(age, dtype=float), batch_shape)
+    # Stack the parameters into one contiguous array with one
+    # row per parameter and one column per patient:
+    params = np.empty((len(kernel_param_keys), age.size))
+    for i, key in enumerate(kernel_param_keys):
+        params[i] = np.broadcast_to(patient_params[key], batch_shape).ravel()
+
+    out = np.empty((len(outcome_keys), age.size))
+    _outcomes_kernel(
+        age.ravel(),
+        np.broadcast_to(np.asarray(sex, dtype=float), batch_shape).ravel(),
+        params,
+        out
+        )
+    results = dict(
+        (key, out[i].reshape(batch_shape))
+        for i, key in enumerate(outcome_keys)
+    )
+    return results
+
+
+def kernels_thread_safe():
+    """
+    Whether the compiled kernel can run in several threads at once.
+
+    Numba's "workqueue" threading layer can only run one parallel
+    kernel at a time in each process. The "tbb" and "omp" layers can
+    run several. The layer is only chosen when the first parallel
+    kernel runs, so until then this is False to be safe.
+
+    Returns:
+    --------
+    thread_safe - bool. True if kernels can run in several threads.
+    """
+    if not NUMBA_AVAILABLE:
+        return False
+    try:
+        return numba.threading_layer() != 'workqueue'
+    except ValueError:
+        # The threading layer hasn't been chosen yet.
+        return False
+
+
+def _outcomes_kernel(age, sex, params, out):
+    """
+    Fused per-patient calculations.
+
+    Each step follows the same maths as the functions in models.py
+    and main_calculations.py so that the results match the NumPy
+    calculations.
+    """
+    for i in prange(age.shape[0]):
+        # Parameters in the order of kernel_param_keys:
+        lg_mean_age = params[0, i]
+        lg_constant = params[1, i]
+        lg_age = params[2, i]
+        lg_male = params[3, i]
+        lg_mrs = params[4, i]
+        gz_mean_age = params[5, i]
+        gz_constant = params[6, i]
+        gz_age = params[7, i]
+        gz_age2 = params[8, i]
+        gz_male = params[9, i]
+        gz_mrs_age = params[10, i]
+        gz_mrs = params[11, i]
+        gz_gamma = params[12, i]
+        utility = params[13, i]
+        qaly_age_coeff = params[14, i]
+        qaly_age2_coeff = params[15, i]
+        qaly_sex_coeff = params[16, i]
+        dfq_perc = params[17, i]
+        ae_constant = params[18, i]
+        ae_age = params[19, i]
+        ae_sex = params[20, i]
+        ae_gamma = params[21, i]
+        ae_mrs = params[22, i]
+        nel_constant = params[23, i]
+        nel_age = params[24, i]
+        nel_sex = params[25, i]
+        nel_gamma = params[26, i]
+        nel_mrs = params[27, i]
+        el_constant = params[28, i]
+        el_age = params[29, i]
+        el_sex = params[30, i]
+        el_gamma = params[31, i]
+        el_mrs = params[32, i]
+        average_care_year = params[33, i]
+        cost_ae = params[34, i]
+        cost_nel = params[35, i]
+        cost_el = params[36, i]
+        cost_residential = params[37, i]
+        wtp = params[38, i]
+        dfc_perc = params[39, i]
+        a = age[i]
+        s = sex[i]
+
+        # ##### Mortality #####
+        lp1 = (
+            lg_constant + lg_age * (a - lg_mean_age) + lg_male * s + lg_mrs)
+        age_norm_gz = a - gz_mean_age
+        lpn = (
+            gz_constant +
+            gz_age * age_norm_gz +
+            gz_age2 * ((a**2.0) - gz_mean_age**2.0) +
+            gz_male * s +
+            gz_mrs_age * age_norm_gz +
+            gz_mrs
+        )
+        p1 = 1.0 / (1.0 + np.exp(-lp1))
+
+        # Survival times for median, lower and upper quartile:
+        survival_times = np.empty(3)
+        for j in range(3):
+            p_death = 0.5 if j == 0 else (0.25 if j == 1 else 0.75)
+            eqperc = ((1.0 + p_death)/(1.0 + p1)) - 1.0
+            if eqperc <= 0:
+                survival_years = -1.0
+            else:
+                x = eqperc * gz_gamma / np.exp(lpn)
+                survival_years = np.log(x + 1.0) / (gz_gamma*365.0) + 1.0
+            time_log = (
+                np.log(1.0 - p_death) / (np.log(1 - p1)/365.0)) / 365.0
+            if survival_years > 1.0:
+                survival_times[j] = survival_years
+            else:
+                survival_times[j] = time_log
+        med = survival_times[0]
+        n_years = int(np.ceil(med))
+
+        # ##### QALYs #####
+        dfq = dfq_perc / 100.0
+        qalys = 0.0
+        for year in range(n_years):
+            raw_qaly = (
+                utility -
+                ((a+year) - lg_mean_age) * qaly_age_coeff -
+                ((a+year)**2.0 - lg_mean_age**2.0) * qaly_age2_coeff +
+                s * qaly_sex_coeff
+            )
+            if raw_qaly > 1:
+                raw_qaly = 1.0
+            qaly = raw_qaly * (1.0 + dfq)**(-year)
+            if (year + a + 1) < (med + a):
+                scale_factor = 1.0
+            elif (year + a + 1) < (med + a + 1):
+                if year == 0:
+                    scale_factor = med
+                else:
+                    scale_factor = med % int(med)
+            else:
+                scale_factor = 0.0
+            qalys += qaly * scale_factor
+
+        # ##### Resource use #####
+        age_norm_lg = a - lg_mean_age
+        lp_ae = ae_constant + (ae_age * age_norm_lg) + (ae_sex * s) + ae_mrs
+        lp_nel = (
+            nel_constant + (nel_age * age_norm_lg) + (nel_sex * s) + nel_mrs)
+        lp_el = el_constant + (el_age * age_norm_lg) + (el_sex * s) + el_mrs
+
+        c = 1.0 + dfc_perc / 100.0
+        ae_discounted = 0.0
+        nel_discounted = 0.0
+        el_discounted = 0.0
+        care_discounted = 0.0
+        ae_previous = 0.0
+        nel_previous = 0.0
+        el_previous = 0.0
+        care_previous = 0.0
+        ae_count = 0.0
+        nel_count = 0.0
+        el_count = 0.0
+        care_count = 0.0
+        for year in range(1, n_years + 1):
+            # Time alive by the end of this year:
+            t = year if year < med else med
+            discount = 1.0 / (c**(year - 1.0))
+            # Cumulative counts as in model.find_ae_count(),
+            # model.find_nel_count() and model.find_el_count():
+            ae_count = -np.log(np.exp(
+                -np.exp(-ae_gamma * lp_ae) * (t**ae_gamma)))
+            nel_count = -np.log(
+                (1.0 + (t * np.exp(-lp_nel))**(1.0 / nel_gamma))**(-1.0))
+            el_count = -np.log(
+                (1.0 + (t * np.exp(-lp_el))**(1.0 / el_gamma))**(-1.0))
+            care_count = average_care_year * t
+            # Discount the use within this year:
+            ae_discounted += (ae_count - ae_previous) * discount
+            nel_discounted += (nel_count - nel_previous) * discount
+            el_discounted += (el_count - el_previous) * discount
+            care_discounted += (care_count - care_previous) * discount
+            ae_previous = ae_count
+            nel_previous = nel_count
+            el_previous = el_count
+            care_previous = care_count
+
+        # ##### Costs #####
+        ae_cost = cost_ae * ae_discounted
+        nel_cost = cost_nel * nel_discounted
+        el_cost = cost_el * el_discounted
+        care_cost = cost_residential * 365 * care_discounted
+        total_cost = ae_cost + nel_cost + el_cost + care_cost
+
+        out[0, i] = p1
+        out[1, i] = lpn
+        out[2, i] = med
+        out[3, i] = survival_times[1]
+        out[4, i] = survival_times[2]
+        out[5, i] = qalys
+        out[6, i] = ae_count
+        out[7, i] = nel_count
+        out[8, i] = el_count
+        out[9, i] = care_count
+        out[10, i] = ae_cost
+        out[11, i] = nel_cost
+        out[12, i] = el_cost
+        out[13, i] = care_cost
+        out[14, i] = total_cost
+        out[15, i] = wtp * qalys - total_cost
+
+
+if NUMBA_AVAILABLE:
+    _outcomes_kernel = numba.njit(parallel=True, cache=True)(_outcomes_kernel)
@@ -0,0 +1,381 @@
+"""
+Results for one patient that are only calculated when they are used.
+
+main_calculations() works out every result straight away, including
+the lists of values for each year, even if the caller only wants
+e.g. the net benefit. The LazyResults class has the same results as
+attributes but calculates each group of them on first access and then
+keeps them. Results that are calculated together, e.g. all of the
+A&E lists and costs, are worked out at the same time.
+
+main_calculations() returns to_dict() of a LazyResults, so the two
+always give the same values. LazyResults can also be used
+like a read-only dictionary, e.g. results['net_benefit'].
+"""
+# Imports:
+import numpy as np
+
+# Import functions for calculating various quantities:
+from . import models as model
+from .main_calculations import (
+    find_cumhazard_with_time, calculate_prob_death_per_year,
+    find_resource_count_for_all_years,
+    find_discounted_resource_use_for_all_years)
+
+
+# Inputs that are stored as given, in the order of main_calculations():
+input_keys = ['age', 'sex', 'sex_label', 'model_type', 'mrs', 'outcome_type']
+
+# Calculated results and the method that calculates each of them,
+# in the order of main_calculations():
+result_groups = dict(
+    death_in_year_1_lp='_find_survival_times',
+    death_in_year_1_prob='_find_survival_times',
+    death_in_year_n_lp='_find_survival_times',
+    years='_find_hazard',
+    hazard_by_year='_find_hazard',
+    survival_by_year='_find_hazard',
+    fhazard_by_year='_find_hazard',
+    death_in_year_n_probs='_find_hazard',
+    death_in_year_n_probs_first_invalid_index='_find_hazard',
+    survival_median_years='_find_survival_times',
+    survival_lower_quartile_years='_find_survival_times',
+    survival_upper_quartile_years='_find_survival_times',
+    survival_mean_years='_find_survival_mean',
+    life_expectancy='_find_survival_times',
+    year_when_zero_survival='_find_year_when_zero_survival',
+    qalys_total='_find_qalys',
+    qalys_by_year='_find_qalys',
+    raw_qalys_by_year='_find_qalys',
+    ae_lp='_find_ae_count',
+    ae_count='_find_ae_count',
+    ae_counts_by_year='_find_ae_by_year',
+    ae_discounted_by_year='_find_ae_by_year',
+    ae_discounted_cost='_find_ae_by_year',
+    nel_lp='_find_nel_count',
+    nel_count='_find_nel_count',
+    nel_counts_by_year='_find_nel_by_year',
+    nel_discounted_by_year='_find_nel_by_year',
+    nel_discounted_cost='_find_nel_by_year',
+    el_lp='_find_el_count',
+    el_count='_find_el_count',
+    el_counts_by_year='_find_el_by_year',
+    el_discounted_by_year='_find_el_by_year',
+    el_discounted_cost='_find_el_by_year',
+    care_years='_find_care_years',
+    care_years_by_year='_find_care_years_by_year',
+    care_years_discounted_by_year='_find_care_years_by_year',
+    care_years_discounted_cost='_find_care_years_by_year',
+    total_discounted_cost='_find_total_discounted_cost',
+    net_benefit='_find_net_benefit',
+)
+result_keys = list(result_groups)
+
+# Results that are lists or arrays, which are empty for invalid mRS:
+array_keys = [key for key in result_keys if key.endswith('_by_year')] + [
+    'years', 'death_in_year_n_probs']
+
+# Settings for each resource: (linear predictor function,
+# count function, unit price).
+resource_setup = dict(
+    ae=(model.find_lp_ae_count, model.find_ae_count, 'cost_ae_gbp'),
+    nel=(model.find_lp_nel_count, model.find_nel_count,
+         'cost_non_elective_bed_day_gbp'),
+    el=(model.find_lp_el_count, model.find_el_count,
+        'cost_elective_bed_day_gbp'),
+)
+
+
+class LazyResults:
+    """
+    Lifetime outcomes for one patient, calculated on first access.
+
+    Example:
+    --------
+    results = LazyResults(
+        70, 1, 'Male', 2, get_fixed_params('mRS'), 'mRS')
+    results.net_benefit      # Only QALYs and costs are calculated.
+    results.to_dict()        # Same as main_calculations().
+    """
+    # One slot for each input and one private slot for each result.
+    # A result slot stays unset until it is calculated.
+    __slots__ = (
+        tuple(input_keys) + ('fixed_params',) +
+        tuple(f'_{key}' for key in result_keys)
+    )
+
+    def __init__(
+            self,
+            age: float,
+            sex: int,
+            sex_str: str,
+            mrs: int,
+            fixed_params: dict,
+            model_type_str: str
+            ):
+        """
+        Store the patient details. Nothing is calculated yet.
+
+        Inputs:
+        -------
+        The same as main_calculations().
+        """
+        self.age = age
+        self.sex = sex
+        self.sex_label = sex_str
+        self.model_type = model_type_str
+        self.mrs = mrs
+        self.fixed_params = fixed_params
+
+        if mrs not in range(0, 6):
+            # If mRS is 6 (dead) or other invalid value,
+            # store the same placeholders as main_calculations().
+            self.outcome_type = 'n/a'
+            for key in result_keys:
+                value = np.array([]) if key in array_keys else np.nan
+                setattr(self, f'_{key}', value)
+        else:
+            self.outcome_type = 'Dependent' if mrs > 2 else 'Independent'
+
+    def __repr__(self):
+        return (
+            f'LazyResults(age={self.age}, sex={self.sex}, '
+            f'mrs={self.mrs}, model_type={self.model_type!r})')
+
+    # ##### Dictionary access #####
+    def _get(self, key: str):
+        """Return a result, calculating its group first if needed."""
+        try:
+            return getattr(self, f'_{key}')
+        except AttributeError:
+            getattr(self, result_groups[key])()
+            return getattr(self, f'_{key}')
+
+    def __getitem__(self, key: str):
+        if key in input_keys:
+            return getattr(self, key)
+        if key in result_groups:
+            return self._get(key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str):
+        return key in input_keys or key in result_groups
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(input_keys) + len(result_keys)
+
+    def keys(self):
+        """All of the result names in the order of to_dict()."""
+        return input_keys + result_keys
+
+    def calculated_keys(self):
+        """Names of the results that have been calculated so far."""
+        return [key for key in result_keys if hasattr(self, f'_{key}')]
+
+    def to_dict(self):
+        """
+        Calculate everything and return the main_calculations() dict.
+
+        Returns:
+        --------
+        results_dict - dict. The same keys and values as from
+                       main_calculations().
+        """
+        return dict((key, self[key]) for key in self.keys())
+
+    # ##### Mortality #####
+    def _find_survival_times(self):
+        """Linear predictors, survival quantiles, life expectancy."""
+        fp = self.fixed_params
+        self._death_in_year_1_lp = model.find_lpDeath_year1(
+            self.age, self.sex, self.mrs,
+            fp['lg_mean_ages'], fp['lg_coeffs'])
+        self._death_in_year_n_lp = model.find_lpDeath_yearn(
+            self.age, self.sex, self.mrs,
+            fp['gz_mean_age'], fp['gz_coeffs'])
+        self._death_in_year_1_prob = model.find_pDeath_year1(
+            self._death_in_year_1_lp)
+
+        # Median, lower quartile and upper quartile in one go.
+        survival_times, _, _, _ = model.find_survival_time_quantiles(
+            [0.5, 0.25, 0.75],
+            self._death_in_year_1_prob,
+            self._death_in_year_n_lp,
+            fp['gz_gamma']
+            )
+        (self._survival_median_years,
+         self._survival_lower_quartile_years,
+         self._survival_upper_quartile_years) = survival_times[0]
+        self._life_expectancy = self._survival_median_years + self.age
+
+    def _find_hazard(self):
+        """Hazard, survival and probability of death by year."""
+        fp = self.fixed_params
+        years = np.arange(0, fp['time_max_post_discharge_year'] + 1, 1)
+        p1 = self._get('death_in_year_1_prob')
+        lpn = self._get('death_in_year_n_lp')
+        hazard_by_year, survival_by_year, fhazard_by_year = (
+            find_cumhazard_with_time(years, fp['gz_gamma'], p1, lpn))
+
+        # First year where survival is less than 0% and so the
+        # calculated probability of death is invalid:
+        invalid_inds = np.where(hazard_by_year >= 1.0)[0] + 1
+        self._death_in_year_n_probs_first_invalid_index = (
+            invalid_inds[0] if invalid_inds.size > 0 else np.nan)
+        self._death_in_year_n_probs = calculate_prob_death_per_year(
+            years, fp['gz_gamma'], p1, lpn)
+        self._years = years
+        self._hazard_by_year = hazard_by_year
+        self._survival_by_year = survival_by_year
+        self._fhazard_by_year = fhazard_by_year
+
+    def _find_survival_mean(self):
+        """Mean survival, the area under the whole survival curve."""
+        self._survival_mean_years = model.find_mean_survival_time(
+            self._get('death_in_year_1_prob'),
+            self._get('death_in_year_n_lp'),
+            self.fixed_params['gz_gamma']
+            )[0]
+
+    def _find_year_when_zero_survival(self):
+        """Years from discharge to when survival reaches zero."""
+        self._year_when_zero_survival = model.find_time_for_this_hazard(
+            self.fixed_params['gz_gamma'],
+            self._get('death_in_year_1_prob'),
+            self._get('death_in_year_n_lp'),
+            hazard_prob=1.0
+            )
+
+    # ##### QALYs #####
+    def _find_qalys(self):
+        """Total QALYs and QALYs by year."""
+        fp = self.fixed_params
+        (self._qalys_total,
+         self._qalys_by_year,
+         self._raw_qalys_by_year) = model.calculate_qaly(
+            fp['utility_list'][self.mrs],
+            self._get('survival_median_years'),
+            self.age,
+            self.sex,
+            fp['lg_mean_ages'][self.mrs],
+            fp['qaly_age_coeff'],
+            fp['qaly_age2_coeff'],
+            fp['qaly_sex_coeff'],
+            dfq=fp['discount_factor_QALYs_perc'] / 100.0
+            )
+
+    # ##### Resource use #####
+    def _find_resource_count(self, resource: str):
+        """Linear predictor and count across the median survival."""
+        fp = self.fixed_params
+        lp_function, count_function, _ = resource_setup[resource]
+        lp = lp_function(
+            self.age, self.sex, self.mrs, fp['lg_mean_ages'],
+            fp[f'{resource}_coeffs'], fp[f'{resource}_mRS'])
+        setattr(self, f'_{resource}_lp', lp)
+        setattr(self, f'_{resource}_count', count_function(
+            lp, fp[f'{resource}_coeffs'], self._get('survival_median_years')))
+
+    def _find_resource_by_year(self, resource: str):
+        """Resource use and discounted use by year, discounted cost."""
+        fp = self.fixed_params
+        _, count_function, cost_key = resource_setup[resource]
+        counts_by_year = find_resource_count_for_all_years(
+            self._get('survival_median_years'),
+            count_function,
+            coeffs=fp[f'{resource}_coeffs'],
+            LP=self._get(f'{resource}_lp')
+            )
+        self._store_by_year(
+            resource, f'{resource}_counts_by_year', counts_by_year,
+            cost_key, 1)
+
+    def _store_by_year(
+            self, resource, counts_key, counts_by_year, cost_key, scale):
+        """Discount the counts by year and find the discounted cost."""
+        discounted_by_year = find_discounted_resource_use_for_all_years(
+            counts_by_year,
+            self.fixed_params['discount_factor_costs_perc']
+            )
+        setattr(self, f'_{counts_key}', counts_by_year)
+        setattr(self, f'_{resource}_discounted_by_year', discounted_by_year)
+        setattr(self, f'_{resource}_discounted_cost', (
+            self.fixed_params[cost_key] * scale *
+            np.sum(discounted_by_year)))
+
+    def _find_ae_count(self):
+        self._find_resource_count('ae')
+
+    def _find_ae_by_year(self):
+        self._find_resource_by_year('ae')
+
+    def _find_nel_count(self):
+        self._find_resource_count('nel')
+
+    def _find_nel_by_year(self):
+        self._find_resource_by_year('nel')
+
+    def _find_el_count(self):
+        self._find_resource_count('el')
+
+    def _find_el_by_year(self):
+        self._find_resource_by_year('el')
+
+    def _find_average_care_year(self):
+        """Average time per year in residential care for this mRS."""
+        average_care_year_per_mRS = model.find_average_care_year_per_mRS(
+            self.age,
+            self.fixed_params['perc_care_home_over70'],
+            self.fixed_params['perc_care_home_not_over70']
+            )
+        return average_care_year_per_mRS[self.mrs]
+
+    def _find_care_years(self):
+        """Years in residential care across the median survival."""
+        self._care_years = model.find_residential_care_average_time(
+            self._find_average_care_year(),
+            self._get('survival_median_years')
+            )
+
+    def _find_care_years_by_year(self):
+        """Years in care by year, discounted, and discounted cost."""
+        counts_by_year = find_resource_count_for_all_years(
+            self._get('survival_median_years'),
+            model.find_residential_care_average_time,
+            average_care_year=self._find_average_care_year()
+            )
+        # The unit price is per day:
+        self._store_by_year(
+            'care_years', 'care_years_by_year', counts_by_year,
+            'cost_residential_day_gbp', 365)
+
+    # ##### Costs and cost effectiveness #####
+    def _find_total_discounted_cost(self):
+        """Sum of the discounted costs of every resource."""
+        self._total_discounted_cost = np.sum([
+            self._get('ae_discounted_cost'),
+            self._get('nel_discounted_cost'),
+            self._get('el_discounted_cost'),
+            self._get('care_years_discounted_cost')
+        ])
+
+    def _find_net_benefit(self):
+        """Net benefit from QALYs and the total discounted cost."""
+        self._net_benefit = (
+            self.fixed_params['wtp_qaly_gpb'] * self._get('qalys_total') -
+            self._get('total_discounted_cost'))
+
+
+def _make_result_property(key: str):
+    """Make a read-only attribute that calculates the result once."""
+    return property(
+        lambda self: self._get(key),
+        doc=f'{key}, calculated on first access.')
+
+
+for _key in result_keys:
+    setattr(LazyResults, _key, _make_result_property(_key))
+del _key
@@ -0,0 +1,281 @@
+"""
+Patient-level microsimulation.
+
+The main calculations give the expected outcomes for each patient.
+This script instead draws one possible lifetime for each patient:
++ a time of death drawn from the same survival curve as in
+  find_cumhazard_with_time(), i.e. the year-one logistic probability
+  of death followed by the Gompertz tail.
++ numbers of A&E admissions, non-elective bed days and elective bed
+  days drawn from Poisson processes whose expected cumulative counts
+  are given by find_ae_count(), find_nel_count() and find_el_count().
+Resource use and time in care are counted until death or until
+time_max_post_discharge_year, whichever is sooner, whether or not
+the counts in each year are returned.
+
+Patients are simulated in chunks. Each chunk has its own random
+number stream spawned from one seed, so chunks can be run in any
+order or in parallel and the results are always the same for the
+same seed and chunk size.
+"""
+# Imports:
+import numpy as np
+
+from . import models as model
+from .batch_calculations import (
+    gather_patient_params, find_lpDeath_batch, find_lp_resource_batch)
+
+
+def simulate_cohort(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        seed: int = None,
+        chunk_size: int = 100000,
+        by_year: bool = False,
+        executor=None
+        ):
+    """
+    Simulate one lifetime for every patient in a cohort.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    mrs          - np.array. Patients' mRS scores from 0 to 5.
+                   Patients with mRS 6 (dead) or any other value are
+                   dead at discharge.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    seed         - int or None. Seed for the random number streams.
+    chunk_size   - int. Number of patients in each chunk. Changing
+                   this changes which random numbers each patient
+                   receives.
+    by_year      - bool. Whether to also return counts in each year.
+    executor     - concurrent.futures.Executor or None. If given, the
+                   chunks are simulated in parallel with this
+                   executor, e.g. a ProcessPoolExecutor.
+
+    Returns:
+    --------
+    results - dict. Output of simulate_patients() for the whole
+              cohort.
+    """
+    chunks = list(iter_simulated_chunks(
+        age, sex, mrs, fixed_params,
+        seed=seed,
+        chunk_size=chunk_size,
+        by_year=by_year,
+        executor=executor
+        ))
+    results = dict(
+        (key, np.concatenate([chunk[key] for chunk in chunks]))
+        for key in chunks[0].keys()
+    )
+    return results
+
+
+def iter_simulated_chunks(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        seed: int = None,
+        chunk_size: int = 100000,
+        by_year: bool = False,
+        executor=None
+        ):
+    """
+    Simulate a cohort one chunk at a time.
+
+    The inputs are the same as for simulate_cohort().
+
+    Yields:
+    -------
+    results - dict. Output of simulate_patients() for the next chunk
+              of patients, in the same order as the input patients.
+    """
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    starts = range(0, max(age.shape[0], 1), chunk_size)
+    # One independent random number stream per chunk:
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(starts))
+
+    tasks = [
+        (age[start:start + chunk_size],
+         sex[start:start + chunk_size],
+         mrs[start:start + chunk_size],
+         fixed_params,
+         seed_sequence,
+         by_year)
+        for start, seed_sequence in zip(starts, seed_sequences)
+    ]
+    if executor is None:
+        for task in tasks:
+            yield _simulate_chunk(task)
+    else:
+        # Executor.map keeps the chunks in order:
+        for results in executor.map(_simulate_chunk, tasks):
+            yield results
+
+
+def _simulate_chunk(task):
+    """
+    Unpack one chunk's inputs and simulate it.
+
+    This is a module-level function so that it can be sent to
+    other processes.
+    """
+    age, sex, mrs, fixed_params, seed_sequence, by_year = task
+    rng = np.random.default_rng(seed_sequence)
+    return simulate_patients(age, sex, mrs, fixed_params, rng, by_year)
+
+
+def simulate_patients(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        rng: np.random.Generator,
+        by_year: bool = False
+        ):
+    """
+    Simulate one lifetime for each patient.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes.
+    mrs          - np.array. Patients' mRS scores.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    rng          - np.random.Generator. Source of random numbers.
+    by_year      - bool. Whether to also return counts in each year.
+
+    Returns:
+    --------
+    results - dict. One value per patient for each key:
+        death_time_years  - float. Years from discharge until death.
+        ae_admissions     - int. Number of A&E admissions.
+        nel_bed_days      - int. Number of non-elective bed days.
+        el_bed_days       - int. Number of elective bed days.
+        care_years        - float. Expected years in residential care
+                            given the time of death.
+              The counts and care years stop at
+              time_max_post_discharge_year if the patient is still
+              alive then.
+              If by_year is True, there are also these keys with one
+              column per year from year 1 to
+              time_max_post_discharge_year:
+        alive_by_year     - bool. Whether the patient is alive at the
+                            end of each year.
+        ae_admissions_by_year
+        nel_bed_days_by_year
+        el_bed_days_by_year
+    """
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    valid = (mrs >= 0) & (mrs <= 5)
+    patient_params = gather_patient_params(
+        fixed_params, age, np.where(valid, mrs, 0))
+
+    # ##### Mortality #####
+    death_in_year_1_lp, death_in_year_n_lp = find_lpDeath_batch(
+        age, sex, patient_params)
+    death_in_year_1_prob = model.find_pDeath_year1(death_in_year_1_lp)
+    death_time_years = draw_death_times(
+        rng.random(age.shape),
+        death_in_year_1_prob,
+        death_in_year_n_lp,
+        patient_params['gz_gamma']
+        )
+    # Patients who are already dead live for zero years:
+    death_time_years = np.where(valid, death_time_years, 0.0)
+
+    # ##### Resource use #####
+    results = dict(death_time_years=death_time_years)
+    time_max = fixed_params['time_max_post_discharge_year']
+    # Resources are only counted up to the last tabulated year:
+    counted_years = np.minimum(death_time_years, time_max)
+    if by_year:
+        years = np.arange(1, time_max + 1)
+        # Time alive by the end of each year:
+        years_alive = np.minimum(years, death_time_years[:, np.newaxis])
+        results['alive_by_year'] = years < death_time_years[:, np.newaxis]
+
+    for resource, label, count_function in [
+            ('ae', 'ae_admissions', model.find_ae_count),
+            ('nel', 'nel_bed_days', model.find_nel_count),
+            ('el', 'el_bed_days', model.find_el_count),
+            ]:
+        lp, coeffs = find_lp_resource_batch(
+            resource, age, sex, patient_params)
+        if by_year:
+            # Expected count within each year, then a Poisson draw
+            # for each year. The yearly draws add up to a Poisson
+            # draw for the whole lifetime.
+            coeffs = [c[:, np.newaxis] for c in coeffs]
+            cumulative = count_function(lp[:, np.newaxis], coeffs,
+                                        years_alive)
+            expected = np.diff(cumulative, axis=-1, prepend=0.0)
+            counts_by_year = rng.poisson(np.maximum(expected, 0.0))
+            results[f'{label}_by_year'] = counts_by_year
+            counts = np.sum(counts_by_year, axis=-1)
+        else:
+            expected = count_function(lp, coeffs, counted_years)
+            counts = rng.poisson(np.maximum(expected, 0.0))
+        results[label] = counts
+
+    results['care_years'] = model.find_residential_care_average_time(
+        patient_params['average_care_year'], counted_years)
+    return results
+
+
+def draw_death_times(
+        u: np.array,
+        death_in_year_1_prob: np.array,
+        death_in_year_n_lp: np.array,
+        gz_gamma: float or np.array
+        ):
+    """
+    Convert uniform random numbers into times of death.
+
+    The cumulative probability of death is inverted at each u:
+    + if u is below the probability of death in year one, the death
+      is in year one and survival falls as (1 - pDeath_year1)**t.
+    + otherwise the Gompertz cumulative hazard is inverted like in
+      model.find_time_for_this_hazard(), after removing the chance of
+      dying in year one.
+
+    Inputs:
+    -------
+    u                    - np.array. Uniform random numbers from 0
+                           to 1, one per patient.
+    death_in_year_1_prob - np.array. Probability of death in year 1.
+    death_in_year_n_lp   - np.array. Linear predictor for death after
+                           year 1.
+    gz_gamma             - float or np.array. Gompertz gamma.
+
+    Returns:
+    --------
+    death_time_years - np.array. Years from discharge until death.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Death during year one:
+        time_year1 = np.log1p(-u) / np.log1p(-death_in_year_1_prob)
+        # Death after year one. Hazard needed to reach cumulative
+        # probability u when (1 - u) = (1 - H)(1 - pDeath_year1):
+        hazard = 1.0 - (1.0 - u) / (1.0 - death_in_year_1_prob)
+        x = (gz_gamma * hazard * np.exp(-death_in_year_n_lp)) + 1.0
+        time_yearn = (np.log(x) / gz_gamma) / 365.0 + 1.0
+    death_time_years = np.where(
+        u <= death_in_year_1_prob, time_year1, time_yearn)
+    return death_time_years
@@ -7,6 +7,8 @@ These were adapted from the following R script:
 # Imports:
 import numpy as np
 
+from . import discounting
+
 
 # #####################################################################
 # ############################ Mortality ##############################
@@ -333,6 +335,187 @@ def find_survival_time_for_pDeath(
     return survival_time, survival_years, time_log, eqperc
 
 
+def find_survival_time_quantiles(
+        pDeaths: np.array,
+        pDeath_year1: np.array,
+        lpDeath_yearn: np.array,
+        gz_gamma: float or np.array
+        ):
+    """
+    Calculate survival times for many probabilities and patients.
+
+    This is the vectorised version of find_survival_time_for_pDeath().
+    The same two cases are calculated for every combination of
+    patient and probability, and then a mask picks out which case
+    to use in each cell.
+
+    Inputs:
+    -------
+    pDeaths       - float or np.array. Chosen probabilities of death,
+                    e.g. [0.5, 0.25, 0.75] for median and IQR.
+    pDeath_year1  - float or np.array. Probability of death in year 1,
+                    one value per patient.
+    lpDeath_yearn - float or np.array. Linear predictor for death
+                    after year 1, one value per patient.
+    gz_gamma      - float or np.array. Gompertz gamma coefficient,
+                    either shared or one value per patient.
+
+    Returns:
+    --------
+    survival_times - np.array. Survival times in years with shape
+                     (patients, probabilities).
+    survival_years - np.array. Case 1 survival times. Cells where
+                     case 1 is invalid contain -1.0.
+    time_log       - np.array. Case 2 survival times.
+    eqperc         - np.array. Adjusted input probabilities, P`.
+    """
+    # Probabilities run along the columns...
+    pDeaths = np.atleast_1d(np.asarray(pDeaths, dtype=float))
+    # ... and patients run down the rows.
+    pDeath_year1 = np.atleast_1d(
+        np.asarray(pDeath_year1, dtype=float))[:, np.newaxis]
+    lpDeath_yearn = np.atleast_1d(
+        np.asarray(lpDeath_yearn, dtype=float))[:, np.newaxis]
+    gz_gamma = np.asarray(gz_gamma, dtype=float)
+    if gz_gamma.ndim > 0:
+        gz_gamma = gz_gamma[:, np.newaxis]
+
+    # ----- Case 1: -----
+    # P`, prob prime, for every patient and probability:
+    eqperc = ((1.0 + pDeaths)/(1.0 + pDeath_year1)) - 1.0
+    # Only calculate the Gompertz inversion where P` is positive.
+    # Everywhere else keeps the placeholder value of -1.0.
+    mask_case1 = eqperc > 0
+    x = eqperc * gz_gamma / np.exp(lpDeath_yearn)
+    survival_years = np.full(eqperc.shape, -1.0)
+    np.log(x + 1.0, out=survival_years, where=mask_case1)
+    survival_years = np.where(
+        mask_case1,
+        survival_years / (gz_gamma*365.0) + 1.0,
+        survival_years
+        )
+
+    # ----- Case 2: -----
+    time_log_days = (
+        np.log(1.0 - pDeaths) /
+        (np.log(1 - pDeath_year1)/365.0)
+    )
+    time_log = time_log_days / 365.0
+
+    # Choose which case to use:
+    survival_times = np.where(survival_years > 1.0, survival_years, time_log)
+    return survival_times, survival_years, time_log, eqperc
+
+
+def find_restricted_mean_survival_time(
+        horizons: float or np.array,
+        pDeath_year1: float or np.array,
+        lpDeath_yearn: float or np.array,
+        gz_gamma: float or np.array
+        ):
+    """
+    Calculate restricted mean survival time (RMST) up to each horizon.
+
+    RMST is the area under the survival curve from discharge up to
+    the horizon. The survival curve is the same one that is
+    tabulated by year in find_cumhazard_with_time():
+    + During year one, survival falls as (1 - pDeath_year1)**t,
+      which is the same curve used for "time_log" in
+      find_survival_time_for_pDeath().
+    + After year one, survival is (1 - H_t) * (1 - pDeath_year1)
+      where H_t is the Gompertz cumulative hazard from
+      find_FDeath_yearn(). Survival is zero once H_t reaches 1.
+
+    Both parts integrate in closed form so no year-by-year sums
+    are needed.
+
+    Inputs:
+    -------
+    horizons      - float or np.array. Years since discharge to
+                    integrate up to. Use np.inf for the whole
+                    lifetime, i.e. the mean survival time.
+    pDeath_year1  - float or np.array. Probability of death in year 1,
+                    one value per patient.
+    lpDeath_yearn - float or np.array. Linear predictor for death
+                    after year 1, one value per patient.
+    gz_gamma      - float or np.array. Gompertz gamma coefficient,
+                    either shared or one value per patient.
+
+    Returns:
+    --------
+    rmst - np.array. Restricted mean survival time in years with
+           shape (patients, horizons).
+    """
+    # Horizons run along the columns...
+    horizons = np.atleast_1d(np.asarray(horizons, dtype=float))
+    # ... and patients run down the rows.
+    pDeath_year1 = np.atleast_1d(
+        np.asarray(pDeath_year1, dtype=float))[:, np.newaxis]
+    lpDeath_yearn = np.atleast_1d(
+        np.asarray(lpDeath_yearn, dtype=float))[:, np.newaxis]
+    gz_gamma = np.asarray(gz_gamma, dtype=float)
+    if gz_gamma.ndim > 0:
+        gz_gamma = gz_gamma[:, np.newaxis]
+
+    # ----- Year one -----
+    # Integral of (1 - p1)**t from t=0 to t=min(horizon, 1).
+    t_year1 = np.minimum(horizons, 1.0)
+    log_survival_year1 = np.log1p(-pDeath_year1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        area_year1 = np.where(
+            log_survival_year1 == 0.0,
+            t_year1,
+            np.expm1(t_year1 * log_survival_year1) / log_survival_year1
+            )
+
+    # ----- After year one -----
+    # Gompertz rate in units of years instead of days:
+    k = gz_gamma * 365.0
+    # Years after year one until the cumulative hazard reaches 1,
+    # matching find_time_for_this_hazard() minus the first year:
+    years_to_zero_survival = np.log1p(gz_gamma * np.exp(-lpDeath_yearn)) / k
+    # Years after year one to integrate over for each horizon:
+    u = np.clip(np.minimum(horizons - 1.0, years_to_zero_survival), 0.0, None)
+    # Integral of (1 - H_t) from 0 to u, where
+    # H_t = exp(lp) * (exp(k t) - 1) / gamma:
+    area_yearn = (
+        u - (np.exp(lpDeath_yearn) / gz_gamma) * (np.expm1(k * u) / k - u))
+    # Scale by the chance of surviving year one:
+    area_yearn *= (1.0 - pDeath_year1)
+
+    rmst = area_year1 + area_yearn
+    return rmst
+
+
+def find_mean_survival_time(
+        pDeath_year1: float or np.array,
+        lpDeath_yearn: float or np.array,
+        gz_gamma: float or np.array
+        ):
+    """
+    Calculate mean survival time, the area under the survival curve.
+
+    This is the restricted mean survival time with no restriction.
+    The survival curve reaches zero at the year_when_zero_survival
+    from find_time_for_this_hazard() so the area is finite.
+
+    Inputs:
+    -------
+    pDeath_year1  - float or np.array. Probability of death in year 1.
+    lpDeath_yearn - float or np.array. Linear predictor for death
+                    after year 1.
+    gz_gamma      - float or np.array. Gompertz gamma coefficient.
+
+    Returns:
+    --------
+    mean_survival - np.array. Mean survival time in years, one value
+                    per patient.
+    """
+    mean_survival = find_restricted_mean_survival_time(
+        np.inf, pDeath_year1, lpDeath_yearn, gz_gamma)[:, 0]
+    return mean_survival
+
+
 # #####################################################################
 # ############################## QALYs ################################
 # #####################################################################
@@ -374,7 +557,11 @@ def calculate_qaly(
     qaly_raw_by_year = []
     # Store discounted QALY for each year in here:
     qaly_by_year = []
-    for year in np.arange(0, med_survival_years):
+    years = np.arange(0, med_survival_years)
+    # Discount factor for each year:
+    discount_factors = discounting.find_discount_factors(
+        100.0 * dfq, years.size)
+    for year in years:
         # Calculate raw QALY
         raw_qaly = (
             util -
@@ -386,7 +573,7 @@ def calculate_qaly(
         qaly_raw_by_year.append(raw_qaly)
 
         # Calculate discounted QALY:
-        qaly = raw_qaly * (1.0 + dfq)**(-year)
+        qaly = raw_qaly * discount_factors[int(year)]
 
         if (year + age + 1) < (med_survival_years + age):
             # If this is *not* the final year:
@@ -0,0 +1,162 @@
+"""
+pandas DataFrame accessor for the batch calculations.
+
+Importing this module adds a "stroke_lifetime" accessor to every
+DataFrame. It takes the age, sex and mRS columns as arrays, runs the
+batch calculations on all of the rows at once and returns the
+outcomes as new columns with the same index:
+
+    import stroke_lifetime.pandas_accessor
+    outcomes = df.stroke_lifetime.compute(model='mRS')
+    df = df.stroke_lifetime.add_outcomes(model='mRS')
+
+This is much quicker than calling main_calculations() once per row
+with df.apply().
+
+pandas is only needed for this module, e.g. with
+pip install stroke-lifetime[pandas]. The rest of the package
+doesn't import it.
+"""
+# Imports:
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:
+    raise ImportError(
+        'The stroke_lifetime DataFrame accessor needs pandas. '
+        'Install it with "pip install stroke-lifetime[pandas]".'
+        ) from None
+
+from .batch_calculations import (
+    main_calculations_batch, calculate_outcomes_batch)
+from .jit_kernels import outcome_keys
+from .parameter_sets import get_parameter_set
+
+
+# Labels that can be used in a text sex column:
+sex_codes = dict(female=0, male=1)
+
+
+@pd.api.extensions.register_dataframe_accessor('stroke_lifetime')
+class StrokeLifetimeAccessor:
+    """
+    Run the batch calculations on the rows of a DataFrame.
+    """
+    def __init__(self, pandas_obj):
+        self._df = pandas_obj
+
+    def compute(
+            self,
+            model: str = 'mRS',
+            fixed_params: dict = None,
+            outcomes: list = None,
+            age_column: str = 'age',
+            sex_column: str = 'sex',
+            mrs_column: str = 'mrs',
+            prefix: str = '',
+            backend: str = 'auto'
+            ):
+        """
+        Calculate outcomes for every row.
+
+        Inputs:
+        -------
+        model        - str. Name of a built-in or registered
+                       parameter set, e.g. "mRS" or "Dichotomous".
+        fixed_params - dict or None. Fixed parameters to use instead
+                       of the named set.
+        outcomes     - list or None. Names of the outcomes to return.
+                       These can be any results of
+                       main_calculations_batch() with one value per
+                       patient. If None, use jit_kernels.outcome_keys.
+        age_column   - str. Column of ages in years.
+        sex_column   - str. Column of sexes, either 0 for female and
+                       1 for male or the labels "Female" and "Male".
+        mrs_column   - str. Column of mRS scores. Missing values and
+                       scores outside 0 to 5 give Not A Number.
+        prefix       - str. Added to the start of each new column
+                       name.
+        backend      - str. "numba", "numpy" or "auto". See
+                       calculate_outcomes_batch(). Only used when all
+                       of the outcomes are in jit_kernels.outcome_keys.
+
+        Returns:
+        --------
+        outcomes_df - pd.DataFrame. One column per outcome and the
+                      same index as this DataFrame.
+        """
+        if fixed_params is None:
+            fixed_params = get_parameter_set(model)
+        if outcomes is None:
+            outcomes = outcome_keys
+        df = self._df
+
+        age = df[age_column].to_numpy(dtype=float)
+        sex = find_sex_values(df[sex_column])
+        mrs = df[mrs_column].to_numpy(dtype=float, na_value=-1.0)
+        # Infinite scores and scores that aren't whole numbers are
+        # invalid too:
+        mrs = np.where(
+            np.isfinite(mrs) & (mrs == np.round(mrs)), mrs, -1.0
+            ).astype(int)
+
+        if all(key in outcome_keys for key in outcomes):
+            results = calculate_outcomes_batch(
+                age, sex, mrs, fixed_params, backend=backend)
+        else:
+            results = main_calculations_batch(age, sex, mrs, fixed_params)
+
+        columns = dict()
+        for key in outcomes:
+            try:
+                values = results[key]
+            except KeyError:
+                raise KeyError(
+                    f'"{key}" is not a result of the batch calculations.'
+                    ) from None
+            if np.ndim(values) != 1:
+                raise ValueError(
+                    f'"{key}" does not have one value per patient, so it '
+                    'can\'t be a column.')
+            columns[prefix + key] = values
+        return pd.DataFrame(columns, index=df.index)
+
+    def add_outcomes(self, **kwargs):
+        """
+        Return a copy of this DataFrame with the outcome columns added.
+
+        Inputs:
+        -------
+        kwargs - Any of the inputs to compute().
+
+        Returns:
+        --------
+        df - pd.DataFrame. The original columns and then one column
+             per outcome.
+        """
+        return pd.concat([self._df, self.compute(**kwargs)], axis=1)
+
+
+def find_sex_values(column):
+    """
+    Convert a sex column to 0 for female and 1 for male.
+
+    Inputs:
+    -------
+    column - pd.Series. Either numbers or the labels "Female" and
+             "Male" in any case.
+
+    Returns:
+    --------
+    sex - np.array. One value per row.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy()
+    sex = column.astype(str).str.lower().map(sex_codes)
+    if sex.isna().any():
+        unknown = column[sex.isna()].unique()[:5]
+        raise ValueError(
+            f'Unknown sex labels {list(unknown)}. '
+            'Use 0 and 1 or "Female" and "Male".')
+    return sex.to_numpy(dtype=int)
@@ -0,0 +1,379 @@
+"""
+Load, check and cache sets of fixed parameters.
+
+The built-in parameter sets "mRS" and "Dichotomous" come from
+fixed_params.py. Other sets can be read from JSON or TOML files that
+contain the same keys as make_fixed_params_shared() and the model
+coefficients, plus a "model_type" of either "mRS" or "Dichotomous"
+that picks how the care home percentages are calculated from the
+discharge destination numbers. The percentages themselves are not
+in the file because they are always calculated.
+
+For example, in TOML:
+
+    model_type = "mRS"
+    time_max_post_discharge_year = 50
+    utility_list = [0.95, 0.93, 0.83, 0.62, 0.42, 0.11]
+    lg_coeffs = [...]
+    ...
+
+write_parameter_file() writes a complete example from any existing
+parameter set.
+
+Each file is checked and compiled into a fixed_params dictionary
+once per session. Compiling converts the values to floats and
+np.arrays and adds the care home percentages. The compiled sets are
+kept in memory under the SHA-256 hash of the file contents, so
+loading the same file again skips the parsing and checks, and an
+edited file is always compiled again. Every load returns its own
+copy, so changing the arrays of one set doesn't change later loads.
+
+Nothing that depends on the values, e.g. the per-mRS tables or the
+discount factors, is stored with the compiled set. The batch
+engines work those out from fixed_params on each call, so they stay
+right when a caller changes a value such as a tariff.
+"""
+# Imports:
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import fixed_params as fp
+
+# tomllib is only in the standard library from Python 3.11:
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+# Expected shape of each value in a parameter file. () is a single
+# number. Values indexed by mRS have one entry per mRS from 0 to 5
+# and the discharge numbers split by age have one entry per mRS
+# from 3 to 5.
+parameter_shapes = dict(
+    time_max_post_discharge_year=(),
+    qaly_age_coeff=(),
+    qaly_age2_coeff=(),
+    qaly_sex_coeff=(),
+    discount_factor_QALYs_perc=(),
+    discount_factor_costs_perc=(),
+    wtp_qaly_gpb=(),
+    cost_ae_gbp=(),
+    cost_elective_bed_day_gbp=(),
+    cost_non_elective_bed_day_gbp=(),
+    cost_residential_day_gbp=(),
+    n_patients_care_home=(6,),
+    n_patients_not_care_home=(6,),
+    n_patients_care_home_over70=(3,),
+    n_patients_not_care_home_over70=(3,),
+    n_patients_care_home_not_over70=(3,),
+    n_patients_not_care_home_not_over70=(3,),
+    utility_list=(6,),
+    lg_coeffs=(9,),
+    lg_mean_ages=(6,),
+    gz_coeffs=(16,),
+    gz_gamma=(),
+    gz_mean_age=(),
+    ae_coeffs=(4,),
+    ae_mRS=(6,),
+    nel_coeffs=(4,),
+    nel_mRS=(6,),
+    el_coeffs=(4,),
+    el_mRS=(6,),
+)
+
+# Functions for the care home percentages for each model type:
+care_home_functions = dict(
+    mRS=fp.find_perc_care_home_mrs_model,
+    Dichotomous=fp.find_perc_care_home_dicho_model,
+)
+
+# Names of registered parameter sets and their files:
+_registry = {}
+# Sets already compiled in this session, keyed by file hash:
+_compiled = {}
+
+
+# #####################################################################
+# ############################# Registry ##############################
+# #####################################################################
+
+def register_parameter_set(name: str, path: str):
+    """
+    Register a parameter file under a name.
+
+    Inputs:
+    -------
+    name - str. Name to use with get_parameter_set(). The built-in
+           names "mRS" and "Dichotomous" can't be replaced.
+    path - str. Path to a JSON or TOML parameter file.
+    """
+    if name in care_home_functions:
+        raise ValueError(f'"{name}" is a built-in parameter set.')
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    _registry[name] = os.path.abspath(path)
+
+
+def list_parameter_sets():
+    """
+    List the names of the built-in and registered parameter sets.
+
+    Returns:
+    --------
+    names - list. Parameter set names.
+    """
+    return list(care_home_functions.keys()) + list(_registry.keys())
+
+
+def get_parameter_set(name: str):
+    """
+    Get the fixed parameters for a built-in or registered set.
+
+    Inputs:
+    -------
+    name - str. "mRS", "Dichotomous", or a name given to
+           register_parameter_set().
+
+    Returns:
+    --------
+    fixed_params - dict. The same keys as from get_fixed_params().
+    """
+    if name in care_home_functions:
+        return fp.get_fixed_params(name)
+    try:
+        path = _registry[name]
+    except KeyError:
+        raise KeyError(
+            f'Unknown parameter set "{name}". '
+            f'Choose from: {list_parameter_sets()}') from None
+    return load_parameter_set(path)
+
+
+# #####################################################################
+# ########################## Load and cache ###########################
+# #####################################################################
+
+def load_parameter_set(path: str, use_cache: bool = True):
+    """
+    Load, check and compile a parameter file.
+
+    Inputs:
+    -------
+    path      - str. Path to a JSON or TOML parameter file.
+    use_cache - bool. Whether to reuse a set already compiled from
+                the same file contents in this session.
+
+    Returns:
+    --------
+    fixed_params - dict. The same keys as from get_fixed_params().
+                   The arrays are copies, so they can be changed.
+    """
+    with open(path, 'rb') as f:
+        contents = f.read()
+    cache_key = hashlib.sha256(contents).hexdigest()
+
+    if use_cache and cache_key in _compiled:
+        fixed_params = _compiled[cache_key]
+    else:
+        values = parse_parameter_file(contents, path)
+        fixed_params = compile_parameter_set(values)
+        if use_cache:
+            _compiled[cache_key] = fixed_params
+    return copy_parameter_set(fixed_params)
+
+
+def copy_parameter_set(fixed_params: dict):
+    """
+    Copy a parameter set including its arrays.
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+
+    Returns:
+    --------
+    fixed_params - dict. The same values in new arrays.
+    """
+    return dict(
+        (key, value.copy() if isinstance(value, np.ndarray) else value)
+        for key, value in fixed_params.items()
+    )
+
+
+# #####################################################################
+# ######################### Parse and check ###########################
+# #####################################################################
+
+def parse_parameter_file(contents: bytes, path: str):
+    """
+    Read the values from the contents of a JSON or TOML file.
+
+    Inputs:
+    -------
+    contents - bytes. The file contents.
+    path     - str. The file name. Its extension picks the format.
+
+    Returns:
+    --------
+    values - dict. The values as written in the file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        values = json.loads(contents.decode('utf-8'))
+    elif extension == '.toml':
+        if tomllib is None:
+            raise ImportError(
+                'Reading TOML files needs Python 3.11 or the tomli '
+                'package. Install tomli or use a JSON file instead.')
+        values = tomllib.loads(contents.decode('utf-8'))
+    else:
+        raise ValueError(
+            f'Parameter files must be .json or .toml, not "{path}".')
+    return values
+
+
+def check_parameter_values(values: dict):
+    """
+    Check that a parameter file has every value in the right shape.
+
+    All of the problems are collected and reported together.
+
+    Inputs:
+    -------
+    values - dict. Output of parse_parameter_file().
+
+    Returns:
+    --------
+    values - dict. The same values with lists converted to np.arrays.
+    """
+    problems = []
+    model_type = values.get('model_type')
+    if model_type not in care_home_functions:
+        problems.append(
+            f'model_type must be one of {list(care_home_functions)}, '
+            f'not {model_type!r}.')
+
+    missing = [key for key in parameter_shapes if key not in values]
+    if len(missing) > 0:
+        problems.append(f'Missing values: {missing}.')
+    unknown = [key for key in values
+               if key not in parameter_shapes and key != 'model_type']
+    if len(unknown) > 0:
+        problems.append(f'Unknown values: {unknown}.')
+
+    checked = dict(model_type=model_type)
+    for key, shape in parameter_shapes.items():
+        if key not in values:
+            continue
+        try:
+            value = np.asarray(values[key], dtype=float)
+        except (TypeError, ValueError):
+            problems.append(f'{key} must contain only numbers.')
+            continue
+        if value.shape != shape:
+            problems.append(
+                f'{key} must have shape {shape}, not {value.shape}.')
+        elif not np.all(np.isfinite(value)):
+            problems.append(f'{key} must contain only finite numbers.')
+        checked[key] = value
+
+    if len(problems) > 0:
+        raise ValueError(
+            'Invalid parameter set:\n' + '\n'.join(problems))
+    return checked
+
+
+def compile_parameter_set(values: dict):
+    """
+    Turn checked file values into a fixed parameters dictionary.
+
+    Single values become Python numbers, the rest stay as np.arrays
+    and the care home percentages for the model type are added. The
+    result is the same as from get_fixed_params(), so it can be used
+    anywhere that is.
+
+    Inputs:
+    -------
+    values - dict. Output of parse_parameter_file().
+
+    Returns:
+    --------
+    fixed_params - dict. The same keys as from get_fixed_params()
+                   plus "model_type".
+    """
+    values = check_parameter_values(values)
+    fixed_params = dict(model_type=values['model_type'])
+    for key, shape in parameter_shapes.items():
+        if shape == ():
+            fixed_params[key] = float(values[key])
+        else:
+            fixed_params[key] = values[key]
+    fixed_params['time_max_post_discharge_year'] = int(
+        fixed_params['time_max_post_discharge_year'])
+
+    fixed_params.update(
+        care_home_functions[values['model_type']](fixed_params))
+    return fixed_params
+
+
+# #####################################################################
+# ############################## Export ###############################
+# #####################################################################
+
+def write_parameter_file(fixed_params: dict, path: str, model_type: str):
+    """
+    Write a parameter set to a JSON file.
+
+    This is useful as a starting point for a new parameter file,
+    e.g. write_parameter_file(get_fixed_params('mRS'), path, 'mRS').
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains at least the keys in
+                   parameter_shapes.
+    path         - str. Path of the JSON file to write.
+    model_type   - str. "mRS" or "Dichotomous".
+    """
+    values = dict(model_type=model_type)
+    for key in parameter_shapes:
+        values[key] = np.asarray(fixed_params[key]).tolist()
+    with open(path, 'w') as f:
+        json.dump(values, f, indent=4)
+
+
+def hash_fixed_params(fixed_params: dict):
+    """
+    Make a fingerprint of the values in a fixed parameters dict.
+
+    Two dictionaries with the same keys and values always give the
+    same hash, so it can be used to label results calculated with
+    those parameters.
+
+    Inputs:
+    -------
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+
+    Returns:
+    --------
+    digest - str. SHA-256 hash in hexadecimal.
+    """
+    sha = hashlib.sha256()
+    for key in sorted(fixed_params.keys()):
+        value = fixed_params[key]
+        sha.update(key.encode())
+        if isinstance(value, str):
+            sha.update(b's' + value.encode())
+        else:
+            value = np.ascontiguousarray(value, dtype=float)
+            sha.update(str(value.shape).encode())
+            sha.update(value.tobytes())
+    return sha.hexdigest()
@@ -0,0 +1,120 @@
+"""
+Calculate each unique patient profile only once.
+
+The results for a patient only depend on their age, sex and mRS
+score. Large cohorts, e.g. registry extracts with ages in whole
+years, contain the same (age, sex, mRS) combination many times.
+The planner here finds the unique combinations, runs the batch
+calculations once for each of them and then copies the results
+back out to every patient in the original order.
+"""
+# Imports:
+import numpy as np
+
+from .batch_calculations import main_calculations_batch
+
+
+# Results that have one value per patient and no parameter set axis:
+patient_keys = ['age', 'sex', 'mrs', 'outcome_type']
+
+
+def plan_unique_profiles(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array
+        ):
+    """
+    Find the unique (age, sex, mRS) combinations.
+
+    Inputs:
+    -------
+    age - np.array. Patients' ages in years.
+    sex - np.array. Patients' sexes.
+    mrs - np.array. Patients' mRS scores.
+
+    Returns:
+    --------
+    plan - dict. Keys:
+        age         - np.array. Age of each unique profile.
+        sex         - np.array. Sex of each unique profile.
+        mrs         - np.array. mRS of each unique profile.
+        inverse     - np.array. For each patient, the index of their
+                      profile in the unique arrays.
+        n_patients  - int. Number of patients.
+        n_unique    - int. Number of unique profiles.
+        dedup_ratio - float. Patients per unique profile.
+    """
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    age, sex, mrs = age.ravel(), sex.ravel(), mrs.ravel()
+    profiles, inverse = np.unique(
+        np.stack((age, sex, mrs), axis=1), axis=0, return_inverse=True)
+    n_patients = age.size
+    n_unique = profiles.shape[0]
+    plan = dict(
+        age=profiles[:, 0],
+        sex=profiles[:, 1].astype(sex.dtype),
+        mrs=profiles[:, 2].astype(int),
+        inverse=inverse.reshape(-1),
+        n_patients=n_patients,
+        n_unique=n_unique,
+        dedup_ratio=n_patients / n_unique if n_unique > 0 else np.nan,
+    )
+    return plan
+
+
+def main_calculations_deduplicated(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        horizon_mode: str = 'fixed'
+        ):
+    """
+    Run main_calculations_batch() once per unique patient profile.
+
+    Ages are used exactly as given, so round them first (e.g. to
+    whole years) to get more repeated profiles.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    mrs          - np.array. Patients' mRS scores.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results, or several parameter sets
+                   from stack_fixed_params().
+    horizon_mode - str. "fixed" or "survival". See
+                   main_calculations_batch().
+
+    Returns:
+    --------
+    results - dict. The same as main_calculations_batch() for all of
+              the patients in their original order.
+    report  - dict. Keys n_patients, n_unique and dedup_ratio from
+              plan_unique_profiles().
+    """
+    plan = plan_unique_profiles(age, sex, mrs)
+    unique_results = main_calculations_batch(
+        plan['age'], plan['sex'], plan['mrs'], fixed_params,
+        horizon_mode=horizon_mode
+        )
+
+    # Copy the results back out to the patients. Any parameter
+    # set axes come before the patient axis:
+    n_set_axes = np.ndim(fixed_params['lg_coeffs']) - 1
+    results = dict()
+    for key, values in unique_results.items():
+        if key == 'years':
+            results[key] = values
+        else:
+            axis = 0 if key in patient_keys else n_set_axes
+            results[key] = np.take(values, plan['inverse'], axis=axis)
+
+    report = dict(
+        (key, plan[key]) for key in ['n_patients', 'n_unique', 'dedup_ratio'])
+    return results, report
@@ -0,0 +1,346 @@
+"""
+Expected outcomes for a population described by age distributions.
+
+A population can be described by a distribution of age for each sex
+and mRS score instead of a list of patients. The expected value of
+an outcome is then the integral of the outcome over the age density.
+Here the integral is found with Gauss-Legendre quadrature, so only a
+few ages need to be calculated for each sex and mRS score:
++ a histogram of ages uses the same number of nodes in every bin,
+  because the density is constant within each bin.
++ a normal distribution or any other density function uses nodes
+  spread over the range of ages, weighted by the density there.
+The outcomes jump at the ages in age_breakpoints, e.g. the chance of
+living in a care home changes above age 70. A polynomial can't
+follow a jump, so the ages are split into panels at the breakpoints
+and each panel gets its own nodes.
+
+The accuracy is estimated by doubling the number of nodes and
+comparing the two answers. The nodes keep being doubled until the
+estimated errors are within the tolerance or the most nodes allowed
+is reached.
+"""
+# Imports:
+import numpy as np
+
+from .batch_calculations import main_calculations_batch
+from .expected_outcomes import expected_keys
+
+
+# Outcomes with one value per patient that are averaged over ages:
+population_keys = [
+    'survival_median_years',
+    'survival_mean_years',
+] + expected_keys
+
+# Ways to describe an age distribution:
+density_kinds = ['histogram', 'normal', 'pdf']
+
+# Ages where the outcomes jump. The care home percentages in
+# gather_patient_params() change for patients over 70:
+age_breakpoints = [70.0]
+
+# Youngest and oldest ages the models are meant for. A normal
+# distribution without its own limits is cut off at these ages:
+valid_age_limits = (18.0, 100.0)
+
+
+# #####################################################################
+# ######################## Overall function ###########################
+# #####################################################################
+
+def calculate_population_outcomes(
+        age_density: dict,
+        fixed_params: dict,
+        sexes: list = [0, 1],
+        n_nodes: int = 8,
+        tolerance: float = 1e-4,
+        max_nodes: int = 256
+        ):
+    """
+    Integrate the outcomes over age for each sex and mRS score.
+
+    Inputs:
+    -------
+    age_density  - dict. Either one age distribution for every sex
+                   and mRS score, or a dict with one distribution for
+                   each key (sex, mRS). Each distribution is a dict:
+                   + {"kind": "histogram", "edges": ..., "weights": ...}
+                     for a histogram with these bin edges in years
+                     and these numbers of patients in each bin.
+                   + {"kind": "normal", "mean": ..., "sd": ...} with
+                     optional "limits" (youngest, oldest). Without
+                     limits, the range is six standard deviations
+                     either side of the mean, cut to
+                     valid_age_limits.
+                   + {"kind": "pdf", "pdf": function, "limits": ...}
+                     for any density function of age.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    sexes        - list. Sexes to calculate, 0 for female and 1 for
+                   male.
+    n_nodes      - int. Starting number of nodes per histogram bin
+                   or per panel between age breakpoints.
+    tolerance    - float. Largest estimated relative error allowed
+                   in the outcomes in population_keys. Survival by
+                   year uses it as an absolute error.
+    max_nodes    - int. Most nodes per bin or panel.
+
+    Returns:
+    --------
+    population - dict. Keys:
+        sexes            - np.array. The sexes, one per row.
+        years            - np.array. Years of the survival curves.
+        survival_by_year - np.array. Shape (sexes, 6, years).
+                           Expected survival in each year.
+        errors           - dict. The estimated absolute error of each
+                           outcome, with the same shapes.
+        n_nodes          - int. Nodes per bin or panel used for the
+                           final answer.
+        converged        - bool. Whether every estimated error is
+                           within the tolerance.
+              and for each key in population_keys, an np.array of
+              shape (sexes, 6) with one column per mRS from 0 to 5.
+    """
+    sexes = np.atleast_1d(np.asarray(sexes))
+    groups = [(sex, mrs) for sex in sexes for mrs in range(6)]
+    densities = [_find_group_density(age_density, group) for group in groups]
+
+    previous = integrate_outcomes(groups, densities, fixed_params, n_nodes)
+    while True:
+        n_nodes *= 2
+        current = integrate_outcomes(
+            groups, densities, fixed_params, n_nodes)
+        errors = dict(
+            (key, np.abs(current[key] - previous[key]))
+            for key in population_keys + ['survival_by_year']
+        )
+        converged = all(
+            np.all(errors[key] <= tolerance * np.abs(current[key]))
+            for key in population_keys
+        ) and np.all(errors['survival_by_year'] <= tolerance)
+        if converged or n_nodes * 2 > max_nodes:
+            break
+        previous = current
+
+    n_sexes = sexes.size
+    population = dict(
+        (key, current[key].reshape(n_sexes, 6)) for key in population_keys)
+    population['survival_by_year'] = current['survival_by_year'].reshape(
+        n_sexes, 6, -1)
+    population['errors'] = dict(
+        (key, values.reshape(population[key].shape))
+        for key, values in errors.items()
+    )
+    population['sexes'] = sexes
+    population['years'] = current['years']
+    population['n_nodes'] = n_nodes
+    population['converged'] = bool(converged)
+    return population
+
+
+def integrate_outcomes(
+        groups: list,
+        densities: list,
+        fixed_params: dict,
+        n_nodes: int
+        ):
+    """
+    Find the expected outcomes for each group with one set of nodes.
+
+    The nodes for every group are calculated together in one batch.
+
+    Inputs:
+    -------
+    groups       - list. (sex, mRS) for each group.
+    densities    - list. Age distribution for each group.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    n_nodes      - int. Nodes per histogram bin or panel.
+
+    Returns:
+    --------
+    expected - dict. For each key in population_keys, one value per
+               group. Also "survival_by_year" with one row per group
+               and the shared "years".
+    """
+    ages = []
+    weights = []
+    for density in densities:
+        group_ages, group_weights = find_age_nodes(density, n_nodes)
+        ages.append(group_ages)
+        weights.append(group_weights)
+    n_per_group = [group_ages.size for group_ages in ages]
+    starts = np.cumsum([0] + n_per_group[:-1])
+
+    results = main_calculations_batch(
+        np.concatenate(ages),
+        np.repeat([sex for sex, _ in groups], n_per_group),
+        np.repeat([mrs for _, mrs in groups], n_per_group),
+        fixed_params
+        )
+    weights = np.concatenate(weights)
+
+    # Weighted sums over the nodes of each group:
+    expected = dict(
+        (key, np.add.reduceat(weights * results[key], starts))
+        for key in population_keys
+    )
+    expected['survival_by_year'] = np.add.reduceat(
+        weights[:, np.newaxis] * results['survival_by_year'], starts, axis=0)
+    expected['years'] = results['years']
+    return expected
+
+
+# #####################################################################
+# ############################## Nodes ################################
+# #####################################################################
+
+def find_age_nodes(density: dict, n_nodes: int):
+    """
+    Find quadrature ages and weights for one age distribution.
+
+    Inputs:
+    -------
+    density - dict. One age distribution. See
+              calculate_population_outcomes().
+    n_nodes - int. Nodes per histogram bin or panel.
+
+    Returns:
+    --------
+    ages    - np.array. Ages to calculate the outcomes at.
+    weights - np.array. Weight of each age. These add up to 1.
+    """
+    kind = density.get('kind')
+    if kind == 'histogram':
+        return find_histogram_nodes(
+            density['edges'], density['weights'], n_nodes)
+    elif kind == 'normal':
+        mean = density['mean']
+        sd = density['sd']
+        limits = density.get('limits', (
+            max(mean - 6.0 * sd, valid_age_limits[0]),
+            min(mean + 6.0 * sd, valid_age_limits[1])
+            ))
+
+        def pdf(age):
+            return np.exp(-0.5 * ((age - mean) / sd)**2.0)
+        return find_pdf_nodes(pdf, limits, n_nodes)
+    elif kind == 'pdf':
+        return find_pdf_nodes(density['pdf'], density['limits'], n_nodes)
+    raise ValueError(
+        f'The kind of age distribution must be one of {density_kinds}, '
+        f'not "{kind}".')
+
+
+def find_histogram_nodes(
+        edges: np.array,
+        weights: np.array,
+        n_nodes: int,
+        breakpoints: list = age_breakpoints
+        ):
+    """
+    Gauss-Legendre nodes in every bin of an age histogram.
+
+    Bins that contain an age breakpoint are split in two at the
+    breakpoint.
+
+    Inputs:
+    -------
+    edges       - np.array. Bin edges in years, one more than the
+                  bins.
+    weights     - np.array. Number or proportion of patients in each
+                  bin.
+    n_nodes     - int. Nodes per bin.
+    breakpoints - list. Ages where the outcomes jump.
+
+    Returns:
+    --------
+    ages    - np.array. Ages to calculate the outcomes at.
+    weights - np.array. Weight of each age. These add up to 1.
+    """
+    edges = np.asarray(edges, dtype=float)
+    bin_weights = np.asarray(weights, dtype=float)
+    if edges.ndim != 1 or edges.size != bin_weights.size + 1:
+        raise ValueError('A histogram needs one more edge than weights.')
+    if np.any(np.diff(edges) <= 0.0) or np.any(bin_weights < 0.0):
+        raise ValueError(
+            'Histogram edges must increase and weights must not be '
+            'negative.')
+    # Split the bins at the breakpoints. The density is constant
+    # within each bin, so the parts share its weight by width:
+    breakpoints = np.asarray(breakpoints, dtype=float)
+    inside = breakpoints[(breakpoints > edges[0]) & (breakpoints < edges[-1])]
+    split_edges = np.union1d(edges, inside)
+    parent = np.searchsorted(edges, split_edges[:-1], side='right') - 1
+    bin_weights = (
+        bin_weights[parent] * np.diff(split_edges) / np.diff(edges)[parent])
+    edges = split_edges
+
+    x, w = np.polynomial.legendre.leggauss(n_nodes)
+    # Map the nodes from [-1, 1] onto each bin:
+    middle = 0.5 * (edges[1:] + edges[:-1])
+    half_width = 0.5 * np.diff(edges)
+    ages = middle[:, np.newaxis] + half_width[:, np.newaxis] * x
+    # The density is constant within each bin:
+    node_weights = bin_weights[:, np.newaxis] * (0.5 * w)
+    node_weights = node_weights / np.sum(bin_weights)
+    return ages.ravel(), node_weights.ravel()
+
+
+def find_pdf_nodes(
+        pdf,
+        limits: tuple,
+        n_nodes: int,
+        breakpoints: list = age_breakpoints
+        ):
+    """
+    Gauss-Legendre nodes across a range weighted by a density.
+
+    The range is split into panels at the age breakpoints and each
+    panel gets n_nodes nodes. The density doesn't need to be
+    normalised.
+
+    Inputs:
+    -------
+    pdf         - function. Takes an array of ages and returns the
+                  density at each age.
+    limits      - tuple. Youngest and oldest age.
+    n_nodes     - int. Number of nodes per panel.
+    breakpoints - list. Ages where the outcomes jump.
+
+    Returns:
+    --------
+    ages    - np.array. Ages to calculate the outcomes at.
+    weights - np.array. Weight of each age. These add up to 1.
+    """
+    lower, upper = limits
+    if not upper > lower:
+        raise ValueError(f'The age limits {limits} must increase.')
+    breakpoints = np.asarray(breakpoints, dtype=float)
+    inside = breakpoints[(breakpoints > lower) & (breakpoints < upper)]
+    edges = np.concatenate(([lower], np.sort(inside), [upper]))
+
+    x, w = np.polynomial.legendre.leggauss(n_nodes)
+    # Map the nodes from [-1, 1] onto each panel:
+    middle = 0.5 * (edges[1:] + edges[:-1])
+    half_width = 0.5 * np.diff(edges)
+    ages = (middle[:, np.newaxis] + half_width[:, np.newaxis] * x).ravel()
+    node_weights = (half_width[:, np.newaxis] * w).ravel()
+    weights = node_weights * np.asarray(pdf(ages), dtype=float)
+    total = np.sum(weights)
+    if not total > 0.0:
+        raise ValueError('The age density is zero at every node.')
+    return ages, weights / total
+
+
+def _find_group_density(age_density, group):
+    """Pick out the age distribution for one (sex, mRS) group."""
+    if 'kind' in age_density:
+        return age_density
+    sex, mrs = group
+    try:
+        return age_density[(sex, mrs)]
+    except KeyError:
+        raise KeyError(
+            f'No age distribution for sex {sex} and mRS {mrs}.') from None
@@ -0,0 +1,120 @@
+"""
+Recost resource use under different unit prices.
+
+The discounted costs are unit prices multiplied by discounted
+quantities of each resource:
++ A&E admissions              x cost_ae_gbp
++ non-elective bed days       x cost_non_elective_bed_day_gbp
++ elective bed days           x cost_elective_bed_day_gbp
++ days in residential care    x cost_residential_day_gbp
+
+The quantities don't depend on the prices, so they can be
+calculated once and then costed under any number of tariff sets
+with one matrix multiplication.
+"""
+# Imports:
+import numpy as np
+
+
+# Resources in the order of the columns of the quantity and
+# tariff matrices:
+resource_labels = ['ae', 'nel', 'el', 'care_years']
+# Names of the matching unit prices in the fixed parameters:
+tariff_keys = [
+    'cost_ae_gbp',
+    'cost_non_elective_bed_day_gbp',
+    'cost_elective_bed_day_gbp',
+    'cost_residential_day_gbp',
+]
+
+
+def find_discounted_resource_quantities(results: dict):
+    """
+    Gather the discounted quantities of each resource.
+
+    Inputs:
+    -------
+    results - dict. Must contain the "_discounted_by_year" arrays for
+              each resource, e.g. from main_calculations_batch().
+
+    Returns:
+    --------
+    quantities - np.array. One row per patient and one column per
+                 resource in resource_labels. Residential care is in
+                 days to match its unit price.
+    """
+    quantities = np.stack([
+        np.sum(results['ae_discounted_by_year'], axis=-1),
+        np.sum(results['nel_discounted_by_year'], axis=-1),
+        np.sum(results['el_discounted_by_year'], axis=-1),
+        365 * np.sum(results['care_years_discounted_by_year'], axis=-1),
+        ], axis=-1)
+    return quantities
+
+
+def make_tariff_matrix(fixed_params: dict or list):
+    """
+    Collect unit prices into a tariff matrix.
+
+    Inputs:
+    -------
+    fixed_params - dict or list of dicts. Each dict contains the
+                   unit prices named in tariff_keys.
+
+    Returns:
+    --------
+    tariffs - np.array. One row per tariff set and one column per
+              resource in resource_labels.
+    """
+    if isinstance(fixed_params, dict):
+        fixed_params = [fixed_params]
+    tariffs = np.array([
+        [params[key] for key in tariff_keys] for params in fixed_params
+    ], dtype=float)
+    return tariffs
+
+
+def recost(
+        quantities: np.array,
+        tariffs: np.array,
+        qalys: np.array = None,
+        wtp_qaly_gpb: float = None
+        ):
+    """
+    Cost the resource quantities under every tariff set.
+
+    Inputs:
+    -------
+    quantities   - np.array. Shape (patients, 4). Output of
+                   find_discounted_resource_quantities().
+    tariffs      - np.array. Shape (tariffs, 4), or (4,) for a
+                   single tariff set. Unit prices in the order of
+                   resource_labels.
+    qalys        - np.array or None. QALYs for each patient. Needed
+                   for net benefit.
+    wtp_qaly_gpb - float or None. Willingness to pay per QALY.
+                   Needed for net benefit.
+
+    Returns:
+    --------
+    recosted - dict. Keys:
+        cost_by_resource      - np.array. Shape
+                                (patients, tariffs, 4).
+        total_discounted_cost - np.array. Shape (patients, tariffs).
+        net_benefit           - np.array. Shape (patients, tariffs).
+                                Only if qalys and wtp_qaly_gpb are
+                                given.
+    """
+    quantities = np.asarray(quantities, dtype=float)
+    tariffs = np.atleast_2d(np.asarray(tariffs, dtype=float))
+
+    recosted = dict(
+        cost_by_resource=quantities[..., np.newaxis, :] * tariffs,
+        total_discounted_cost=quantities @ tariffs.T,
+    )
+    if qalys is not None and wtp_qaly_gpb is not None:
+        recosted['net_benefit'] = (
+            wtp_qaly_gpb * np.asarray(qalys, dtype=float)[..., np.newaxis] -
+            recosted['total_discounted_cost']
+        )
+    return recosted
@@ -0,0 +1,291 @@
+"""
+Keep calculated outcomes in a file so that they can be reused.
+
+The ResultsCache class stores the headline outcomes and the survival
+curve for each (age, sex, mRS, model) in an SQLite database. Each
+entry is also keyed on a hash of the fixed parameters used to
+calculate it, so results are only returned for exactly the same
+parameters. Results for other parameters are kept, so switching
+back to an earlier parameter set finds its results again, and are
+removed like any other entry once they are the least recently used.
+
+The values are stored as compact binary blobs:
++ the outcomes in cached_keys as one float64 array.
++ the survival curve as a float64 array with the trailing years of
+  zero survival removed.
+
+The cache holds at most max_entries results. When it is full, the
+entries that were least recently used are removed first.
+"""
+# Imports:
+import sqlite3
+import time
+
+import numpy as np
+
+from .batch_calculations import main_calculations_batch
+from .jit_kernels import outcome_keys
+from .parameter_sets import hash_fixed_params
+
+
+# Outcomes with one value per patient that are stored:
+cached_keys = outcome_keys + ['survival_mean_years']
+
+
+class ResultsCache:
+    """
+    SQLite store of outcomes for (age, sex, mRS, model) profiles.
+
+    Example:
+    --------
+    with ResultsCache('results.sqlite') as cache:
+        results = calculate_with_cache(
+            age, sex, mrs, fixed_params, 'mRS', cache)
+    """
+    def __init__(
+            self,
+            path: str,
+            max_entries: int = 1000000
+            ):
+        """
+        Open the database and create its tables if needed.
+
+        Inputs:
+        -------
+        path        - str. Path to the database file, or ":memory:"
+                      for a cache that only lasts for this session.
+        max_entries - int. Largest number of results to keep.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'age REAL, sex INTEGER, mrs INTEGER, model TEXT, '
+                'params_hash TEXT, outcomes BLOB, survival BLOB, '
+                'last_used REAL, '
+                'PRIMARY KEY (age, sex, mrs, model, params_hash))'
+                )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS results_last_used '
+                'ON results (last_used)'
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def clear(self):
+        """Delete every stored result."""
+        with self.connection:
+            self.connection.execute('DELETE FROM results')
+
+    def get_many(
+            self,
+            age: np.array,
+            sex: np.array,
+            mrs: np.array,
+            model: str,
+            fixed_params: dict
+            ):
+        """
+        Look up the stored results for a batch of patients.
+
+        Inputs:
+        -------
+        age          - np.array. Patients' ages in years.
+        sex          - np.array. Patients' sexes.
+        mrs          - np.array. Patients' mRS scores.
+        model        - str. Model label, e.g. "mRS".
+        fixed_params - dict. The parameters the results must have
+                       been calculated with.
+
+        Returns:
+        --------
+        found   - np.array. True for patients with stored results.
+        results - dict. One value per patient for each key in
+                  cached_keys, and "survival_by_year" with one
+                  column per year from 0 to
+                  time_max_post_discharge_year. Patients without
+                  stored results have Not A Number.
+        """
+        age, sex, mrs = _check_patients(age, sex, mrs)
+        n_years = fixed_params['time_max_post_discharge_year'] + 1
+        params_hash = hash_fixed_params(fixed_params)
+
+        found = np.zeros(age.shape, dtype=bool)
+        outcomes = np.full((age.size, len(cached_keys)), np.nan)
+        survival = np.full((age.size, n_years), np.nan)
+
+        # Match all of the keys at once with a temporary table:
+        with self.connection:
+            self.connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS wanted ('
+                'row INTEGER, age REAL, sex INTEGER, mrs INTEGER)'
+                )
+            self.connection.execute('DELETE FROM wanted')
+            self.connection.executemany(
+                'INSERT INTO wanted VALUES (?, ?, ?, ?)',
+                zip(range(age.size), age.tolist(), sex.tolist(),
+                    mrs.tolist())
+                )
+            # Each wanted row is found with the primary key index:
+            rows = self.connection.execute(
+                'SELECT wanted.row, results.rowid, results.outcomes, '
+                'results.survival '
+                'FROM wanted JOIN results '
+                'ON results.age = wanted.age '
+                'AND results.sex = wanted.sex '
+                'AND results.mrs = wanted.mrs '
+                'AND results.model = ? '
+                'AND results.params_hash = ?',
+                (model, params_hash)
+                ).fetchall()
+            # Mark only the entries that were found as recently used:
+            now = time.time()
+            self.connection.executemany(
+                'UPDATE results SET last_used = ? WHERE rowid = ?',
+                ((now, rowid) for rowid in set(row[1] for row in rows))
+                )
+            self.connection.execute('DELETE FROM wanted')
+
+        for row, _, outcome_blob, survival_blob in rows:
+            found[row] = True
+            outcomes[row] = np.frombuffer(outcome_blob, dtype=np.float64)
+            curve = np.frombuffer(survival_blob, dtype=np.float64)
+            curve = curve[:n_years]
+            survival[row, :curve.size] = curve
+            # The removed years all had zero survival:
+            survival[row, curve.size:] = 0.0
+
+        results = dict(
+            (key, outcomes[:, i]) for i, key in enumerate(cached_keys))
+        results['survival_by_year'] = survival
+        return found, results
+
+    def put_many(
+            self,
+            results: dict,
+            model: str,
+            fixed_params: dict
+            ):
+        """
+        Store the results for a batch of patients.
+
+        Inputs:
+        -------
+        results      - dict. Output of main_calculations_batch().
+        model        - str. Model label, e.g. "mRS".
+        fixed_params - dict. The parameters used for the results.
+        """
+        params_hash = hash_fixed_params(fixed_params)
+        age, sex, mrs = _check_patients(
+            results['age'], results['sex'], results['mrs'])
+        outcomes = np.stack(
+            [np.asarray(results[key], dtype=np.float64)
+             for key in cached_keys], axis=-1)
+        survival = np.asarray(results['survival_by_year'], dtype=np.float64)
+
+        # Keep up to the last year with non-zero survival:
+        nonzero = survival != 0.0
+        lengths = np.where(
+            np.any(nonzero, axis=-1),
+            survival.shape[-1] - np.argmax(nonzero[:, ::-1], axis=-1),
+            0
+            )
+        now = time.time()
+        rows = (
+            (age[i], int(sex[i]), int(mrs[i]), model, params_hash,
+             outcomes[i].tobytes(), survival[i, :lengths[i]].tobytes(),
+             now)
+            for i in range(age.size)
+        )
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO results '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+                )
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results over max_entries."""
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            with self.connection:
+                self.connection.execute(
+                    'DELETE FROM results WHERE rowid IN ('
+                    'SELECT rowid FROM results '
+                    'ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                    )
+
+
+def calculate_with_cache(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        model: str,
+        cache: ResultsCache
+        ):
+    """
+    Calculate outcomes, reusing any results that are already stored.
+
+    Only the patients without stored results are calculated, and
+    their results are then added to the cache.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes, 0 for female and
+                   1 for male.
+    mrs          - np.array. Patients' mRS scores.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    model        - str. Model label, e.g. "mRS".
+    cache        - ResultsCache. Where the results are stored.
+
+    Returns:
+    --------
+    results - dict. Output of ResultsCache.get_many() with every
+              patient filled in, plus "years".
+    """
+    age, sex, mrs = _check_patients(age, sex, mrs)
+    found, results = cache.get_many(age, sex, mrs, model, fixed_params)
+
+    missing = np.flatnonzero(~found)
+    if missing.size > 0:
+        new_results = main_calculations_batch(
+            age[missing], sex[missing], mrs[missing], fixed_params)
+        cache.put_many(new_results, model, fixed_params)
+        for key in cached_keys:
+            results[key][missing] = new_results[key]
+        survival = new_results['survival_by_year']
+        results['survival_by_year'][missing] = 0.0
+        results['survival_by_year'][missing, :survival.shape[-1]] = survival
+
+    results['years'] = np.arange(
+        fixed_params['time_max_post_discharge_year'] + 1)
+    return results
+
+
+def _check_patients(age, sex, mrs):
+    """Make the patient details into 1D arrays of matching length."""
+    age, sex, mrs = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex, dtype=int)),
+        np.atleast_1d(np.asarray(mrs, dtype=int))
+        )
+    return age.ravel(), sex.ravel(), mrs.ravel()
@@ -0,0 +1,271 @@
+"""
+Synthetic cohorts of patients for benchmarks and load tests.
+
+Each patient is drawn as follows:
++ mRS score from the numbers of patients discharged with each mRS
+  score in make_fixed_params_shared(), i.e. n_patients_care_home
+  plus n_patients_not_care_home.
++ age from a distribution around lg_mean_ages for that mRS score,
+  kept within the given age limits.
++ sex from the given proportion of male patients.
+
+Patients are drawn in chunks. Each chunk has its own random number
+stream spawned from one seed, so the same seed and chunk size always
+give the same cohort, and a cohort of any size can be written to
+files one chunk at a time without holding it all in memory.
+"""
+# Imports:
+import os
+
+import numpy as np
+
+from .fixed_params import get_fixed_params, make_fixed_params_shared
+
+
+# Distributions of age around the mean age for each mRS score:
+age_distributions = ['normal', 'uniform', 'fixed']
+
+
+def find_mrs_probabilities():
+    """
+    Find the proportion of discharged patients with each mRS score.
+
+    Returns:
+    --------
+    mrs_probs - np.array. Six proportions for mRS 0 to 5 that add
+                up to 1.
+    """
+    shared = make_fixed_params_shared()
+    n_patients = (
+        shared['n_patients_care_home'] + shared['n_patients_not_care_home'])
+    return n_patients / np.sum(n_patients)
+
+
+def generate_cohort(
+        n_patients: int,
+        seed: int = None,
+        chunk_size: int = 1000000,
+        **options
+        ):
+    """
+    Draw a synthetic cohort as arrays.
+
+    Inputs:
+    -------
+    n_patients - int. Number of patients.
+    seed       - int or None. Seed for the random number streams.
+    chunk_size - int. Number of patients drawn with each random
+                 number stream. Changing this changes the cohort.
+    options    - Any other options for draw_patients().
+
+    Returns:
+    --------
+    cohort - dict. np.arrays "age", "sex" and "mrs" with one value
+             per patient.
+    """
+    chunks = list(iter_cohort_chunks(
+        n_patients, seed=seed, chunk_size=chunk_size, **options))
+    if len(chunks) == 0:
+        return dict(
+            age=np.array([], dtype=float),
+            sex=np.array([], dtype=int),
+            mrs=np.array([], dtype=int),
+        )
+    cohort = dict(
+        (key, np.concatenate([chunk[key] for chunk in chunks]))
+        for key in chunks[0].keys()
+    )
+    return cohort
+
+
+def iter_cohort_chunks(
+        n_patients: int,
+        seed: int = None,
+        chunk_size: int = 1000000,
+        **options
+        ):
+    """
+    Draw a synthetic cohort one chunk at a time.
+
+    The inputs are the same as for generate_cohort().
+
+    Yields:
+    -------
+    cohort - dict. Output of draw_patients() for the next chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be at least 1, not {chunk_size}.')
+    starts = range(0, n_patients, chunk_size)
+    # One independent random number stream per chunk:
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(starts))
+    for start, seed_sequence in zip(starts, seed_sequences):
+        rng = np.random.default_rng(seed_sequence)
+        yield draw_patients(
+            min(chunk_size, n_patients - start), rng, **options)
+
+
+def draw_patients(
+        n_patients: int,
+        rng: np.random.Generator,
+        model_type: str = 'mRS',
+        male_ratio: float = 0.5,
+        age_distribution: str = 'normal',
+        age_sd: float = 12.0,
+        age_limits: tuple = (18.0, 100.0),
+        whole_years: bool = False,
+        mrs_probs: np.array = None
+        ):
+    """
+    Draw mRS scores, ages and sexes for some patients.
+
+    Inputs:
+    -------
+    n_patients       - int. Number of patients.
+    rng              - np.random.Generator. Random number stream.
+    model_type       - str. "mRS" or "Dichotomous". The mean ages
+                       are the lg_mean_ages of this model.
+    male_ratio       - float. Proportion of patients who are male.
+    age_distribution - str. "normal" for a normal distribution with
+                       standard deviation age_sd, "uniform" for a
+                       uniform distribution with standard deviation
+                       age_sd, or "fixed" for everyone to be the
+                       mean age.
+    age_sd           - float. Standard deviation of age in years.
+    age_limits       - tuple. Youngest and oldest age. Ages outside
+                       the limits are drawn again.
+    whole_years      - bool. Whether to round ages down to whole
+                       years, e.g. to match registry data.
+    mrs_probs        - np.array or None. Proportion of patients with
+                       each mRS score. If None, use
+                       find_mrs_probabilities().
+
+    Returns:
+    --------
+    cohort - dict. np.arrays "age", "sex" and "mrs".
+    """
+    if age_distribution not in age_distributions:
+        raise ValueError(
+            f'age_distribution must be one of {age_distributions}, '
+            f'not "{age_distribution}".')
+    if not 0.0 <= male_ratio <= 1.0:
+        raise ValueError(
+            f'male_ratio must be between 0 and 1, not {male_ratio}.')
+    if mrs_probs is None:
+        mrs_probs = find_mrs_probabilities()
+    mrs_probs = np.asarray(mrs_probs, dtype=float)
+    if mrs_probs.shape != (6,) or np.any(mrs_probs < 0.0):
+        raise ValueError('mrs_probs must be six values that are not negative.')
+
+    # Look up the mRS score for each uniform random number:
+    cumulative_probs = np.cumsum(mrs_probs / np.sum(mrs_probs))
+    mrs = np.searchsorted(cumulative_probs, rng.random(n_patients),
+                          side='right')
+    # Guard against rounding in the last cumulative probability:
+    mrs = np.minimum(mrs, 5)
+
+    mean_age = get_fixed_params(model_type)['lg_mean_ages'][mrs]
+    age = draw_ages(
+        mean_age, rng, age_distribution, age_sd, age_limits)
+    if whole_years:
+        age = np.floor(age)
+
+    sex = (rng.random(n_patients) < male_ratio).astype(int)
+    cohort = dict(age=age, sex=sex, mrs=mrs)
+    return cohort
+
+
+def draw_ages(
+        mean_age: np.array,
+        rng: np.random.Generator,
+        age_distribution: str,
+        age_sd: float,
+        age_limits: tuple,
+        max_redraws: int = 100
+        ):
+    """
+    Draw one age for each patient around their mean age.
+
+    Inputs:
+    -------
+    mean_age         - np.array. Mean age for each patient.
+    rng              - np.random.Generator. Random number stream.
+    age_distribution - str. See draw_patients().
+    age_sd           - float. Standard deviation of age in years.
+    age_limits       - tuple. Youngest and oldest age.
+    max_redraws      - int. Most times to draw again the ages that
+                       are outside the limits. Any left after that
+                       are moved to the nearest limit.
+
+    Returns:
+    --------
+    age - np.array. One age per patient.
+    """
+    age_min, age_max = age_limits
+
+    def draw(mean):
+        if age_distribution == 'normal':
+            return mean + age_sd * rng.standard_normal(mean.size)
+        elif age_distribution == 'uniform':
+            # Half-width that gives this standard deviation:
+            half_width = age_sd * np.sqrt(3.0)
+            return mean + rng.uniform(-half_width, half_width, mean.size)
+        else:
+            return mean.astype(float)
+
+    age = draw(mean_age)
+    for _ in range(max_redraws):
+        outside = np.flatnonzero((age < age_min) | (age > age_max))
+        if outside.size == 0:
+            break
+        age[outside] = draw(mean_age[outside])
+    return np.clip(age, age_min, age_max)
+
+
+def write_cohort_files(
+        directory: str,
+        n_patients: int,
+        seed: int = None,
+        chunk_size: int = 1000000,
+        file_format: str = 'npz',
+        **options
+        ):
+    """
+    Draw a synthetic cohort and write one file per chunk.
+
+    Inputs:
+    -------
+    directory   - str. Folder for the files. It is made if needed.
+    n_patients  - int. Number of patients.
+    seed        - int or None. Seed for the random number streams.
+    chunk_size  - int. Number of patients in each file.
+    file_format - str. "npz" for NumPy files with arrays "age", "sex"
+                  and "mrs", or "csv" for text files with the
+                  columns age, sex, mrs. "npz" is much quicker.
+    options     - Any other options for draw_patients().
+
+    Returns:
+    --------
+    paths - list. Path to each file in the order of the patients.
+    """
+    if file_format not in ['npz', 'csv']:
+        raise ValueError(
+            f'file_format must be "npz" or "csv", not "{file_format}".')
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    chunks = iter_cohort_chunks(
+        n_patients, seed=seed, chunk_size=chunk_size, **options)
+    for i, cohort in enumerate(chunks):
+        path = os.path.join(directory, f'cohort_{i:05d}.{file_format}')
+        if file_format == 'npz':
+            np.savez(path, **cohort)
+        else:
+            np.savetxt(
+                path,
+                np.column_stack((cohort['age'], cohort['sex'], cohort['mrs'])),
+                fmt=['%.6g', '%d', '%d'],
+                delimiter=',',
+                header='age,sex,mrs',
+                comments=''
+                )
+        paths.append(path)
+    return paths
@@ -0,0 +1,350 @@
+"""
+Threshold analysis for changes in mRS score.
+
+For a patient whose mRS score changes from one value to another,
+e.g. from mRS 4 without treatment to mRS 2 with treatment, the
+incremental net benefit is
+
+    net_benefit(mRS after) - net_benefit(mRS before).
+
+The threshold of a parameter is the value that makes this zero,
+e.g. the willingness to pay at which moving from mRS 4 to mRS 2
+stops being worthwhile.
+
+Net benefit is linear in the willingness to pay and in each unit
+cost, so those thresholds are calculated directly. The thresholds
+for any other parameter, e.g. a discount rate, a utility or a model
+coefficient, are found by bisection for every patient profile and
+every pair of mRS scores at the same time.
+"""
+# Imports:
+import numpy as np
+
+from . import recosting
+from .batch_calculations import (
+    main_calculations_batch, calculate_outcomes_batch, gather_patient_params)
+
+
+# Parameters that net benefit is linear in:
+linear_parameters = ['wtp_qaly_gpb'] + recosting.tariff_keys
+
+# Which gathered patient parameter each entry of a fixed parameter
+# table becomes. A tuple (key, mRS) only applies to patients with
+# that mRS score.
+coefficient_targets = dict(
+    lg_coeffs=(
+        ['lg_constant', 'lg_age', 'lg_male'] +
+        [('lg_mrs', mrs) for mrs in range(6)]),
+    lg_mean_ages=[('lg_mean_age', mrs) for mrs in range(6)],
+    gz_coeffs=(
+        ['gz_constant', 'gz_age', 'gz_age2', 'gz_male'] +
+        [('gz_mrs_age', mrs) for mrs in range(6)] +
+        [('gz_mrs', mrs) for mrs in range(6)]),
+    utility_list=[('utility', mrs) for mrs in range(6)],
+    ae_coeffs=['ae_constant', 'ae_age', 'ae_sex', 'ae_gamma'],
+    ae_mRS=[('ae_mrs', mrs) for mrs in range(6)],
+    nel_coeffs=['nel_constant', 'nel_age', 'nel_sex', 'nel_gamma'],
+    nel_mRS=[('nel_mrs', mrs) for mrs in range(6)],
+    el_coeffs=['el_constant', 'el_age', 'el_sex', 'el_gamma'],
+    el_mRS=[('el_mrs', mrs) for mrs in range(6)],
+)
+
+
+def find_thresholds(
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict,
+        parameter: str or tuple,
+        lower: float = None,
+        upper: float = None,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        backend: str = 'auto'
+        ):
+    """
+    Find the break-even value of a parameter for every mRS change.
+
+    Inputs:
+    -------
+    age            - np.array. Ages of the patient profiles in years.
+    sex            - np.array. Sexes of the patient profiles.
+    fixed_params   - dict. Contains fixed parameters independent
+                     of the model results.
+    parameter      - str or tuple. Name of a single value in
+                     fixed_params, e.g. "wtp_qaly_gpb" or
+                     "discount_factor_QALYs_perc", or a tuple of
+                     (name, index) for one entry of a table in
+                     coefficient_targets, e.g. ("utility_list", 3).
+    lower          - float or None. Lowest value to search. Not
+                     needed for the parameters in linear_parameters.
+    upper          - float or None. Highest value to search.
+    tolerance      - float. Bisection stops once the threshold is
+                     known to within this amount.
+    max_iterations - int. Most bisection steps to take.
+    backend        - str. "numba", "numpy" or "auto". See
+                     calculate_outcomes_batch().
+
+    Returns:
+    --------
+    thresholds - np.array. Shape (profiles, 6, 6). The value at
+                 [profile, mRS before, mRS after] is the parameter
+                 value where the change from "mRS before" to "mRS
+                 after" has zero incremental net benefit. Not A
+                 Number on the diagonal and where there is no
+                 threshold (within the search range).
+    """
+    if parameter in linear_parameters:
+        return find_linear_thresholds(age, sex, fixed_params, parameter)
+    if lower is None or upper is None:
+        raise ValueError(
+            f'Give the lower and upper search limits for {parameter}.')
+    return find_thresholds_bisection(
+        age, sex, fixed_params, parameter, lower, upper,
+        tolerance=tolerance,
+        max_iterations=max_iterations,
+        backend=backend
+        )
+
+
+def find_linear_thresholds(
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict,
+        parameter: str
+        ):
+    """
+    Calculate thresholds for willingness to pay or a unit cost.
+
+    Incremental net benefit is
+        wtp * dQALYs - sum(unit cost * d(discounted quantity))
+    so each threshold is one division.
+
+    Inputs:
+    -------
+    age          - np.array. Ages of the patient profiles in years.
+    sex          - np.array. Sexes of the patient profiles.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    parameter    - str. One of linear_parameters.
+
+    Returns:
+    --------
+    thresholds - np.array. Shape (profiles, 6, 6). See
+                 find_thresholds().
+    """
+    age, sex = _check_profiles(age, sex)
+    n_profiles = age.size
+    results = main_calculations_batch(
+        np.repeat(age, 6),
+        np.repeat(sex, 6),
+        np.tile(np.arange(6), n_profiles),
+        fixed_params
+        )
+    qalys = results['qalys_total'].reshape(n_profiles, 6)
+    quantities = results['discounted_resource_quantities'].reshape(
+        n_profiles, 6, -1)
+
+    # Changes from [profile, mRS before] to [profile, mRS after]:
+    incremental_qalys = qalys[:, np.newaxis, :] - qalys[:, :, np.newaxis]
+    incremental_quantities = (
+        quantities[:, np.newaxis, :, :] - quantities[:, :, np.newaxis, :])
+    tariffs = recosting.make_tariff_matrix(fixed_params)[0]
+    incremental_cost = incremental_quantities @ tariffs
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if parameter == 'wtp_qaly_gpb':
+            numerator = incremental_cost
+            denominator = incremental_qalys
+        else:
+            i = recosting.tariff_keys.index(parameter)
+            other_cost = (
+                incremental_cost - incremental_quantities[..., i] * tariffs[i])
+            numerator = (
+                fixed_params['wtp_qaly_gpb'] * incremental_qalys - other_cost)
+            denominator = incremental_quantities[..., i]
+        thresholds = np.where(
+            denominator != 0.0, numerator / denominator, np.nan)
+    thresholds[:, np.arange(6), np.arange(6)] = np.nan
+    return thresholds
+
+
+def find_thresholds_bisection(
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict,
+        parameter: str or tuple,
+        lower: float,
+        upper: float,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        backend: str = 'auto'
+        ):
+    """
+    Find thresholds by bisection for all profiles and mRS changes.
+
+    Every (profile, mRS before, mRS after) cell has its own search
+    range. Each step evaluates the net benefit at the middle of every
+    unfinished range in one batch, with the parameter value changed
+    for each row separately.
+
+    Inputs:
+    -------
+    The same as find_thresholds().
+
+    Returns:
+    --------
+    thresholds - np.array. Shape (profiles, 6, 6). See
+                 find_thresholds().
+    """
+    age, sex = _check_profiles(age, sex)
+    n_profiles = age.size
+    # One cell for each profile and each change of mRS:
+    cell_profile, cell_before, cell_after = [
+        index.ravel() for index in np.meshgrid(
+            np.arange(n_profiles), np.arange(6), np.arange(6),
+            indexing='ij')
+    ]
+    changed = cell_before != cell_after
+    cell_profile = cell_profile[changed]
+    cell_before = cell_before[changed]
+    cell_after = cell_after[changed]
+
+    def find_incremental_net_benefit(cells, values):
+        # Net benefit of the "after" row minus the "before" row:
+        rows_profile = np.concatenate((cell_profile[cells],) * 2)
+        net_benefit = find_net_benefit_with_parameter(
+            age[rows_profile],
+            sex[rows_profile],
+            np.concatenate((cell_before[cells], cell_after[cells])),
+            fixed_params,
+            parameter,
+            np.concatenate((values, values)),
+            backend=backend
+            )
+        n_cells = values.size
+        return net_benefit[n_cells:] - net_benefit[:n_cells]
+
+    n_cells = cell_profile.size
+    all_cells = np.arange(n_cells)
+    low = np.full(n_cells, float(lower))
+    high = np.full(n_cells, float(upper))
+    f_low = find_incremental_net_benefit(all_cells, low)
+    f_high = find_incremental_net_benefit(all_cells, high)
+    # Only search where the sign changes across the range. If the
+    # incremental net benefit is zero at both ends, e.g. for two mRS
+    # scores with the same outcome in the Dichotomous model, there
+    # is no single threshold:
+    bracketed = (
+        np.isfinite(f_low) & np.isfinite(f_high) &
+        (np.sign(f_low) * np.sign(f_high) <= 0.0) &
+        ((f_low != 0.0) | (f_high != 0.0))
+    )
+
+    for _ in range(max_iterations):
+        cells = np.flatnonzero(bracketed & (high - low > tolerance))
+        if cells.size == 0:
+            break
+        middle = 0.5 * (low[cells] + high[cells])
+        f_middle = find_incremental_net_benefit(cells, middle)
+        same_sign = np.sign(f_middle) == np.sign(f_low[cells])
+        low[cells] = np.where(same_sign, middle, low[cells])
+        f_low[cells] = np.where(same_sign, f_middle, f_low[cells])
+        high[cells] = np.where(same_sign, high[cells], middle)
+
+    thresholds = np.full((n_profiles, 6, 6), np.nan)
+    thresholds[cell_profile, cell_before, cell_after] = np.where(
+        bracketed, 0.5 * (low + high), np.nan)
+    return thresholds
+
+
+def find_net_benefit_with_parameter(
+        age: np.array,
+        sex: np.array,
+        mrs: np.array,
+        fixed_params: dict,
+        parameter: str or tuple,
+        values: np.array,
+        backend: str = 'auto'
+        ):
+    """
+    Calculate net benefit with a different parameter value per row.
+
+    Inputs:
+    -------
+    age          - np.array. Patients' ages in years.
+    sex          - np.array. Patients' sexes.
+    mrs          - np.array. Patients' mRS scores from 0 to 5.
+    fixed_params - dict. Contains fixed parameters independent
+                   of the model results.
+    parameter    - str or tuple. See find_thresholds().
+    values       - np.array. Parameter value for each patient.
+    backend      - str. See calculate_outcomes_batch().
+
+    Returns:
+    --------
+    net_benefit - np.array. One value per patient.
+    """
+    patient_params = gather_patient_params(fixed_params, age, mrs)
+    patient_params = set_patient_parameter(
+        patient_params, mrs, parameter, values)
+    results = calculate_outcomes_batch(
+        age, sex, mrs, fixed_params,
+        backend=backend,
+        patient_params=patient_params
+        )
+    return results['net_benefit']
+
+
+def set_patient_parameter(
+        patient_params: dict,
+        mrs: np.array,
+        parameter: str or tuple,
+        values: np.array
+        ):
+    """
+    Replace one parameter in the gathered patient parameters.
+
+    Inputs:
+    -------
+    patient_params - dict. Output of gather_patient_params().
+    mrs            - np.array. Patients' mRS scores.
+    parameter      - str or tuple. See find_thresholds().
+    values         - np.array. New value for each patient.
+
+    Returns:
+    --------
+    patient_params - dict. A copy with the new values.
+    """
+    if isinstance(parameter, tuple):
+        key, index = parameter
+        if key not in coefficient_targets:
+            raise ValueError(
+                f'Choose a table from {list(coefficient_targets)}, '
+                f'not "{key}".')
+        target = coefficient_targets[key][index]
+    elif parameter in patient_params:
+        target = parameter
+    else:
+        raise ValueError(
+            f'"{parameter}" is not a single value in the gathered '
+            'parameters. Use (name, index) for an entry of a table.')
+
+    patient_params = dict(patient_params)
+    values = np.asarray(values, dtype=float)
+    if isinstance(target, tuple):
+        # Only patients with this mRS use this entry:
+        target, target_mrs = target
+        patient_params[target] = np.where(
+            mrs == target_mrs, values, patient_params[target])
+    else:
+        patient_params[target] = values
+    return patient_params
+
+
+def _check_profiles(age, sex):
+    """Make the profile details into 1D arrays of matching length."""
+    age, sex = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex))
+        )
+    return age.ravel(), sex.ravel()
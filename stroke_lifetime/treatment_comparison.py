@@ -0,0 +1,139 @@
+"""
+Compare two mRS outcome distributions, e.g. with and without
+thrombectomy.
+
+Each patient has one probability distribution over mRS 0 to 6 for
+the control arm and one for the intervention arm. The lifetime
+outcomes for each mRS score depend only on age and sex, so they are
+calculated once for each unique (age, sex) and reused for both arms.
+"""
+# Imports:
+import numpy as np
+
+from .expected_outcomes import (
+    calculate_per_mrs_outcomes, find_expected_outcomes, check_mrs_probs,
+    expected_keys)
+
+
+def compare_mrs_distributions(
+        mrs_probs_control: np.array,
+        mrs_probs_intervention: np.array,
+        age: np.array,
+        sex: np.array,
+        fixed_params: dict
+        ):
+    """
+    Calculate incremental outcomes of intervention versus control.
+
+    Inputs:
+    -------
+    mrs_probs_control      - np.array. Shape (patients, 7).
+                             Probability of each mRS score from 0 to 6
+                             for each patient in the control arm.
+    mrs_probs_intervention - np.array. Shape (patients, 7). The same
+                             for the intervention arm.
+    age                    - np.array. Patients' ages in years.
+    sex                    - np.array. Patients' sexes, 0 for female
+                             and 1 for male.
+    fixed_params           - dict. Contains fixed parameters
+                             independent of the model results.
+
+    Returns:
+    --------
+    comparison - dict. Keys:
+        control      - dict. Expected outcomes in the control arm,
+                       one value per patient for each key in
+                       expected_outcomes.expected_keys.
+        intervention - dict. The same for the intervention arm.
+        patient      - dict. One value per patient for each of:
+            incremental_qalys                 - float.
+            incremental_total_discounted_cost - float.
+            incremental_net_benefit           - float. Incremental
+                                                net monetary benefit
+                                                at the willingness-to-
+                                                pay in fixed_params.
+            icer                              - float. Incremental
+                                                cost per QALY gained.
+        cohort       - dict. The same keys summed over patients, with
+                       the cohort ICER from the summed cost and QALYs,
+                       and also the mean of each incremental value.
+    """
+    mrs_probs_control = check_mrs_probs(mrs_probs_control)
+    mrs_probs_intervention = check_mrs_probs(mrs_probs_intervention)
+    age, sex = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(age, dtype=float)),
+        np.atleast_1d(np.asarray(sex, dtype=float))
+        )
+
+    # Calculate the per-mRS outcomes once for each (age, sex)...
+    profiles, inverse = np.unique(
+        np.stack((age, sex), axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    per_mrs_unique = calculate_per_mrs_outcomes(
+        profiles[:, 0], profiles[:, 1], fixed_params)
+    # ... and scatter them back to the patients:
+    per_mrs = dict(
+        (key, per_mrs_unique[key][inverse]) for key in expected_keys)
+
+    control = find_expected_outcomes(per_mrs, mrs_probs_control)
+    intervention = find_expected_outcomes(per_mrs, mrs_probs_intervention)
+
+    incremental_qalys = intervention['qalys_total'] - control['qalys_total']
+    incremental_cost = (
+        intervention['total_discounted_cost'] -
+        control['total_discounted_cost']
+    )
+    incremental_net_benefit = (
+        intervention['net_benefit'] - control['net_benefit'])
+    patient = dict(
+        incremental_qalys=incremental_qalys,
+        incremental_total_discounted_cost=incremental_cost,
+        incremental_net_benefit=incremental_net_benefit,
+        icer=find_icer(incremental_cost, incremental_qalys),
+    )
+
+    cohort = dict(
+        incremental_qalys=np.sum(incremental_qalys),
+        incremental_total_discounted_cost=np.sum(incremental_cost),
+        incremental_net_benefit=np.sum(incremental_net_benefit),
+        icer=float(find_icer(
+            np.sum(incremental_cost), np.sum(incremental_qalys))),
+        mean_incremental_qalys=np.mean(incremental_qalys),
+        mean_incremental_total_discounted_cost=np.mean(incremental_cost),
+        mean_incremental_net_benefit=np.mean(incremental_net_benefit),
+    )
+
+    comparison = dict(
+        control=control,
+        intervention=intervention,
+        patient=patient,
+        cohort=cohort,
+    )
+    return comparison
+
+
+def find_icer(
+        incremental_cost: float or np.array,
+        incremental_qalys: float or np.array
+        ):
+    """
+    Calculate the incremental cost-effectiveness ratio (ICER).
+
+    Inputs:
+    -------
+    incremental_cost  - float or np.array. Change in discounted cost.
+    incremental_qalys - float or np.array. Change in QALYs.
+
+    Returns:
+    --------
+    icer - float or np.array. Cost per QALY gained. Not A Number
+           where there is no change in QALYs.
+    """
+    incremental_qalys = np.asarray(incremental_qalys, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        icer = np.where(
+            incremental_qalys != 0.0,
+            incremental_cost / incremental_qalys,
+            np.nan
+            )
+    return icer
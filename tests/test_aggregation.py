@@ -0,0 +1,103 @@
+"""
+Check that the streamed summaries match one materialised batch.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.aggregation import CohortAggregator, aggregate_cohort
+from stroke_lifetime.batch_calculations import (
+    main_calculations_batch, calculate_outcomes_batch, iter_batch_chunks)
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=600, seed=30):
+    """Random patients including some with mRS 6 (dead)."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(0, 7, n_patients)
+    return age, sex, mrs
+
+
+def find_expected(results, mrs, sex, key):
+    """Count, mean and sample variance of one outcome per group."""
+    count = np.zeros((6, 2))
+    mean = np.full((6, 2), np.nan)
+    variance = np.full((6, 2), np.nan)
+    for i in range(6):
+        for j in range(2):
+            values = results[key][(mrs == i) & (sex == j)]
+            count[i, j] = values.size
+            if values.size > 0:
+                mean[i, j] = np.mean(values)
+            if values.size > 1:
+                variance[i, j] = np.var(values, ddof=1)
+    return count, mean, variance
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_streamed_matches_materialised(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    report = aggregate_cohort(age, sex, mrs, fixed_params, chunk_size=97)
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+
+    for key in report['mean']:
+        count, mean, variance = find_expected(results, mrs, sex, key)
+        np.testing.assert_array_equal(report['count'], count)
+        np.testing.assert_allclose(
+            report['mean'][key], mean, rtol=1e-9, err_msg=key)
+        np.testing.assert_allclose(
+            report['variance'][key], variance, rtol=1e-7, err_msg=key)
+
+        alive = mrs <= 5
+        overall = report['overall'][key]
+        assert overall['count'] == np.sum(alive)
+        np.testing.assert_allclose(
+            overall['mean'], np.mean(results[key][alive]), rtol=1e-9)
+        np.testing.assert_allclose(
+            overall['variance'], np.var(results[key][alive], ddof=1),
+            rtol=1e-7)
+
+    # Histograms count every patient once:
+    histogram = report['histograms']['net_benefit']
+    total = (np.sum(histogram['counts'], axis=-1) +
+             histogram['underflow'] + histogram['overflow'])
+    np.testing.assert_array_equal(total, report['count'])
+
+    # Mean survival curve for each mRS:
+    for i in range(6):
+        expected = np.mean(results['survival_by_year'][mrs == i], axis=0)
+        n_years = expected.size
+        np.testing.assert_allclose(
+            report['survival_by_year_by_mrs'][i, :n_years], expected,
+            rtol=1e-9, atol=1e-12)
+
+
+def test_update_with_outcomes_batch():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    keys = ['qalys_total', 'net_benefit']
+
+    streamed = CohortAggregator(keys=keys)
+    for start in range(0, age.size, 128):
+        chunk = slice(start, start + 128)
+        results = calculate_outcomes_batch(
+            age[chunk], sex[chunk], mrs[chunk], fixed_params,
+            backend='numpy')
+        streamed.update(results, mrs=mrs[chunk], sex=sex[chunk])
+
+    materialised = CohortAggregator(keys=keys)
+    for results in iter_batch_chunks(
+            age, sex, mrs, fixed_params, chunk_size=age.size):
+        materialised.update(results)
+
+    streamed = streamed.report()
+    materialised = materialised.report()
+    np.testing.assert_array_equal(streamed['count'], materialised['count'])
+    for key in keys:
+        np.testing.assert_allclose(
+            streamed['mean'][key], materialised['mean'][key], rtol=1e-9)
+        np.testing.assert_allclose(
+            streamed['variance'][key], materialised['variance'][key],
+            rtol=1e-7)
@@ -0,0 +1,135 @@
+"""
+Check that the asyncio wrapper matches the direct batch calculation.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from stroke_lifetime import async_batch
+from stroke_lifetime.async_batch import AsyncBatchCalculator
+from stroke_lifetime.batch_calculations import calculate_outcomes_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=250, seed=46):
+    """Random patients including some with mRS 6 (dead)."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(0, 7, n_patients)
+    return age, sex, mrs
+
+
+def test_chunked_matches_direct():
+    age, sex, mrs = make_patients()
+
+    async def run():
+        async with AsyncBatchCalculator(
+                max_workers=2, chunk_size=40, max_pending_chunks=2,
+                inline_max_patients=10, backend='numpy') as calculator:
+            chunked = await calculator.compute_batch(
+                age, sex, mrs, parameter_set='mRS')
+            inline = await calculator.compute_batch(
+                age[:5], sex[:5], mrs[:5], parameter_set='mRS')
+        assert calculator.executor is None
+        return chunked, inline
+
+    chunked, inline = asyncio.run(run())
+    expected = calculate_outcomes_batch(
+        age, sex, mrs, get_fixed_params('mRS'), backend='numpy')
+    for key, values in expected.items():
+        # Sums over a chunk can round differently in the last bit:
+        np.testing.assert_allclose(
+            chunked[key], values, rtol=1e-12, err_msg=key)
+        np.testing.assert_allclose(
+            inline[key], values[:5], rtol=1e-12, err_msg=key)
+
+
+def test_close_without_executor():
+    calculator = AsyncBatchCalculator()
+    calculator.close()
+    assert calculator.executor is None
+
+
+def test_max_pending_chunks(monkeypatch):
+    age, sex, mrs = make_patients()
+    lock = threading.Lock()
+    running = [0]
+    most_running = [0]
+
+    def slow_chunk(age, *args):
+        with lock:
+            running[0] += 1
+            most_running[0] = max(most_running[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return dict(n=np.full(age.size, 1.0))
+    monkeypatch.setattr(async_batch, 'calculate_chunk', slow_chunk)
+
+    async def run():
+        async with AsyncBatchCalculator(
+                max_workers=8, chunk_size=20, max_pending_chunks=2,
+                inline_max_patients=0) as calculator:
+            return await calculator.compute_batch(age, sex, mrs)
+
+    results = asyncio.run(run())
+    assert results['n'].size == age.size
+    assert 1 <= most_running[0] <= 2
+
+
+def test_cancel_skips_chunks_not_started(monkeypatch):
+    age, sex, mrs = make_patients()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def blocked_chunk(age, *args):
+        calls.append(age.size)
+        started.set()
+        release.wait(5.0)
+        return dict(n=np.full(age.size, 1.0))
+    monkeypatch.setattr(async_batch, 'calculate_chunk', blocked_chunk)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        calculator = AsyncBatchCalculator(
+            executor=executor, chunk_size=20, max_pending_chunks=4,
+            inline_max_patients=0)
+        task = asyncio.ensure_future(calculator.compute_batch(age, sex, mrs))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, started.wait, 5.0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Let the cancellations reach the executor's futures:
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+    # Only the chunk that had already started was calculated:
+    assert calls == [20]
+
+
+def test_inline_ignores_kernel_lock():
+    age, sex, mrs = make_patients(5)
+
+    async def run():
+        calculator = AsyncBatchCalculator(
+            inline_max_patients=10, backend='numba')
+        return await calculator.compute_batch(age, sex, mrs)
+
+    # A chunk holding the lock in another thread mustn't block the
+    # event loop for small requests:
+    with async_batch._kernel_lock:
+        results = asyncio.run(asyncio.wait_for(run(), 5.0))
+    assert results['qalys_total'].size == 5
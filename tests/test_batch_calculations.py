@@ -0,0 +1,220 @@
+"""
+Check that the batch calculations match main_calculations().
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.batch_calculations import (
+    main_calculations_batch, main_calculations_batch_both_models,
+    stack_fixed_params)
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.main_calculations import main_calculations
+
+
+# Results that are labels rather than numbers:
+label_keys = ['sex_label', 'model_type', 'outcome_type']
+
+
+def make_patients():
+    """Every combination of some ages, both sexes and mRS 0 to 6."""
+    age, sex, mrs = np.meshgrid(
+        [45.0, 62.5, 70.0, 71.0, 88.0], [0, 1], np.arange(7),
+        indexing='ij')
+    return age.ravel(), sex.ravel(), mrs.ravel()
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_batch_matches_main_calculations(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    batch = main_calculations_batch(age, sex, mrs, fixed_params)
+
+    for i in range(age.size):
+        single = main_calculations(
+            age[i], sex[i], 'Male' if sex[i] else 'Female', mrs[i],
+            fixed_params, model_type)
+        assert batch['outcome_type'][i] == single['outcome_type']
+        for key, expected in single.items():
+            if key in label_keys or key == 'years':
+                continue
+            if mrs[i] == 6 and key in ['age', 'sex', 'mrs']:
+                continue
+            expected = np.asarray(expected, dtype=float)
+            actual = np.asarray(batch[key][i], dtype=float)
+            if mrs[i] == 6:
+                # Placeholder rows are Not A Number:
+                assert np.all(np.isnan(actual)), key
+            elif expected.ndim == 0:
+                np.testing.assert_allclose(
+                    actual, expected, rtol=1e-9, atol=1e-12, err_msg=key)
+            else:
+                # Batch rows are padded after the patient's own years:
+                n = expected.size
+                np.testing.assert_allclose(
+                    actual[:n], expected, rtol=1e-9, atol=1e-12,
+                    err_msg=key)
+                padding = actual[n:]
+                assert np.all((padding == 0.0) | np.isnan(padding)), key
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_survival_horizon_matches_main_calculations(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = np.meshgrid(
+        [45.0, 70.0, 71.0, 88.0, 100.0], [0, 1], np.arange(7),
+        indexing='ij')
+    age, sex, mrs = age.ravel(), sex.ravel(), mrs.ravel()
+    batch = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode='survival')
+    time_max = fixed_params['time_max_post_discharge_year']
+    horizon = batch['active_horizon_years']
+
+    # Old patients with mRS 5 stop well before the last year:
+    old_mrs5 = (mrs == 5) & (age >= 88.0)
+    assert np.all(horizon[old_mrs5] < time_max / 2)
+    assert batch['years'][-1] == np.max(horizon)
+
+    for i in range(age.size):
+        if mrs[i] == 6:
+            assert horizon[i] == 0
+            for key in ['qalys_total', 'total_discounted_cost',
+                        'net_benefit', 'survival_by_year']:
+                assert np.all(np.isnan(batch[key][i])), key
+            continue
+        single = main_calculations(
+            age[i], sex[i], 'Male' if sex[i] else 'Female', mrs[i],
+            fixed_params, model_type)
+        for key in ['survival_median_years', 'qalys_total', 'ae_count',
+                    'care_years', 'total_discounted_cost', 'net_benefit']:
+            np.testing.assert_allclose(
+                batch[key][i], single[key], rtol=1e-9, atol=1e-12,
+                err_msg=key)
+        # Survival matches up to the active horizon and is zero after:
+        n = horizon[i] + 1
+        survival = batch['survival_by_year'][i]
+        np.testing.assert_allclose(
+            survival[:n], single['survival_by_year'][:n], rtol=1e-9,
+            atol=1e-12)
+        assert np.all(survival[n:] == 0.0)
+        assert np.all(np.asarray(single['survival_by_year'][n:]) == 0.0)
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+def test_missing_age(horizon_mode):
+    fixed_params = get_fixed_params('mRS')
+    age = np.array([np.nan, 60.0, 85.0])
+    sex = np.array([1, 1, 0])
+    mrs = np.array([2, 2, 4])
+    batch = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+    valid = main_calculations_batch(
+        age[1:], sex[1:], mrs[1:], fixed_params, horizon_mode=horizon_mode)
+
+    np.testing.assert_array_equal(batch['years'], valid['years'])
+    for key in ['qalys_total', 'net_benefit', 'survival_by_year']:
+        assert np.all(np.isnan(batch[key][0])), key
+        np.testing.assert_array_equal(batch[key][1:], valid[key], key)
+    assert batch['active_horizon_years'][0] == 0
+    assert batch['outcome_type'][0] == 'n/a'
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+def test_both_models_match_separate_runs(horizon_mode):
+    age, sex, mrs = make_patients()
+    paired = main_calculations_batch_both_models(
+        age, sex, mrs, horizon_mode=horizon_mode)
+
+    for model_type in ['mRS', 'Dichotomous']:
+        results = paired[model_type]
+        separate = main_calculations_batch(
+            age, sex, mrs, get_fixed_params(model_type),
+            horizon_mode=horizon_mode)
+        assert results['model_type'] == model_type
+        assert sorted(results) == sorted(list(separate) + ['model_type'])
+
+        # The patient results have no parameter set axis:
+        for key in ['age', 'sex', 'mrs', 'outcome_type']:
+            np.testing.assert_array_equal(
+                results[key], separate[key], err_msg=key)
+            assert results[key] is paired['mRS'][key]
+        n_years = separate['years'].size
+        np.testing.assert_array_equal(
+            results['years'][:n_years], separate['years'])
+
+        for key, expected in separate.items():
+            if key in label_keys or key in ['years', 'age', 'sex', 'mrs']:
+                continue
+            assert_rows_match(results[key], expected, key)
+
+
+def assert_rows_match(actual, expected, key):
+    """
+    Compare results from runs that may have a different year grid.
+
+    Stacked runs share their year columns, so they can run past the
+    years of one parameter set. The extra columns only hold padding.
+    """
+    assert actual.shape[:-1] == expected.shape[:-1], key
+    if actual.shape == expected.shape:
+        np.testing.assert_allclose(
+            actual, expected, rtol=1e-12, atol=1e-15, err_msg=key)
+        return
+    n = expected.shape[-1]
+    np.testing.assert_allclose(
+        actual[..., :n], expected, rtol=1e-12, atol=1e-15, err_msg=key)
+    padding = actual[..., n:]
+    assert np.all(
+        (padding == 0.0) | (padding == 1.0) | np.isnan(padding)), key
+
+
+def make_parameter_sets():
+    """Both models and a set with other costs and discounting."""
+    other_params = dict(
+        get_fixed_params('mRS'),
+        cost_ae_gbp=250.0,
+        discount_factor_costs_perc=1.5,
+        wtp_qaly_gpb=30000,
+        )
+    return [get_fixed_params('mRS'), get_fixed_params('Dichotomous'),
+            other_params]
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+def test_stacked_matches_separate_runs(horizon_mode):
+    fixed_params_list = make_parameter_sets()
+    age, sex, mrs = make_patients()
+    stacked = main_calculations_batch(
+        age, sex, mrs, stack_fixed_params(fixed_params_list),
+        horizon_mode=horizon_mode)
+
+    for i, fixed_params in enumerate(fixed_params_list):
+        separate = main_calculations_batch(
+            age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+        for key, expected in separate.items():
+            if key in label_keys or key in ['years', 'age', 'sex', 'mrs']:
+                np.testing.assert_array_equal(
+                    stacked[key][:separate[key].size], expected)
+                continue
+            assert_rows_match(stacked[key][i], expected, key)
+
+
+def test_stack_fixed_params_checks_sets():
+    fixed_params_list = make_parameter_sets()
+    stacked = stack_fixed_params(fixed_params_list)
+    assert stacked['time_max_post_discharge_year'] == (
+        fixed_params_list[0]['time_max_post_discharge_year'])
+    assert stacked['lg_coeffs'].shape == (
+        (3,) + np.shape(fixed_params_list[0]['lg_coeffs']))
+    np.testing.assert_array_equal(stacked['cost_ae_gbp'], [170.46] * 2 + [250])
+
+    with pytest.raises(ValueError):
+        stack_fixed_params([])
+    longer = dict(fixed_params_list[0], time_max_post_discharge_year=60)
+    with pytest.raises(ValueError, match='time_max'):
+        stack_fixed_params([fixed_params_list[0], longer])
+    # One coefficient too many:
+    wrong_shape = dict(
+        fixed_params_list[0],
+        lg_coeffs=np.append(fixed_params_list[0]['lg_coeffs'], 0.0))
+    with pytest.raises(ValueError, match='lg_coeffs'):
+        stack_fixed_params([fixed_params_list[0], wrong_shape])
@@ -0,0 +1,110 @@
+"""
+Check the calendar year budgets against simple loops.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime import budget_impact
+from stroke_lifetime.batch_calculations import main_calculations_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=80, seed=42):
+    """Random patients including invalid and dead mRS scores."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+def find_unit_prices(fixed_params):
+    """Unit prices in the order of the resources."""
+    return np.array([
+        fixed_params['cost_ae_gbp'],
+        fixed_params['cost_non_elective_bed_day_gbp'],
+        fixed_params['cost_elective_bed_day_gbp'],
+        fixed_params['cost_residential_day_gbp'],
+        ])
+
+
+def loop_budget(results, discharge_year, first_year, n_years):
+    """Add each patient's yearly resource use to its calendar year."""
+    budget = np.zeros((n_years, 4))
+    for i, year in enumerate(discharge_year):
+        for column in range(results['ae_counts_by_year'].shape[-1]):
+            row = year + column - first_year
+            if row < 0 or row >= n_years:
+                continue
+            use = [
+                results['ae_counts_by_year'][i, column],
+                results['nel_counts_by_year'][i, column],
+                results['el_counts_by_year'][i, column],
+                365 * results['care_years_by_year'][i, column],
+                ]
+            # Invalid patients have no resource use:
+            if not np.any(np.isnan(use)):
+                budget[row] += use
+    return budget
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_budget_matches_loop(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    rng = np.random.default_rng(0)
+    discharge_year = rng.integers(2020, 2026, age.size)
+    unit_prices = find_unit_prices(fixed_params)
+
+    budget = budget_impact.project_budget(
+        results, discharge_year, fixed_params)
+    n_years = 2025 + results['ae_counts_by_year'].shape[-1] - 2020
+    expected = loop_budget(results, discharge_year, 2020, n_years)
+    np.testing.assert_array_equal(
+        budget['calendar_years'], 2020 + np.arange(n_years))
+    np.testing.assert_allclose(
+        budget['resource_use'], expected, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(
+        budget['cost_by_resource'], expected * unit_prices,
+        rtol=1e-12, atol=1e-9)
+    np.testing.assert_allclose(
+        budget['total_cost'], expected @ unit_prices, rtol=1e-12, atol=1e-9)
+
+    # A window that starts after some patients were discharged:
+    budget = budget_impact.project_budget(
+        results, discharge_year, fixed_params, first_year=2023, n_years=5)
+    expected = loop_budget(results, discharge_year, 2023, 5)
+    np.testing.assert_array_equal(
+        budget['calendar_years'], 2023 + np.arange(5))
+    np.testing.assert_allclose(
+        budget['resource_use'], expected, rtol=1e-12, atol=1e-12)
+
+
+def test_repeated_cohorts_match_shifted_budgets():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    cohort_sizes = np.array([100.0, 120.0, 0.0, 90.0, 150.0, 110.0])
+    n_years = cohort_sizes.size
+
+    budget = budget_impact.project_repeated_cohorts(
+        results, fixed_params, cohort_sizes, first_year=2030)
+
+    # Discharge the whole representative cohort in each year and
+    # scale it to that year's cohort size:
+    expected_use = np.zeros((n_years, 4))
+    expected_cost = np.zeros(n_years)
+    for year, size in enumerate(cohort_sizes):
+        shifted = budget_impact.project_budget(
+            results, np.full(age.size, 2030 + year), fixed_params,
+            first_year=2030, n_years=n_years)
+        expected_use += size / age.size * shifted['resource_use']
+        expected_cost += size / age.size * shifted['total_cost']
+
+    np.testing.assert_array_equal(
+        budget['calendar_years'], 2030 + np.arange(n_years))
+    np.testing.assert_allclose(
+        budget['resource_use'], expected_use, rtol=1e-10)
+    np.testing.assert_allclose(
+        budget['total_cost'], expected_cost, rtol=1e-10)
@@ -0,0 +1,105 @@
+"""
+Check that the discount rate sweep matches rerunning the model.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime import discounting
+from stroke_lifetime.batch_calculations import main_calculations_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=150, seed=41):
+    """Random patients including invalid and dead mRS scores."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_sweep_matches_reruns(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    # The QALY and cost rates are different from each other:
+    qaly_rates = [0.0, 1.5, 3.5, 6.0]
+    cost_rates = [0.0, 3.5, 5.0]
+    sweep = discounting.sweep_discount_rates(
+        results, fixed_params, qaly_rates, cost_rates)
+
+    n = age.size
+    assert sweep['qalys_total'].shape == (n, 4)
+    assert sweep['total_discounted_cost'].shape == (n, 3)
+    assert sweep['discounted_resource_quantities'].shape == (n, 3, 4)
+    assert sweep['net_benefit'].shape == (n, 4, 3)
+
+    for i, qaly_rate in enumerate(qaly_rates):
+        for j, cost_rate in enumerate(cost_rates):
+            rerun = main_calculations_batch(
+                age, sex, mrs,
+                dict(fixed_params,
+                     discount_factor_QALYs_perc=qaly_rate,
+                     discount_factor_costs_perc=cost_rate))
+            pairs = [
+                (sweep['qalys_total'][:, i], rerun['qalys_total']),
+                (sweep['discounted_resource_quantities'][:, j],
+                 rerun['discounted_resource_quantities']),
+                (sweep['total_discounted_cost'][:, j],
+                 rerun['total_discounted_cost']),
+                (sweep['net_benefit'][:, i, j], rerun['net_benefit']),
+                ]
+            for actual, expected in pairs:
+                np.testing.assert_allclose(
+                    actual, expected, rtol=1e-10, atol=1e-9,
+                    err_msg=f'{qaly_rate}, {cost_rate}')
+
+
+def test_sweep_defaults_to_fixed_params_rates():
+    fixed_params = dict(
+        get_fixed_params('mRS'),
+        discount_factor_QALYs_perc=1.5,
+        discount_factor_costs_perc=6.0)
+    age, sex, mrs = make_patients(30)
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    sweep = discounting.sweep_discount_rates(results, fixed_params)
+
+    np.testing.assert_array_equal(sweep['qaly_rates_perc'], [1.5])
+    np.testing.assert_array_equal(sweep['cost_rates_perc'], [6.0])
+    np.testing.assert_allclose(
+        sweep['qalys_total'][:, 0], results['qalys_total'], rtol=1e-10)
+    np.testing.assert_allclose(
+        sweep['total_discounted_cost'][:, 0],
+        results['total_discounted_cost'], rtol=1e-10)
+
+
+def test_cached_discount_factors_are_read_only():
+    discount_factors = discounting.find_discount_factors(3.5, 10)
+    np.testing.assert_allclose(
+        discount_factors, 1.035 ** -np.arange(10), rtol=1e-15)
+    assert not discount_factors.flags.writeable
+    with pytest.raises(ValueError):
+        discount_factors[0] = 2.0
+
+    # The same rate given as an array shares the cached values:
+    same_rate = discounting.find_discount_factors(np.array([3.5]), 10)
+    assert same_rate.shape == (1, 10)
+    assert not same_rate.flags.writeable
+    np.testing.assert_array_equal(same_rate[0], discount_factors)
+    assert discounting.find_discount_factors(3.5, 10)[0] == 1.0
+
+
+def test_discount_factors_for_many_rates():
+    rates = np.array([[0.0, 3.5], [5.0, 10.0]])
+    discount_factors = discounting.find_discount_factors(rates, 6)
+    assert discount_factors.shape == (2, 2, 6)
+    for index in np.ndindex(rates.shape):
+        np.testing.assert_allclose(
+            discount_factors[index],
+            discounting.find_discount_factors(rates[index], 6),
+            rtol=1e-15)
+
+    matrix = discounting.find_discount_matrix([0.0, 3.5, 5.0], 6)
+    assert matrix.shape == (6, 3)
+    np.testing.assert_array_equal(matrix[:, 0], np.ones(6))
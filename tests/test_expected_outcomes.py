@@ -0,0 +1,73 @@
+"""
+Check the expected outcomes against a loop over the mRS scores.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.expected_outcomes import (
+    calculate_expected_outcomes, expected_keys)
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.main_calculations import main_calculations
+
+
+def make_patients(n_patients=12, seed=32):
+    """Random patients with random mRS 0 to 6 probabilities."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs_probs = rng.dirichlet(np.ones(7), n_patients)
+    return age, sex, mrs_probs
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_expected_matches_loop(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs_probs = make_patients()
+    # Make sure a patient who is certainly dead gets zero:
+    mrs_probs[0] = [0, 0, 0, 0, 0, 0, 1]
+    expected = calculate_expected_outcomes(mrs_probs, age, sex, fixed_params)
+
+    for i in range(age.size):
+        totals = dict((key, 0.0) for key in expected_keys)
+        survival = 0.0
+        for mrs in range(6):
+            results = main_calculations(
+                age[i], sex[i], 'Male' if sex[i] else 'Female', mrs,
+                fixed_params, model_type)
+            for key in expected_keys:
+                totals[key] += mrs_probs[i, mrs] * results[key]
+            survival = survival + (
+                mrs_probs[i, mrs] * np.asarray(results['survival_by_year']))
+        for key in expected_keys:
+            np.testing.assert_allclose(
+                expected[key][i], totals[key], rtol=1e-9, atol=1e-9,
+                err_msg=key)
+        np.testing.assert_allclose(
+            expected['survival_by_year'][i], survival, rtol=1e-9,
+            atol=1e-12)
+
+    for key in expected_keys:
+        assert expected[key][0] == 0.0, key
+
+
+def test_certain_mrs_matches_single_score():
+    fixed_params = get_fixed_params('mRS')
+    mrs_probs = np.eye(7)[:6]
+    expected = calculate_expected_outcomes(
+        mrs_probs, np.full(6, 75.0), 1, fixed_params)
+    for mrs in range(6):
+        results = main_calculations(
+            75.0, 1, 'Male', mrs, fixed_params, 'mRS')
+        for key in expected_keys:
+            np.testing.assert_allclose(
+                expected[key][mrs], results[key], rtol=1e-9, err_msg=key)
+
+
+def test_invalid_probabilities():
+    fixed_params = get_fixed_params('mRS')
+    with pytest.raises(ValueError):
+        calculate_expected_outcomes(
+            np.full((2, 6), 1 / 6), [60.0, 70.0], 0, fixed_params)
+    with pytest.raises(ValueError):
+        calculate_expected_outcomes(
+            np.full((2, 7), 0.2), [60.0, 70.0], 0, fixed_params)
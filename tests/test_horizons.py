@@ -0,0 +1,76 @@
+"""
+Check the cumulative outcomes at several horizons.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.batch_calculations import (
+    main_calculations_batch, stack_fixed_params)
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+horizons = [0, 1, 5, 10, np.inf]
+
+
+def make_patients(n_patients=500, seed=50):
+    """Random patients including invalid and dead mRS scores."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 95.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_horizon_totals(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizons=horizons)
+    valid = np.isfinite(results['qalys_total'])
+    assert np.all(np.isnan(results['net_benefit_by_horizon'][~valid]))
+
+    # The lifetime horizon gives the usual totals:
+    for key in ['qalys_total', 'total_discounted_cost', 'net_benefit']:
+        np.testing.assert_allclose(
+            results[f'{key}_by_horizon'][valid, -1], results[key][valid],
+            rtol=1e-10, atol=1e-8, err_msg=key)
+    np.testing.assert_allclose(
+        results['resource_quantities_by_horizon'][valid, -1],
+        results['discounted_resource_quantities'][valid], rtol=1e-10)
+
+    # Each finite horizon adds up its first years:
+    for column, horizon in enumerate(horizons[:-1]):
+        np.testing.assert_allclose(
+            results['qalys_total_by_horizon'][valid, column],
+            np.sum(results['qalys_by_year'][valid, :horizon], axis=-1),
+            rtol=1e-10, atol=1e-12)
+        care_days = 365 * np.sum(
+            results['care_years_discounted_by_year'][valid, :horizon],
+            axis=-1)
+        np.testing.assert_allclose(
+            results['resource_quantities_by_horizon'][valid, column, 3],
+            care_days, rtol=1e-10, atol=1e-12)
+    assert np.all(np.diff(
+        results['qalys_total_by_horizon'][valid], axis=-1) >= -1e-12)
+
+
+def test_stacked_parameter_sets():
+    age, sex, mrs = make_patients()
+    stacked = main_calculations_batch(
+        age, sex, mrs,
+        stack_fixed_params([get_fixed_params('mRS'),
+                            get_fixed_params('Dichotomous')]),
+        horizons=horizons)
+    single = main_calculations_batch(
+        age, sex, mrs, get_fixed_params('Dichotomous'), horizons=horizons)
+    np.testing.assert_allclose(
+        stacked['net_benefit_by_horizon'][1],
+        single['net_benefit_by_horizon'], rtol=1e-12, equal_nan=True)
+
+
+def test_invalid_horizon():
+    age, sex, mrs = make_patients(5)
+    with pytest.raises(ValueError):
+        main_calculations_batch(
+            age, sex, mrs, get_fixed_params('mRS'), horizons=[1.5])
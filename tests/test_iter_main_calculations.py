@@ -0,0 +1,129 @@
+"""
+Check that streamed results match one main_calculations_batch() call.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.batch_calculations import (
+    main_calculations_batch, iter_main_calculations, stack_fixed_params)
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=200, seed=44):
+    """Random patients including invalid and dead mRS scores."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+# Values after the last calculated year, where these aren't zero:
+pad_values = dict(
+    hazard_by_year=1.0,
+    fhazard_by_year=np.nan,
+    death_in_year_n_probs=np.nan,
+    raw_qalys_by_year=np.nan,
+    )
+
+
+def pad_years(values, n_years, key):
+    """Pad the year axis as the batch does, or NaN for invalid patients."""
+    fill = np.where(
+        np.isnan(values[..., -1:]), np.nan, pad_values.get(key, 0.0))
+    padding = np.repeat(fill, n_years - values.shape[-1], axis=-1)
+    return np.concatenate([values, padding], axis=-1)
+
+
+def assert_rows_match(actual, expected, key):
+    """
+    Compare results that may have a different number of years.
+
+    Each chunk only has as many years as its own patients need, so
+    pad the shorter year axis before comparing.
+    """
+    if np.asarray(expected).dtype.kind == 'U':
+        np.testing.assert_array_equal(actual, expected, err_msg=key)
+        return
+    actual = np.asarray(actual, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    if actual.shape != expected.shape:
+        n_years = max(actual.shape[-1], expected.shape[-1])
+        actual = pad_years(actual, n_years, key)
+        expected = pad_years(expected, n_years, key)
+    np.testing.assert_allclose(
+        actual, expected, rtol=1e-12, atol=1e-15, err_msg=key)
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+@pytest.mark.parametrize('as_dicts', [False, True])
+def test_streamed_rows_match_batch(horizon_mode, as_dicts):
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    expected = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+
+    if as_dicts:
+        patients = (dict(age=a, sex=s, mrs=m) for a, s, m in
+                    zip(age, sex, mrs))
+    else:
+        patients = zip(age, sex, mrs)
+    # 37 doesn't divide 200 so the last chunk is smaller:
+    rows = list(iter_main_calculations(
+        patients, fixed_params, chunk_size=37, horizon_mode=horizon_mode))
+
+    assert len(rows) == age.size
+    for i, row in enumerate(rows):
+        assert sorted(row) == sorted(expected)
+        for key, values in row.items():
+            if key == 'years':
+                assert values[0] == 0
+                continue
+            assert_rows_match(values, expected[key][i], key)
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+def test_streamed_chunks_match_batch(horizon_mode):
+    fixed_params = get_fixed_params('Dichotomous')
+    age, sex, mrs = make_patients()
+    expected = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+
+    chunks = list(iter_main_calculations(
+        zip(age, sex, mrs), fixed_params, chunk_size=37,
+        yield_chunks=True, horizon_mode=horizon_mode))
+
+    assert [chunk['age'].size for chunk in chunks] == [37] * 5 + [15]
+    starts = np.cumsum([0] + [chunk['age'].size for chunk in chunks])
+    for chunk, start in zip(chunks, starts):
+        for key, values in chunk.items():
+            if key == 'years':
+                continue
+            for i in range(values.shape[0]):
+                assert_rows_match(values[i], expected[key][start + i], key)
+
+
+def test_stacked_parameter_sets_streamed():
+    fixed_params = get_fixed_params('mRS')
+    other_params = dict(fixed_params, wtp_qaly_gpb=50000)
+    stacked = stack_fixed_params([fixed_params, other_params])
+    age, sex, mrs = make_patients(50)
+    expected = main_calculations_batch(age, sex, mrs, stacked)
+
+    rows = list(iter_main_calculations(
+        zip(age, sex, mrs), stacked, chunk_size=16))
+    for i, row in enumerate(rows):
+        assert row['age'] == age[i]
+        # One value per parameter set:
+        assert row['net_benefit'].shape == (2,)
+        np.testing.assert_allclose(
+            row['net_benefit'], expected['net_benefit'][:, i], rtol=1e-12)
+        assert_rows_match(
+            row['qalys_by_year'], expected['qalys_by_year'][:, i],
+            'qalys_by_year')
+
+
+def test_chunk_size_must_be_positive():
+    fixed_params = get_fixed_params('mRS')
+    with pytest.raises(ValueError):
+        next(iter_main_calculations([(60.0, 0, 1)], fixed_params, 0))
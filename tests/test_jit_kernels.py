@@ -0,0 +1,61 @@
+"""
+Check that the compiled kernels match the NumPy batch calculations.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime import jit_kernels
+from stroke_lifetime.batch_calculations import calculate_outcomes_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=500, seed=29):
+    """Random patients including some with mRS 6 (dead)."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(0, 7, n_patients)
+    return age, sex, mrs
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_numba_matches_numpy(model_type):
+    pytest.importorskip('numba')
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    numba_results = calculate_outcomes_batch(
+        age, sex, mrs, fixed_params, backend='numba')
+    numpy_results = calculate_outcomes_batch(
+        age, sex, mrs, fixed_params, backend='numpy')
+
+    assert list(numba_results) == jit_kernels.outcome_keys
+    dead = mrs == 6
+    for key in jit_kernels.outcome_keys:
+        assert np.all(np.isnan(numba_results[key][dead])), key
+        np.testing.assert_allclose(
+            numba_results[key], numpy_results[key],
+            rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=key)
+
+
+def test_auto_falls_back_to_numpy(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('The compiled kernel should not be used.')
+
+    monkeypatch.setattr(jit_kernels, 'NUMBA_AVAILABLE', False)
+    monkeypatch.setattr(jit_kernels, 'calculate_outcomes', fail)
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients(50)
+    auto_results = calculate_outcomes_batch(
+        age, sex, mrs, fixed_params, backend='auto')
+    numpy_results = calculate_outcomes_batch(
+        age, sex, mrs, fixed_params, backend='numpy')
+    for key in jit_kernels.outcome_keys:
+        np.testing.assert_array_equal(
+            auto_results[key], numpy_results[key], err_msg=key)
+
+
+def test_unknown_backend():
+    age, sex, mrs = make_patients(5)
+    with pytest.raises(ValueError):
+        calculate_outcomes_batch(
+            age, sex, mrs, get_fixed_params('mRS'), backend='fortran')
@@ -0,0 +1,51 @@
+"""
+Check that the lazy results match main_calculations().
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.lazy_results import LazyResults, result_keys
+from stroke_lifetime.main_calculations import main_calculations
+
+
+def assert_same(actual, expected, key):
+    """Compare one result, which may be a label, number or list."""
+    if isinstance(expected, str):
+        assert actual == expected, key
+    else:
+        np.testing.assert_array_equal(
+            np.asarray(actual, dtype=float),
+            np.asarray(expected, dtype=float), err_msg=key)
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+@pytest.mark.parametrize('sex', [0, 1])
+@pytest.mark.parametrize('age', [55.0, 70.0, 70.5, 90.0])
+def test_to_dict_matches_main_calculations(model_type, sex, age):
+    fixed_params = get_fixed_params(model_type)
+    sex_str = 'Male' if sex else 'Female'
+    for mrs in range(7):
+        expected = main_calculations(
+            age, sex, sex_str, mrs, fixed_params, model_type)
+        results = LazyResults(
+            age, sex, sex_str, mrs, fixed_params, model_type)
+        assert list(results.to_dict()) == list(expected)
+        for key, value in results.to_dict().items():
+            assert_same(value, expected[key], key)
+
+
+def test_results_calculated_in_any_order():
+    fixed_params = get_fixed_params('mRS')
+    expected = main_calculations(72.0, 1, 'Male', 3, fixed_params, 'mRS')
+    results = LazyResults(72.0, 1, 'Male', 3, fixed_params, 'mRS')
+    assert results.calculated_keys() == []
+
+    # Only the results needed for the net benefit are calculated:
+    assert_same(results.net_benefit, expected['net_benefit'], 'net_benefit')
+    assert 'hazard_by_year' not in results.calculated_keys()
+    assert 'survival_mean_years' not in results.calculated_keys()
+
+    for key in reversed(result_keys):
+        assert_same(results[key], expected[key], key)
+    assert results.calculated_keys() == result_keys
@@ -0,0 +1,95 @@
+"""
+Check the microsimulation against the expected outcomes.
+"""
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+from stroke_lifetime import models
+from stroke_lifetime.batch_calculations import (
+    gather_patient_params, find_lpDeath_batch)
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.microsimulation import simulate_cohort
+
+
+def make_patients(n_patients=1000, seed=31):
+    """Random patients including some with mRS 6 (dead)."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 95.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(0, 7, n_patients)
+    return age, sex, mrs
+
+
+@pytest.mark.parametrize('chunk_size', [128, 1000, 5000])
+@pytest.mark.parametrize('by_year', [False, True])
+def test_same_seed_same_results(chunk_size, by_year):
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    results = simulate_cohort(
+        age, sex, mrs, fixed_params, seed=7, chunk_size=chunk_size,
+        by_year=by_year)
+    again = simulate_cohort(
+        age, sex, mrs, fixed_params, seed=7, chunk_size=chunk_size,
+        by_year=by_year)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        in_executor = simulate_cohort(
+            age, sex, mrs, fixed_params, seed=7, chunk_size=chunk_size,
+            by_year=by_year, executor=executor)
+
+    assert results['death_time_years'].shape == age.shape
+    assert np.all(results['death_time_years'][mrs == 6] == 0.0)
+    for key, values in results.items():
+        np.testing.assert_array_equal(again[key], values, err_msg=key)
+        np.testing.assert_array_equal(in_executor[key], values, err_msg=key)
+    if by_year:
+        for label in ['ae_admissions', 'nel_bed_days', 'el_bed_days']:
+            np.testing.assert_array_equal(
+                np.sum(results[f'{label}_by_year'], axis=-1),
+                results[label])
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+@pytest.mark.parametrize('age, sex, mrs', [(45.0, 0, 0), (80.0, 1, 4)])
+def test_mean_death_time(model_type, age, sex, mrs):
+    fixed_params = get_fixed_params(model_type)
+    n_patients = 20000
+    results = simulate_cohort(
+        np.full(n_patients, age), sex, mrs, fixed_params, seed=31)
+    death_time_years = results['death_time_years']
+
+    patient_params = gather_patient_params(
+        fixed_params, np.array([age]), np.array([mrs]))
+    lp_year1, lp_yearn = find_lpDeath_batch(
+        np.array([age]), np.array([sex]), patient_params)
+    expected = models.find_mean_survival_time(
+        models.find_pDeath_year1(lp_year1), lp_yearn,
+        fixed_params['gz_gamma'])[0]
+
+    standard_error = np.std(death_time_years) / np.sqrt(n_patients)
+    assert abs(np.mean(death_time_years) - expected) < 4.0 * standard_error
+
+
+def test_counts_stop_at_last_year():
+    fixed_params = get_fixed_params('mRS')
+    time_max = fixed_params['time_max_post_discharge_year']
+    age = np.full(20000, 40.0)
+    results = simulate_cohort(age, 0, 0, fixed_params, seed=3)
+    by_year = simulate_cohort(age, 0, 0, fixed_params, seed=3, by_year=True)
+    # Some young patients outlive the last tabulated year:
+    assert np.any(results['death_time_years'] > time_max)
+
+    average_care_year = gather_patient_params(
+        fixed_params, age[:1], np.array([0]))['average_care_year'][0]
+    for simulated in [results, by_year]:
+        np.testing.assert_allclose(
+            simulated['care_years'],
+            average_care_year *
+            np.minimum(simulated['death_time_years'], time_max))
+    # Both ways of counting have the same expected total:
+    for label in ['ae_admissions', 'nel_bed_days', 'el_bed_days']:
+        difference = np.mean(results[label]) - np.mean(by_year[label])
+        standard_error = np.sqrt(
+            (np.var(results[label]) + np.var(by_year[label])) / age.size)
+        assert abs(difference) < 4.0 * standard_error, label
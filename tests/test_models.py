@@ -0,0 +1,147 @@
+"""
+Check the vectorised survival functions against the scalar versions.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime import models as model
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.main_calculations import main_calculations
+
+
+def make_patients(n_patients=200, seed=26):
+    """Random valid patients."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(0, 6, n_patients)
+    return age, sex, mrs
+
+
+def find_mortality_params(age, sex, mrs, fixed_params):
+    """Year one probability and later linear predictor per patient."""
+    pDeath_year1 = np.zeros(age.size)
+    lpDeath_yearn = np.zeros(age.size)
+    for i in range(age.size):
+        lp_year1 = model.find_lpDeath_year1(
+            age[i], sex[i], mrs[i],
+            fixed_params['lg_mean_ages'], fixed_params['lg_coeffs'])
+        pDeath_year1[i] = model.find_pDeath_year1(lp_year1)
+        lpDeath_yearn[i] = model.find_lpDeath_yearn(
+            age[i], sex[i], mrs[i],
+            fixed_params['gz_mean_age'], fixed_params['gz_coeffs'])
+    return pDeath_year1, lpDeath_yearn
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_quantiles_match_scalar_function(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    pDeath_year1, lpDeath_yearn = find_mortality_params(
+        age, sex, mrs, fixed_params)
+    # Small probabilities fall in year one and use the second case:
+    pDeaths = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95]
+
+    outputs = model.find_survival_time_quantiles(
+        pDeaths, pDeath_year1, lpDeath_yearn, fixed_params['gz_gamma'])
+    for output in outputs:
+        assert output.shape == (age.size, len(pDeaths))
+
+    used_year1_case = False
+    for i in range(age.size):
+        for j, pDeath in enumerate(pDeaths):
+            expected = model.find_survival_time_for_pDeath(
+                pDeath, pDeath_year1[i], lpDeath_yearn[i],
+                fixed_params['gz_gamma'])
+            actual = [output[i, j] for output in outputs]
+            np.testing.assert_allclose(actual, expected, rtol=1e-12)
+            used_year1_case |= expected[0] <= 1.0
+    assert used_year1_case
+
+    # The median column is the median from main_calculations():
+    median = outputs[0][:, pDeaths.index(0.5)]
+    for i in range(0, age.size, 10):
+        results = main_calculations(
+            age[i], sex[i], 'Male' if sex[i] else 'Female', mrs[i],
+            fixed_params, model_type)
+        assert median[i] == results['survival_median_years']
+
+
+def test_quantiles_with_one_patient_per_gamma():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients(20)
+    pDeath_year1, lpDeath_yearn = find_mortality_params(
+        age, sex, mrs, fixed_params)
+    gz_gamma = fixed_params['gz_gamma'] * np.linspace(0.5, 1.5, age.size)
+
+    survival_times = model.find_survival_time_quantiles(
+        [0.25, 0.5], pDeath_year1, lpDeath_yearn, gz_gamma)[0]
+    for i in range(age.size):
+        for j, pDeath in enumerate([0.25, 0.5]):
+            expected = model.find_survival_time_for_pDeath(
+                pDeath, pDeath_year1[i], lpDeath_yearn[i], gz_gamma[i])[0]
+            np.testing.assert_allclose(
+                survival_times[i, j], expected, rtol=1e-12)
+
+
+def find_survival_curve(t, pDeath_year1, lpDeath_yearn, gz_gamma):
+    """Survival at times t (years) for one patient."""
+    hazard = (np.exp(lpDeath_yearn) *
+              np.expm1(np.clip(t - 1.0, 0.0, None) * 365.0 * gz_gamma) /
+              gz_gamma)
+    survival = np.where(
+        t <= 1.0,
+        (1.0 - pDeath_year1)**t,
+        (1.0 - np.minimum(hazard, 1.0)) * (1.0 - pDeath_year1)
+        )
+    return survival
+
+
+def integrate_survival(horizon, pDeath_year1, lpDeath_yearn, gz_gamma):
+    """Area under the survival curve by a fine trapezoid rule."""
+    t = np.linspace(0.0, horizon, 200001)
+    survival = find_survival_curve(t, pDeath_year1, lpDeath_yearn, gz_gamma)
+    return np.sum(np.diff(t) * (survival[1:] + survival[:-1]) / 2.0)
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_rmst_matches_numerical_integration(model_type):
+    fixed_params = get_fixed_params(model_type)
+    gz_gamma = fixed_params['gz_gamma']
+    age, sex, mrs = make_patients(30)
+    pDeath_year1, lpDeath_yearn = find_mortality_params(
+        age, sex, mrs, fixed_params)
+    # Horizons inside year one, on the joins and past zero survival:
+    horizons = [0.0, 0.3, 1.0, 2.5, 10.0, 40.0, np.inf]
+
+    rmst = model.find_restricted_mean_survival_time(
+        horizons, pDeath_year1, lpDeath_yearn, gz_gamma)
+    mean_survival = model.find_mean_survival_time(
+        pDeath_year1, lpDeath_yearn, gz_gamma)
+    assert rmst.shape == (age.size, len(horizons))
+    np.testing.assert_array_equal(mean_survival, rmst[:, -1])
+
+    for i in range(age.size):
+        year_when_zero_survival = model.find_time_for_this_hazard(
+            gz_gamma, pDeath_year1[i], lpDeath_yearn[i])
+        for j, horizon in enumerate(horizons):
+            # Survival is zero after this so stop integrating there:
+            horizon = min(horizon, year_when_zero_survival)
+            expected = integrate_survival(
+                horizon, pDeath_year1[i], lpDeath_yearn[i], gz_gamma)
+            np.testing.assert_allclose(
+                rmst[i, j], expected, rtol=1e-7, atol=1e-9)
+
+    # Restricting the time can only reduce the area:
+    assert np.all(np.diff(rmst, axis=-1) >= 0.0)
+    assert np.all(rmst <= np.array(horizons))
+
+
+def test_rmst_without_year_one_deaths():
+    # With no deaths in year one the first year is all survival:
+    fixed_params = get_fixed_params('mRS')
+    rmst = model.find_restricted_mean_survival_time(
+        [0.5, 1.0, 3.0], 0.0, -5.0, fixed_params['gz_gamma'])
+    np.testing.assert_allclose(rmst[0, :2], [0.5, 1.0])
+    expected = integrate_survival(3.0, 0.0, -5.0, fixed_params['gz_gamma'])
+    np.testing.assert_allclose(rmst[0, 2], expected, rtol=1e-7)
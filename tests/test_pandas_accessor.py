@@ -0,0 +1,73 @@
+"""
+Check the DataFrame accessor against the batch calculations.
+"""
+import numpy as np
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import stroke_lifetime.pandas_accessor  # noqa: E402,F401
+from stroke_lifetime.batch_calculations import (  # noqa: E402
+    calculate_outcomes_batch, main_calculations_batch)
+from stroke_lifetime.fixed_params import get_fixed_params  # noqa: E402
+from stroke_lifetime.jit_kernels import outcome_keys  # noqa: E402
+
+
+def make_df():
+    """Patients with a text sex column, missing mRS and a text index."""
+    return pd.DataFrame(
+        dict(
+            age=[60.0, 75.0, 80.0, 55.0, 90.0, 68.0],
+            sex=['Female', 'male', 'MALE', 'female', 'Male', 'Female'],
+            mrs=pd.array([0, 3, None, 5, 2, 6], dtype='Int64'),
+        ),
+        index=['p1', 'p2', 'p3', 'p4', 'p5', 'p6'],
+    )
+
+
+def test_compute_text_sex_and_missing_mrs():
+    df = make_df()
+    outcomes = df.stroke_lifetime.compute(model='mRS', backend='numpy')
+    assert list(outcomes.columns) == outcome_keys
+    assert list(outcomes.index) == list(df.index)
+
+    expected = calculate_outcomes_batch(
+        df['age'].to_numpy(), np.array([0, 1, 1, 0, 1, 0]),
+        np.array([0, 3, -1, 5, 2, 6]), get_fixed_params('mRS'),
+        backend='numpy')
+    for key in outcome_keys:
+        np.testing.assert_allclose(
+            outcomes[key].to_numpy(), expected[key], rtol=1e-12,
+            err_msg=key)
+    # Missing and dead patients give Not A Number:
+    assert outcomes.loc[['p3', 'p6']].isna().all().all()
+    assert outcomes.drop(['p3', 'p6']).notna().all().all()
+
+
+def test_add_outcomes_numeric_sex_and_invalid_mrs():
+    df = make_df().assign(
+        sex=[0, 1, 1, 0, 1, 0],
+        mrs=[0.0, 3.0, np.inf, 2.5, -np.inf, np.nan],
+    )
+    df.index = [10, 20, 30, 40, 50, 60]
+    added = df.stroke_lifetime.add_outcomes(
+        model='Dichotomous', outcomes=['qalys_total', 'care_years'],
+        prefix='new_')
+    assert list(added.columns) == [
+        'age', 'sex', 'mrs', 'new_qalys_total', 'new_care_years']
+    assert list(added.index) == list(df.index)
+
+    expected = main_calculations_batch(
+        df['age'].to_numpy()[:2], np.array([0, 1]), np.array([0, 3]),
+        get_fixed_params('Dichotomous'))
+    np.testing.assert_allclose(
+        added['new_qalys_total'].to_numpy()[:2], expected['qalys_total'],
+        rtol=1e-12)
+    assert added[['new_qalys_total', 'new_care_years']].iloc[2:].isna(
+        ).all().all()
+
+
+def test_unknown_sex_label():
+    df = make_df().assign(sex=['F', 'M', 'M', 'F', 'M', 'F'])
+    with pytest.raises(ValueError):
+        df.stroke_lifetime.compute()
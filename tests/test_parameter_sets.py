@@ -0,0 +1,70 @@
+"""
+Check that parameter files load into the built-in fixed parameters.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from stroke_lifetime import parameter_sets
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_file_round_trip(model_type, tmp_path):
+    expected = get_fixed_params(model_type)
+    path = str(tmp_path / f'{model_type}.json')
+    parameter_sets.write_parameter_file(expected, path, model_type)
+
+    for use_cache in [False, True, True]:
+        fixed_params = parameter_sets.load_parameter_set(
+            path, use_cache=use_cache)
+        assert fixed_params['model_type'] == model_type
+        for key, value in expected.items():
+            np.testing.assert_allclose(
+                fixed_params[key], value, rtol=1e-12, err_msg=key)
+
+
+def test_loaded_sets_are_copies(tmp_path):
+    path = str(tmp_path / 'mRS.json')
+    parameter_sets.write_parameter_file(
+        get_fixed_params('mRS'), path, 'mRS')
+    first = parameter_sets.load_parameter_set(path)
+    utility = first['utility_list'][2]
+    first['utility_list'][2] = -1.0
+    first['wtp_qaly_gpb'] = 0.0
+
+    second = parameter_sets.load_parameter_set(path)
+    assert second['utility_list'][2] == utility
+    assert second['wtp_qaly_gpb'] == get_fixed_params('mRS')['wtp_qaly_gpb']
+
+
+def test_edited_file_is_compiled_again(tmp_path):
+    path = tmp_path / 'mRS.json'
+    parameter_sets.write_parameter_file(
+        get_fixed_params('mRS'), str(path), 'mRS')
+    parameter_sets.load_parameter_set(str(path))
+
+    values = json.loads(path.read_text())
+    values['wtp_qaly_gpb'] = 12345.0
+    path.write_text(json.dumps(values))
+    fixed_params = parameter_sets.load_parameter_set(str(path))
+    assert fixed_params['wtp_qaly_gpb'] == 12345.0
+
+
+def test_invalid_file(tmp_path):
+    values = json.loads(json.dumps(dict(
+        (key, np.asarray(value).tolist())
+        for key, value in get_fixed_params('mRS').items()
+        if key in parameter_sets.parameter_shapes
+    )))
+    values['model_type'] = 'mRS'
+    values['utility_list'] = values['utility_list'][:5]
+    del values['gz_gamma']
+    path = tmp_path / 'broken.json'
+    path.write_text(json.dumps(values))
+
+    with pytest.raises(ValueError) as error:
+        parameter_sets.load_parameter_set(str(path), use_cache=False)
+    assert 'utility_list' in str(error.value)
+    assert 'gz_gamma' in str(error.value)
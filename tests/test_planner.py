@@ -0,0 +1,82 @@
+"""
+Check that deduplicated results match one direct batch run.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.batch_calculations import (
+    main_calculations_batch, stack_fixed_params)
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.planner import (
+    main_calculations_deduplicated, plan_unique_profiles)
+
+
+def make_patients(n_patients=400, seed=39):
+    """Patients with whole-year ages so that many profiles repeat."""
+    rng = np.random.default_rng(seed)
+    age = rng.integers(40, 100, n_patients).astype(float)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+def assert_same_results(actual, expected):
+    """Every result matches, including Not A Number placeholders."""
+    assert sorted(actual) == sorted(expected)
+    for key, values in expected.items():
+        assert actual[key].shape == values.shape, key
+        if values.dtype.kind == 'U':
+            np.testing.assert_array_equal(actual[key], values, key)
+        else:
+            np.testing.assert_allclose(
+                actual[key], values, rtol=1e-12, atol=1e-15, err_msg=key)
+
+
+@pytest.mark.parametrize('horizon_mode', ['fixed', 'survival'])
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_deduplicated_matches_batch(model_type, horizon_mode):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    results, report = main_calculations_deduplicated(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+    expected = main_calculations_batch(
+        age, sex, mrs, fixed_params, horizon_mode=horizon_mode)
+
+    assert report['n_patients'] == age.size
+    assert report['n_unique'] < age.size
+    assert_same_results(results, expected)
+
+
+def test_deduplicated_stacked_parameter_sets():
+    fixed_params = stack_fixed_params(
+        [get_fixed_params('mRS'), get_fixed_params('Dichotomous')])
+    age, sex, mrs = make_patients(100)
+    results, _ = main_calculations_deduplicated(age, sex, mrs, fixed_params)
+    expected = main_calculations_batch(age, sex, mrs, fixed_params)
+    assert results['net_benefit'].shape == (2, age.size)
+    assert_same_results(results, expected)
+
+
+def test_plan_for_known_duplicates():
+    # Three profiles: (60, 0, 2) three times, (60, 1, 2) twice and
+    # (75, 0, 4) once.
+    age = [60.0, 60.0, 75.0, 60.0, 60.0, 60.0]
+    sex = [0, 1, 0, 0, 1, 0]
+    mrs = [2, 2, 4, 2, 2, 2]
+    plan = plan_unique_profiles(age, sex, mrs)
+
+    assert plan['n_patients'] == 6
+    assert plan['n_unique'] == 3
+    assert plan['dedup_ratio'] == 2.0
+    # Scattering the unique profiles recreates the patients:
+    np.testing.assert_array_equal(plan['age'][plan['inverse']], age)
+    np.testing.assert_array_equal(plan['sex'][plan['inverse']], sex)
+    np.testing.assert_array_equal(plan['mrs'][plan['inverse']], mrs)
+    counts = np.bincount(plan['inverse'])
+    assert sorted(counts) == [1, 2, 3]
+
+
+def test_plan_without_duplicates():
+    plan = plan_unique_profiles([50.5, 60.5, 70.5], 1, 3)
+    assert plan['n_unique'] == 3
+    assert plan['dedup_ratio'] == 1.0
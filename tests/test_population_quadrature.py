@@ -0,0 +1,62 @@
+"""
+Check the population quadrature against known answers.
+"""
+import numpy as np
+
+from stroke_lifetime.batch_calculations import main_calculations_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.population_quadrature import (
+    calculate_population_outcomes, find_age_nodes, find_histogram_nodes,
+    population_keys, valid_age_limits)
+
+
+def test_normal_across_breakpoint_converges():
+    fixed_params = get_fixed_params('mRS')
+    density = dict(kind='normal', mean=72.0, sd=12.0, limits=(18.0, 100.0))
+    population = calculate_population_outcomes(density, fixed_params)
+    assert population['converged']
+    for key in population_keys:
+        assert population[key].shape == (2, 6)
+        assert np.all(
+            population['errors'][key] <= 1e-4 * np.abs(population[key])), key
+
+
+def test_default_normal_limits():
+    ages, weights = find_age_nodes(dict(kind='normal', mean=72.0, sd=12.0), 8)
+    assert np.all(ages > valid_age_limits[0])
+    assert np.all(ages < valid_age_limits[1])
+    np.testing.assert_allclose(np.sum(weights), 1.0)
+    # One panel on each side of age 70:
+    assert ages.size == 16
+    assert np.sum(ages < 70.0) == 8
+
+
+def test_histogram_split_at_breakpoint():
+    # A bin from 60 to 80 holds the same patients as two bins from
+    # 60 to 70 and 70 to 80 with half of the weight each:
+    ages, weights = find_histogram_nodes([40.0, 60.0, 80.0], [1.0, 2.0], 4)
+    split_ages, split_weights = find_histogram_nodes(
+        [40.0, 60.0, 70.0, 80.0], [1.0, 1.0, 1.0], 4)
+    np.testing.assert_allclose(ages, split_ages)
+    np.testing.assert_allclose(weights, split_weights)
+    np.testing.assert_allclose(np.sum(weights), 1.0)
+
+
+def test_uniform_histogram_matches_dense_average():
+    fixed_params = get_fixed_params('Dichotomous')
+    density = dict(kind='histogram', edges=[65.0, 75.0], weights=[1.0])
+    population = calculate_population_outcomes(
+        density, fixed_params, sexes=[1], tolerance=1e-6, max_nodes=512)
+
+    # Two nodes in each of many narrow bins:
+    dense, dense_weights = find_histogram_nodes(
+        np.linspace(65.0, 75.0, 401), np.ones(400), 2)
+    for mrs in range(6):
+        results = main_calculations_batch(
+            dense, np.ones(dense.size), np.full(dense.size, mrs),
+            fixed_params)
+        for key in ['qalys_total', 'total_discounted_cost']:
+            expected = np.sum(dense_weights * results[key])
+            np.testing.assert_allclose(
+                population[key][0, mrs], expected, rtol=1e-4,
+                err_msg=key)
@@ -0,0 +1,89 @@
+"""
+Check that recosting matches the costs from the model itself.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime import recosting
+from stroke_lifetime.batch_calculations import main_calculations_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def make_patients(n_patients=150, seed=34):
+    """Random patients including invalid and dead mRS scores."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(40.0, 100.0, n_patients)
+    sex = rng.integers(0, 2, n_patients)
+    mrs = rng.integers(-1, 7, n_patients)
+    return age, sex, mrs
+
+
+def make_tariff_sets(fixed_params):
+    """The original unit prices and two other sets."""
+    cheaper = dict(
+        fixed_params, cost_ae_gbp=120.0, cost_residential_day_gbp=80.0)
+    dearer = dict(
+        fixed_params,
+        cost_non_elective_bed_day_gbp=700.0,
+        cost_elective_bed_day_gbp=600.0)
+    return [fixed_params, cheaper, dearer]
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_original_tariffs_reproduce_costs(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    quantities = recosting.find_discounted_resource_quantities(results)
+    np.testing.assert_allclose(
+        quantities, results['discounted_resource_quantities'],
+        rtol=1e-12, equal_nan=True)
+
+    tariffs = recosting.make_tariff_matrix(fixed_params)
+    assert tariffs.shape == (1, 4)
+    recosted = recosting.recost(
+        quantities, tariffs, results['qalys_total'],
+        fixed_params['wtp_qaly_gpb'])
+
+    np.testing.assert_allclose(
+        recosted['total_discounted_cost'][:, 0],
+        results['total_discounted_cost'], rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(
+        recosted['net_benefit'][:, 0], results['net_benefit'],
+        rtol=1e-12, equal_nan=True)
+    for i, label in enumerate(recosting.resource_labels):
+        np.testing.assert_allclose(
+            recosted['cost_by_resource'][:, 0, i],
+            results[f'{label}_discounted_cost'], rtol=1e-12,
+            equal_nan=True, err_msg=label)
+
+
+def test_tariff_matrix_matches_separate_recosts():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    results = main_calculations_batch(age, sex, mrs, fixed_params)
+    quantities = recosting.find_discounted_resource_quantities(results)
+    tariff_sets = make_tariff_sets(fixed_params)
+    tariffs = recosting.make_tariff_matrix(tariff_sets)
+    assert tariffs.shape == (3, 4)
+
+    recosted = recosting.recost(
+        quantities, tariffs, results['qalys_total'],
+        fixed_params['wtp_qaly_gpb'])
+    assert recosted['cost_by_resource'].shape == (age.size, 3, 4)
+    assert recosted['total_discounted_cost'].shape == (age.size, 3)
+
+    for row, params in enumerate(tariff_sets):
+        # A single tariff set on its own:
+        separate = recosting.recost(
+            quantities, tariffs[row], results['qalys_total'],
+            fixed_params['wtp_qaly_gpb'])
+        for key, values in separate.items():
+            np.testing.assert_allclose(
+                recosted[key][:, row], values[:, 0], rtol=1e-12,
+                equal_nan=True, err_msg=key)
+        # Running the whole model with these prices:
+        rerun = main_calculations_batch(age, sex, mrs, params)
+        np.testing.assert_allclose(
+            recosted['total_discounted_cost'][:, row],
+            rerun['total_discounted_cost'], rtol=1e-12, equal_nan=True)
@@ -0,0 +1,91 @@
+"""
+Check the SQLite results cache.
+"""
+import itertools
+import types
+
+import numpy as np
+
+from stroke_lifetime import results_cache
+from stroke_lifetime.batch_calculations import main_calculations_batch
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.results_cache import (
+    ResultsCache, calculate_with_cache, cached_keys)
+
+
+def make_patients():
+    """A few profiles, some of them repeated."""
+    age = np.array([55.0, 72.5, 88.0, 55.0, 64.0, 90.0])
+    sex = np.array([0, 1, 1, 0, 0, 1])
+    mrs = np.array([1, 3, 5, 1, 6, 0])
+    return age, sex, mrs
+
+
+def test_put_get_round_trip():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, mrs = make_patients()
+    expected = main_calculations_batch(age, sex, mrs, fixed_params)
+    n_years = fixed_params['time_max_post_discharge_year'] + 1
+
+    with ResultsCache(':memory:') as cache:
+        found, _ = cache.get_many(age, sex, mrs, 'mRS', fixed_params)
+        assert not np.any(found)
+        first = calculate_with_cache(
+            age, sex, mrs, fixed_params, 'mRS', cache)
+        # Five unique profiles:
+        assert len(cache) == 5
+        found, second = cache.get_many(age, sex, mrs, 'mRS', fixed_params)
+        assert np.all(found)
+
+    for results in [first, second]:
+        for key in cached_keys:
+            np.testing.assert_array_equal(
+                results[key], expected[key], err_msg=key)
+        survival = results['survival_by_year']
+        assert survival.shape == (age.size, n_years)
+        n = expected['survival_by_year'].shape[-1]
+        np.testing.assert_array_equal(
+            survival[:, :n], expected['survival_by_year'])
+        assert np.all(survival[mrs <= 5, n:] == 0.0)
+
+
+def test_least_recently_used_removed_first(monkeypatch):
+    # A clock that ticks once per call so that no two uses tie:
+    clock = itertools.count()
+    monkeypatch.setattr(
+        results_cache, 'time', types.SimpleNamespace(time=clock.__next__))
+    fixed_params = get_fixed_params('mRS')
+    ages = np.array([50.0, 60.0, 70.0, 80.0])
+
+    with ResultsCache(':memory:', max_entries=3) as cache:
+        for age in ages[:3]:
+            calculate_with_cache(age, 0, 2, fixed_params, 'mRS', cache)
+        # Use the oldest entry again so that 60 is now the oldest:
+        found, _ = cache.get_many(50.0, 0, 2, 'mRS', fixed_params)
+        assert found[0]
+        calculate_with_cache(ages[3], 0, 2, fixed_params, 'mRS', cache)
+
+        assert len(cache) == 3
+        found, _ = cache.get_many(ages, 0, 2, 'mRS', fixed_params)
+        np.testing.assert_array_equal(found, [True, False, True, True])
+
+
+def test_parameter_change():
+    fixed_params = get_fixed_params('mRS')
+    changed = dict(fixed_params, wtp_qaly_gpb=50000.0)
+    age, sex, mrs = make_patients()
+
+    with ResultsCache(':memory:') as cache:
+        calculate_with_cache(age, sex, mrs, fixed_params, 'mRS', cache)
+        found, _ = cache.get_many(age, sex, mrs, 'mRS', changed)
+        assert not np.any(found)
+
+        results = calculate_with_cache(age, sex, mrs, changed, 'mRS', cache)
+        expected = main_calculations_batch(age, sex, mrs, changed)
+        np.testing.assert_array_equal(
+            results['net_benefit'], expected['net_benefit'])
+
+        # Results for the first parameters are still there:
+        found, _ = cache.get_many(age, sex, mrs, 'mRS', fixed_params)
+        assert np.all(found)
+        assert len(cache) == 10
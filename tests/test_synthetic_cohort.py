@@ -0,0 +1,93 @@
+"""
+Check the synthetic cohorts are reproducible and have the right mix.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from stroke_lifetime import synthetic_cohort
+from stroke_lifetime.fixed_params import get_fixed_params
+
+
+def test_same_seed_gives_same_cohort():
+    cohort = synthetic_cohort.generate_cohort(5000, seed=47, chunk_size=700)
+    again = synthetic_cohort.generate_cohort(5000, seed=47, chunk_size=700)
+    other = synthetic_cohort.generate_cohort(5000, seed=48, chunk_size=700)
+    for key in ['age', 'sex', 'mrs']:
+        assert cohort[key].shape == (5000,)
+        np.testing.assert_array_equal(cohort[key], again[key])
+    assert not np.array_equal(cohort['age'], other['age'])
+
+
+def test_chunks_join_to_cohort():
+    options = dict(age_distribution='uniform', whole_years=True)
+    cohort = synthetic_cohort.generate_cohort(
+        2500, seed=7, chunk_size=600, **options)
+    chunks = list(synthetic_cohort.iter_cohort_chunks(
+        2500, seed=7, chunk_size=600, **options))
+    # 600 doesn't divide 2500 so the last chunk is smaller:
+    assert [chunk['age'].size for chunk in chunks] == [600] * 4 + [100]
+    for key in ['age', 'sex', 'mrs']:
+        np.testing.assert_array_equal(
+            np.concatenate([chunk[key] for chunk in chunks]), cohort[key])
+    np.testing.assert_array_equal(cohort['age'], np.floor(cohort['age']))
+
+
+def test_written_files_match_cohort(tmp_path):
+    cohort = synthetic_cohort.generate_cohort(1000, seed=3, chunk_size=300)
+    paths = synthetic_cohort.write_cohort_files(
+        os.path.join(tmp_path, 'cohort'), 1000, seed=3, chunk_size=300)
+    assert len(paths) == 4
+    for key in ['age', 'sex', 'mrs']:
+        values = np.concatenate([np.load(path)[key] for path in paths])
+        np.testing.assert_array_equal(values, cohort[key])
+
+
+@pytest.mark.parametrize('age_distribution', ['normal', 'uniform'])
+def test_redrawn_ages_within_limits(age_distribution):
+    # Narrow limits so that most first draws are outside them:
+    age_limits = (65.0, 70.0)
+    cohort = synthetic_cohort.generate_cohort(
+        20000, seed=1, age_distribution=age_distribution, age_sd=15.0,
+        age_limits=age_limits)
+    age = cohort['age']
+    assert np.all((age >= 65.0) & (age <= 70.0))
+    # Ages are drawn again rather than moved to the limits. Only the
+    # few still outside after every redraw end up on a limit:
+    assert np.mean((age == 65.0) | (age == 70.0)) < 1e-3
+    assert np.min(age) < 65.1 and np.max(age) > 69.9
+
+
+def test_fixed_ages_are_mean_ages():
+    cohort = synthetic_cohort.generate_cohort(
+        1000, seed=2, model_type='Dichotomous', age_distribution='fixed')
+    mean_ages = get_fixed_params('Dichotomous')['lg_mean_ages']
+    np.testing.assert_array_equal(cohort['age'], mean_ages[cohort['mrs']])
+
+
+def test_proportions_within_sampling_error():
+    n_patients = 200000
+    mrs_probs = synthetic_cohort.find_mrs_probabilities()
+    assert mrs_probs.shape == (6,)
+    np.testing.assert_allclose(np.sum(mrs_probs), 1.0)
+    cohort = synthetic_cohort.generate_cohort(
+        n_patients, seed=11, male_ratio=0.3)
+
+    # Allow five standard errors either way:
+    proportions = np.bincount(cohort['mrs'], minlength=6) / n_patients
+    standard_errors = np.sqrt(mrs_probs * (1.0 - mrs_probs) / n_patients)
+    assert np.all(np.abs(proportions - mrs_probs) < 5 * standard_errors)
+    male = np.mean(cohort['sex'])
+    assert abs(male - 0.3) < 5 * np.sqrt(0.3 * 0.7 / n_patients)
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        synthetic_cohort.generate_cohort(10, age_distribution='gamma')
+    with pytest.raises(ValueError):
+        synthetic_cohort.generate_cohort(10, male_ratio=1.5)
+    with pytest.raises(ValueError):
+        synthetic_cohort.generate_cohort(10, mrs_probs=[1.0, 1.0])
+    with pytest.raises(ValueError):
+        synthetic_cohort.generate_cohort(10, chunk_size=0)
@@ -0,0 +1,58 @@
+"""
+Check the closed-form thresholds against bisection.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.threshold_analysis import (
+    find_thresholds, find_linear_thresholds, find_thresholds_bisection)
+
+
+age = np.array([55.0, 75.0])
+sex = np.array([0, 1])
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+@pytest.mark.parametrize('parameter, lower, upper', [
+    ('wtp_qaly_gpb', -1e6, 1e6),
+    ('cost_ae_gbp', -1e6, 1e6),
+    ('cost_residential_day_gbp', -1e5, 1e5),
+])
+def test_linear_matches_bisection(model_type, parameter, lower, upper):
+    fixed_params = get_fixed_params(model_type)
+    tolerance = 1e-4
+    linear = find_linear_thresholds(age, sex, fixed_params, parameter)
+    bisection = find_thresholds_bisection(
+        age, sex, fixed_params, parameter, lower, upper,
+        tolerance=tolerance, backend='numpy')
+
+    diagonal = np.eye(6, dtype=bool)
+    assert np.all(np.isnan(linear[:, diagonal]))
+    assert np.all(np.isnan(bisection[:, diagonal]))
+    inside = (linear > lower) & (linear < upper)
+    assert np.any(inside)
+    # Every threshold in the range is found and nothing else is:
+    np.testing.assert_array_equal(np.isfinite(bisection), inside)
+    np.testing.assert_allclose(
+        bisection[inside], linear[inside], rtol=1e-9, atol=tolerance)
+
+
+def test_not_bracketed_gives_nan():
+    fixed_params = get_fixed_params('Dichotomous')
+    linear = find_linear_thresholds(age, sex, fixed_params, 'wtp_qaly_gpb')
+    # A range that holds none of the thresholds:
+    lower = np.nanmax(linear) + 1.0
+    thresholds = find_thresholds(age, sex, fixed_params, 'wtp_qaly_gpb')
+    np.testing.assert_array_equal(thresholds, linear)
+    bisection = find_thresholds_bisection(
+        age, sex, fixed_params, 'wtp_qaly_gpb', lower, lower + 1000.0,
+        backend='numpy')
+    assert np.all(np.isnan(bisection))
+
+
+def test_bisection_needs_limits():
+    with pytest.raises(ValueError):
+        find_thresholds(
+            age, sex, get_fixed_params('mRS'),
+            'discount_factor_QALYs_perc')
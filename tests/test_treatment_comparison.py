@@ -0,0 +1,103 @@
+"""
+Check the treatment comparison against hand-computed increments.
+"""
+import numpy as np
+import pytest
+
+from stroke_lifetime.fixed_params import get_fixed_params
+from stroke_lifetime.main_calculations import main_calculations
+from stroke_lifetime.treatment_comparison import (
+    compare_mrs_distributions, find_icer)
+
+
+def make_patients(seed=33):
+    """Patients sharing some (age, sex) pairs, and two arms."""
+    rng = np.random.default_rng(seed)
+    age = np.array([60.0, 60.0, 60.0, 72.5, 72.5, 85.0, 45.0, 60.0])
+    sex = np.array([0, 0, 1, 1, 1, 0, 1, 0])
+    mrs_probs_control = rng.dirichlet(np.ones(7), age.size)
+    mrs_probs_intervention = rng.dirichlet(np.ones(7), age.size)
+    return age, sex, mrs_probs_control, mrs_probs_intervention
+
+
+def find_expected_by_hand(mrs_probs, age, sex, fixed_params, model_type):
+    """Weight main_calculations() for each mRS by the probabilities."""
+    keys = ['qalys_total', 'total_discounted_cost', 'net_benefit']
+    expected = dict((key, np.zeros(age.size)) for key in keys)
+    for i in range(age.size):
+        for mrs in range(6):
+            results = main_calculations(
+                age[i], sex[i], 'Male' if sex[i] else 'Female', mrs,
+                fixed_params, model_type)
+            for key in keys:
+                expected[key][i] += mrs_probs[i, mrs] * results[key]
+    return expected
+
+
+@pytest.mark.parametrize('model_type', ['mRS', 'Dichotomous'])
+def test_comparison_matches_hand_calculation(model_type):
+    fixed_params = get_fixed_params(model_type)
+    age, sex, control_probs, intervention_probs = make_patients()
+    comparison = compare_mrs_distributions(
+        control_probs, intervention_probs, age, sex, fixed_params)
+
+    control = find_expected_by_hand(
+        control_probs, age, sex, fixed_params, model_type)
+    intervention = find_expected_by_hand(
+        intervention_probs, age, sex, fixed_params, model_type)
+    for key in control:
+        np.testing.assert_allclose(
+            comparison['control'][key], control[key], rtol=1e-9)
+        np.testing.assert_allclose(
+            comparison['intervention'][key], intervention[key], rtol=1e-9)
+
+    qalys = intervention['qalys_total'] - control['qalys_total']
+    cost = (intervention['total_discounted_cost'] -
+            control['total_discounted_cost'])
+    net_benefit = intervention['net_benefit'] - control['net_benefit']
+    patient = comparison['patient']
+    np.testing.assert_allclose(
+        patient['incremental_qalys'], qalys, rtol=1e-8, atol=1e-12)
+    np.testing.assert_allclose(
+        patient['incremental_total_discounted_cost'], cost,
+        rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(
+        patient['incremental_net_benefit'], net_benefit,
+        rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(patient['icer'], cost / qalys, rtol=1e-7)
+    # Net benefit is the QALYs at the willingness to pay minus cost:
+    np.testing.assert_allclose(
+        net_benefit, fixed_params['wtp_qaly_gpb'] * qalys - cost,
+        rtol=1e-8, atol=1e-6)
+
+    cohort = comparison['cohort']
+    np.testing.assert_allclose(
+        cohort['incremental_qalys'], np.sum(qalys), rtol=1e-8)
+    np.testing.assert_allclose(
+        cohort['icer'], np.sum(cost) / np.sum(qalys), rtol=1e-7)
+    np.testing.assert_allclose(
+        cohort['mean_incremental_net_benefit'], np.mean(net_benefit),
+        rtol=1e-8)
+
+
+def test_same_arms_have_no_increment():
+    fixed_params = get_fixed_params('mRS')
+    age, sex, control_probs, _ = make_patients()
+    comparison = compare_mrs_distributions(
+        control_probs, control_probs, age, sex, fixed_params)
+
+    patient = comparison['patient']
+    np.testing.assert_array_equal(patient['incremental_qalys'], 0.0)
+    np.testing.assert_array_equal(
+        patient['incremental_total_discounted_cost'], 0.0)
+    assert np.all(np.isnan(patient['icer']))
+    assert np.isnan(comparison['cohort']['icer'])
+
+
+def test_find_icer():
+    icer = find_icer([1000.0, -500.0, 100.0, 0.0], [0.5, 0.25, 0.0, 0.0])
+    np.testing.assert_array_equal(icer[:2], [2000.0, -2000.0])
+    # No change in QALYs has no ICER:
+    assert np.all(np.isnan(icer[2:]))
+    assert find_icer(300.0, 1.5) == 200.0
+    assert np.isnan(find_icer(300.0, 0.0))